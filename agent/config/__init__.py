@@ -3,6 +3,13 @@ Configuration module
 """
 
 from .settings import settings
-from .llm_config import llm, embeddings, opensearch_client, retriever_tool
 
-__all__ = ['settings', 'llm', 'embeddings', 'opensearch_client', 'retriever_tool'] 
\ No newline at end of file
+__all__ = ['settings', 'llm', 'embeddings', 'opensearch_client', 'retriever_tool']
+
+
+def __getattr__(name):
+    # The shared clients are built on first use (see llm_config._shared)
+    if name in ('llm', 'embeddings', 'opensearch_client', 'retriever_tool'):
+        from . import llm_config
+        return getattr(llm_config, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
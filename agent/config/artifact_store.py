@@ -0,0 +1,307 @@
+"""
+Run-scoped storage for generated artifacts (steps markdown, Gherkin features, Playwright scripts)
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .settings import settings
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9._-]+")
+MANIFEST_FILE = "manifest.json"
+
+
+def safe_name(value: str) -> str:
+    """Restrict run ids and artifact names to one path segment"""
+    cleaned = _UNSAFE.sub("_", str(value)).strip("._")
+    return cleaned or "unnamed"
+
+
+def _to_bytes(content: Union[str, bytes]) -> bytes:
+    return content.encode("utf-8") if isinstance(content, str) else content
+
+
+class ArtifactStore(ABC):
+    """
+    Artifacts grouped by RunID, so concurrent runs never share a file.
+
+    `put` returns a reference with the artifact's `uri`, `sha256` and `size`.
+    Subclasses implement `put`, `get`, `list`, `delete_run` and `_runs`; age and
+    size based eviction in `sweep` is shared.
+    """
+
+    @abstractmethod
+    def put(self, run_id: str, name: str, content: Union[str, bytes]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, run_id: str, name: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def list(self, run_id: str) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_run(self, run_id: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _runs(self) -> List[Tuple[str, float, int]]:
+        """(run_id, last_modified, bytes) of every stored run"""
+        raise NotImplementedError
+
+    def usage(self) -> Dict[str, int]:
+        runs = self._runs()
+        return {"runs": len(runs), "bytes": sum(size for _, _, size in runs)}
+
+    def sweep(self, max_age_seconds: Optional[float] = None, max_bytes: Optional[int] = None) -> int:
+        """Delete runs older than `max_age_seconds`, then the oldest runs until under `max_bytes`"""
+        runs = sorted(self._runs(), key=lambda run: run[1])
+        now = time.time()
+        removed = 0
+        kept = []
+        for run_id, modified, size in runs:
+            if max_age_seconds and now - modified > max_age_seconds:
+                self.delete_run(run_id)
+                removed += 1
+            else:
+                kept.append((run_id, modified, size))
+        total = sum(size for _, _, size in kept)
+        for run_id, _, size in kept:
+            if not max_bytes or total <= max_bytes:
+                break
+            self.delete_run(run_id)
+            total -= size
+            removed += 1
+        return removed
+
+
+class LocalArtifactStore(ArtifactStore):
+    """One directory per run under `root`, written atomically, with a sha256/size manifest"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _run_dir(self, run_id: str) -> Path:
+        return self.root / safe_name(run_id)
+
+    def _read_manifest(self, run_dir: Path) -> Dict[str, Any]:
+        try:
+            return json.loads((run_dir / MANIFEST_FILE).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def put(self, run_id: str, name: str, content: Union[str, bytes]) -> Dict[str, Any]:
+        data = _to_bytes(content)
+        name = safe_name(name)
+        run_dir = self._run_dir(run_id)
+        ref = {
+            "run_id": run_id,
+            "name": name,
+            "uri": str(run_dir / name),
+            "sha256": hashlib.sha256(data).hexdigest(),
+            "size": len(data),
+            "created_at": time.time(),
+        }
+        with self._lock:
+            run_dir.mkdir(parents=True, exist_ok=True)
+            manifest = self._read_manifest(run_dir)
+            previous = manifest.get(name)
+            if previous and previous["sha256"] == ref["sha256"] and (run_dir / name).exists():
+                return previous
+            self._write_atomic(run_dir / name, data)
+            manifest[name] = ref
+            self._write_atomic(run_dir / MANIFEST_FILE, json.dumps(manifest, indent=2).encode("utf-8"))
+        return ref
+
+    def get(self, run_id: str, name: str) -> Optional[bytes]:
+        try:
+            return (self._run_dir(run_id) / safe_name(name)).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def list(self, run_id: str) -> List[Dict[str, Any]]:
+        return list(self._read_manifest(self._run_dir(run_id)).values())
+
+    def delete_run(self, run_id: str) -> None:
+        with self._lock:
+            shutil.rmtree(self._run_dir(run_id), ignore_errors=True)
+
+    def _runs(self) -> List[Tuple[str, float, int]]:
+        runs = []
+        for entry in os.scandir(self.root):
+            if not entry.is_dir():
+                continue
+            modified, size = entry.stat().st_mtime, 0
+            for item in os.scandir(entry.path):
+                stat = item.stat()
+                modified = max(modified, stat.st_mtime)
+                size += stat.st_size
+            runs.append((entry.name, modified, size))
+        return runs
+
+
+class S3ArtifactStore(ArtifactStore):
+    """Artifacts as `s3://bucket/prefix/<run>/<name>` objects, with the sha256 in the object metadata"""
+
+    def __init__(self, bucket: str, prefix: str = "agent-artifacts", client=None):
+        if client is None:
+            import boto3
+
+            client = boto3.client("s3", region_name=os.getenv("AWS_REGION"))
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+
+    def _key(self, run_id: str, name: str = "") -> str:
+        return f"{self.prefix}/{safe_name(run_id)}/{safe_name(name) if name else ''}"
+
+    def put(self, run_id: str, name: str, content: Union[str, bytes]) -> Dict[str, Any]:
+        data = _to_bytes(content)
+        key = self._key(run_id, name)
+        sha256 = hashlib.sha256(data).hexdigest()
+        # A single PUT is atomic: readers see the old object or the new one, never a partial write
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data, Metadata={"sha256": sha256})
+        return {
+            "run_id": run_id,
+            "name": safe_name(name),
+            "uri": f"s3://{self.bucket}/{key}",
+            "sha256": sha256,
+            "size": len(data),
+            "created_at": time.time(),
+        }
+
+    def get(self, run_id: str, name: str) -> Optional[bytes]:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._key(run_id, name))["Body"].read()
+        except self.client.exceptions.NoSuchKey:
+            return None
+
+    def _objects(self, prefix: str):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            yield from page.get("Contents", [])
+
+    def list(self, run_id: str) -> List[Dict[str, Any]]:
+        return [
+            {
+                "run_id": run_id,
+                "name": obj["Key"].rsplit("/", 1)[-1],
+                "uri": f"s3://{self.bucket}/{obj['Key']}",
+                "size": obj["Size"],
+                "created_at": obj["LastModified"].timestamp(),
+            }
+            for obj in self._objects(self._key(run_id))
+        ]
+
+    def delete_run(self, run_id: str) -> None:
+        keys = [{"Key": obj["Key"]} for obj in self._objects(self._key(run_id))]
+        for start in range(0, len(keys), 1000):
+            self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": keys[start:start + 1000], "Quiet": True})
+
+    def _runs(self) -> List[Tuple[str, float, int]]:
+        runs: Dict[str, List[float]] = {}
+        for obj in self._objects(f"{self.prefix}/"):
+            run_id = obj["Key"][len(self.prefix) + 1:].split("/", 1)[0]
+            modified, size = runs.setdefault(run_id, [0.0, 0])
+            runs[run_id] = [max(modified, obj["LastModified"].timestamp()), size + obj["Size"]]
+        return [(run_id, modified, int(size)) for run_id, (modified, size) in runs.items()]
+
+
+class ArtifactSweeper:
+    """Background thread evicting artifacts by age and total size"""
+
+    def __init__(self, store: ArtifactStore, max_age_seconds: float, max_bytes: int, interval_seconds: float):
+        self.store = store
+        self.max_age_seconds = max_age_seconds
+        self.max_bytes = max_bytes
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="artifact-sweeper", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                removed = self.store.sweep(self.max_age_seconds, self.max_bytes)
+                if removed:
+                    print(f"🧹 Removed artifacts of {removed} runs ({self.store.usage()['bytes']} bytes left)")
+            except Exception as e:
+                print(f"⚠️ Artifact sweep failed: {e}")
+
+
+_artifact_store: Optional[ArtifactStore] = None
+_artifact_store_lock = threading.Lock()
+
+
+def create_artifact_store() -> ArtifactStore:
+    backend = settings.ARTIFACT_STORE_BACKEND.lower()
+    if backend == "s3":
+        if not settings.ARTIFACT_STORE_S3_BUCKET:
+            raise ValueError("ARTIFACT_STORE_BACKEND=s3 needs ARTIFACT_STORE_S3_BUCKET")
+        print(f"🗂️ Storing run artifacts in s3://{settings.ARTIFACT_STORE_S3_BUCKET}/{settings.ARTIFACT_STORE_S3_PREFIX}")
+        return S3ArtifactStore(settings.ARTIFACT_STORE_S3_BUCKET, settings.ARTIFACT_STORE_S3_PREFIX)
+    if backend != "local":
+        raise ValueError(f"Unknown ARTIFACT_STORE_BACKEND '{settings.ARTIFACT_STORE_BACKEND}', expected local or s3")
+    print(f"🗂️ Storing run artifacts in {settings.ARTIFACT_STORE_PATH}")
+    return LocalArtifactStore(settings.ARTIFACT_STORE_PATH)
+
+
+def get_artifact_store() -> ArtifactStore:
+    """Return the process-wide artifact store and start its eviction sweeper"""
+    global _artifact_store
+    if _artifact_store is None:
+        with _artifact_store_lock:
+            if _artifact_store is None:
+                store = create_artifact_store()
+                if settings.ARTIFACT_SWEEP_INTERVAL_SECONDS > 0:
+                    ArtifactSweeper(
+                        store,
+                        max_age_seconds=settings.ARTIFACT_RETENTION_HOURS * 3600,
+                        max_bytes=settings.ARTIFACT_STORE_MAX_BYTES,
+                        interval_seconds=settings.ARTIFACT_SWEEP_INTERVAL_SECONDS,
+                    ).start()
+                _artifact_store = store
+    return _artifact_store
+
+
+def save_run_artifact(state: Dict[str, Any], name: str, content: Union[str, bytes]) -> Optional[Dict[str, Any]]:
+    """Store an artifact under the state's RunID; failures are reported, not raised"""
+    try:
+        ref = get_artifact_store().put(state.get("RunID") or "adhoc", name, content)
+        print(f"📄 Saved {name} ({ref['size']} bytes) to {ref['uri']}")
+        return ref
+    except Exception as e:
+        print(f"⚠️ Error saving artifact {name}: {e}")
+        return None
@@ -0,0 +1,281 @@
+"""
+Two-tier cache for query and document embeddings
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .settings import settings
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_embedding_text(text: str) -> str:
+    """Fold unicode and whitespace differences so near-identical texts share a key"""
+    text = unicodedata.normalize("NFKC", str(text))
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def make_embedding_key(model: Optional[str], text: str) -> str:
+    """Content-address an embedding by model and normalized text"""
+    payload = f"{model or ''}\n{normalize_embedding_text(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    In-memory LRU in front of a SQLite table of float32 vectors.
+
+    The SQLite file is shared by every process on the host, so one process
+    embedding a story makes it a hit for the others. Both tiers are size bounded;
+    the persistent tier evicts by last access and expires entries after the TTL.
+    """
+
+    def __init__(self, path: str, memory_entries: int = 512, max_entries: int = 20000, ttl_seconds: Optional[int] = None):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                last_accessed REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_accessed ON embedding_cache(last_accessed)")
+        self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Return the cached vectors for whichever of `keys` are present"""
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is None:
+                    missing.append(key)
+                else:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                    self.memory_hits += 1
+
+            if missing:
+                for key, vector in self._read(missing).items():
+                    found[key] = vector
+                    self._remember(key, vector)
+                    self.disk_hits += 1
+                self.misses += sum(1 for key in missing if key not in found)
+        return found
+
+    def set_many(self, model: Optional[str], items: Dict[str, List[float]]) -> None:
+        """Store freshly computed vectors in both tiers"""
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        with self._lock:
+            for key, values in items.items():
+                vector = np.asarray(values, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((key, model, int(vector.shape[0]), vector.tobytes(), now, now))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (key, model, dim, vector, created_at, last_accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM embedding_cache")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process and the current number of entries"""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / total, 3) if total else 0.0,
+                "memory_entries": len(self._memory),
+                "entries": self._count(),
+                "max_entries": self.max_entries,
+                "path": self.path,
+            }
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        vector.flags.writeable = False
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _read(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        placeholders = ",".join("?" for _ in keys)
+        rows = self._conn.execute(
+            f"SELECT key, vector, created_at FROM embedding_cache WHERE key IN ({placeholders})", keys
+        ).fetchall()
+        now = time.time()
+        found = {}
+        expired = []
+        for key, blob, created_at in rows:
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                expired.append((key,))
+                continue
+            found[key] = np.frombuffer(blob, dtype=np.float32)
+        if expired:
+            self._conn.executemany("DELETE FROM embedding_cache WHERE key = ?", expired)
+        if found:
+            self._conn.executemany("UPDATE embedding_cache SET last_accessed = ? WHERE key = ?", [(now, key) for key in found])
+        self._conn.commit()
+        return found
+
+    def _evict(self) -> None:
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM embedding_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        overflow = self._count() - self.max_entries if self.max_entries else 0
+        if overflow > 0:
+            self._conn.execute(
+                """
+                DELETE FROM embedding_cache WHERE key IN (
+                    SELECT key FROM embedding_cache ORDER BY last_accessed ASC LIMIT ?
+                )
+                """,
+                (overflow,),
+            )
+        self._conn.commit()
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that only sends cache misses to the underlying client.
+
+    Attribute access falls through to the wrapped client, so code reading
+    `embeddings.model` and similar keeps working.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model: Optional[str] = None):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.cache_model = model or getattr(embeddings, "model", None)
+
+    def __getattr__(self, name: str) -> Any:
+        embeddings = self.__dict__.get("embeddings")
+        if embeddings is None:
+            raise AttributeError(name)
+        return getattr(embeddings, name)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._lookup(texts)
+        if missing:
+            computed = self.embeddings.embed_documents([texts[i] for i in missing.values()])
+            self._store(found, missing, computed)
+        return [found[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        keys, found, missing = self._lookup([text])
+        if missing:
+            self._store(found, missing, [self.embeddings.embed_query(text)])
+        return found[keys[0]].tolist()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._lookup(texts)
+        if missing:
+            computed = await self.embeddings.aembed_documents([texts[i] for i in missing.values()])
+            self._store(found, missing, computed)
+        return [found[key].tolist() for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        keys, found, missing = self._lookup([text])
+        if missing:
+            self._store(found, missing, [await self.embeddings.aembed_query(text)])
+        return found[keys[0]].tolist()
+
+    def _lookup(self, texts: List[str]):
+        """Key every text; returns the keys, the cached vectors and a key -> first index map of misses"""
+        keys = [make_embedding_key(self.cache_model, text) for text in texts]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+        missing: "OrderedDict[str, int]" = OrderedDict()
+        for i, key in enumerate(keys):
+            if key not in found and key not in missing:
+                missing[key] = i
+        if found:
+            hits = sum(1 for key in keys if key in found)
+            print(f"💾 Embedding cache hit for {hits}/{len(keys)} texts ({self.cache_model})")
+        return keys, found, missing
+
+    def _store(self, found: Dict[str, np.ndarray], missing: "OrderedDict[str, int]", vectors: List[List[float]]) -> None:
+        computed = dict(zip(missing.keys(), vectors))
+        self.cache.set_many(self.cache_model, computed)
+        found.update({key: np.asarray(vector, dtype=np.float32) for key, vector in computed.items()})
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+
+def embedding_cache_bypassed() -> bool:
+    """True when embedding caching is disabled or bypassed for this process"""
+    return not settings.EMBEDDING_CACHE_ENABLED or os.getenv("EMBEDDING_CACHE_BYPASS", "false").lower() == "true"
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Return the process-wide embedding cache, or None when caching is off"""
+    global _embedding_cache
+    if embedding_cache_bypassed():
+        return None
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                try:
+                    _embedding_cache = EmbeddingCache(
+                        settings.EMBEDDING_CACHE_PATH,
+                        memory_entries=settings.EMBEDDING_CACHE_MEMORY_ENTRIES,
+                        max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+                        ttl_seconds=settings.EMBEDDING_CACHE_TTL_SECONDS,
+                    )
+                    print(f"💾 Embedding cache enabled at {settings.EMBEDDING_CACHE_PATH}")
+                except Exception as e:
+                    print(f"⚠️ Failed to open embedding cache, continuing without it: {e}")
+                    return None
+    return _embedding_cache
+
+
+def with_embedding_cache(embeddings: Embeddings, model: Optional[str] = None) -> Embeddings:
+    """Wrap an embeddings client with the shared cache, or return it unchanged when caching is off"""
+    cache = get_embedding_cache()
+    if cache is None or isinstance(embeddings, CachedEmbeddings):
+        return embeddings
+    return CachedEmbeddings(embeddings, cache, model=model)
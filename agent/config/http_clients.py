@@ -0,0 +1,106 @@
+"""
+Shared, pooled HTTP clients for all Azure OpenAI traffic
+"""
+
+import atexit
+import threading
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from .settings import settings
+
+_clients: Dict[Tuple, httpx.Client] = {}
+_async_clients: Dict[Tuple, httpx.AsyncClient] = {}
+_lock = threading.Lock()
+
+
+def _http2_enabled() -> bool:
+    """HTTP/2 needs the optional h2 package; fall back to HTTP/1.1 keep-alive without it"""
+    if not settings.HTTP_CLIENT_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        print("⚠️ HTTP/2 requested but the 'h2' package is not installed, using HTTP/1.1")
+        return False
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_CLIENT_KEEPALIVE_EXPIRY,
+    )
+
+
+def _timeout_key(timeout: Optional[httpx.Timeout]) -> Optional[Tuple]:
+    if timeout is None:
+        return None
+    return (timeout.connect, timeout.read, timeout.write, timeout.pool)
+
+
+def get_http_client(verify: bool = False, timeout: Optional[httpx.Timeout] = None) -> httpx.Client:
+    """Return the process-wide keep-alive client for the given verify/timeout options"""
+    key = (verify, _timeout_key(timeout))
+    client = _clients.get(key)
+    if client is not None and not client.is_closed:
+        return client
+    with _lock:
+        client = _clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.Client(
+                verify=verify,
+                timeout=timeout if timeout is not None else httpx.Timeout(settings.HTTP_CLIENT_TIMEOUT),
+                limits=_limits(),
+                http2=_http2_enabled(),
+            )
+            _clients[key] = client
+        return client
+
+
+def get_async_http_client(verify: bool = False, timeout: Optional[httpx.Timeout] = None) -> httpx.AsyncClient:
+    """Async counterpart of get_http_client, used by ainvoke/astream"""
+    key = (verify, _timeout_key(timeout))
+    client = _async_clients.get(key)
+    if client is not None and not client.is_closed:
+        return client
+    with _lock:
+        client = _async_clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                verify=verify,
+                timeout=timeout if timeout is not None else httpx.Timeout(settings.HTTP_CLIENT_TIMEOUT),
+                limits=_limits(),
+                http2=_http2_enabled(),
+            )
+            _async_clients[key] = client
+        return client
+
+
+def close_http_clients() -> None:
+    """Close every pooled sync client; async clients are closed by aclose_http_clients"""
+    with _lock:
+        for client in _clients.values():
+            try:
+                client.close()
+            except Exception as e:
+                print(f"⚠️ Error closing HTTP client: {e}")
+        _clients.clear()
+
+
+async def aclose_http_clients() -> None:
+    """Close every pooled client, for use in an async shutdown hook"""
+    with _lock:
+        async_clients = list(_async_clients.values())
+        _async_clients.clear()
+    for client in async_clients:
+        try:
+            await client.aclose()
+        except Exception as e:
+            print(f"⚠️ Error closing async HTTP client: {e}")
+    close_http_clients()
+
+
+atexit.register(close_http_clients)
@@ -0,0 +1,212 @@
+"""
+On-disk cache for deterministic (temperature 0) LLM responses
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .settings import settings
+
+
+def make_cache_key(
+    model: Optional[str],
+    deployment: Optional[str],
+    api_version: Optional[str],
+    temperature: Optional[float],
+    messages: Any,
+) -> str:
+    """Content-address an LLM call by its model settings and full message list"""
+    payload = json.dumps(
+        {
+            "model": model,
+            "deployment": deployment,
+            "api_version": api_version,
+            "temperature": temperature,
+            "messages": messages,
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    SQLite-backed response cache with TTL expiry and size-bounded LRU eviction.
+
+    Subclasses can override `_read`, `_write`, `_delete_expired`, `_evict` and
+    `_count` to back the cache with another store.
+    """
+
+    def __init__(self, path: str, max_entries: int = 1000, ttl_seconds: Optional[int] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_accessed REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_accessed ON llm_cache(last_accessed)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for `key`, or None on a miss"""
+        with self._lock:
+            value = self._read(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        """Store a response and evict entries beyond the size bound"""
+        with self._lock:
+            self._write(key, value)
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process and the current number of entries"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "entries": self._count(),
+                "max_entries": self.max_entries,
+                "path": self.path,
+            }
+
+    def _read(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, created_at = row
+        now = time.time()
+        if self.ttl_seconds and now - created_at > self.ttl_seconds:
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._conn.commit()
+            return None
+        self._conn.execute("UPDATE llm_cache SET last_accessed = ? WHERE key = ?", (now, key))
+        self._conn.commit()
+        return value
+
+    def _write(self, key: str, value: str) -> None:
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, created_at, last_accessed) VALUES (?, ?, ?, ?)",
+            (key, value, now, now),
+        )
+        self._conn.commit()
+
+    def _delete_expired(self) -> None:
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+
+    def _evict(self) -> None:
+        self._delete_expired()
+        if self.max_entries and self._count() > self.max_entries:
+            self._conn.execute(
+                """
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY last_accessed ASC LIMIT ?
+                )
+                """,
+                (self._count() - self.max_entries,),
+            )
+        self._conn.commit()
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+
+_llm_cache: Optional[LLMResponseCache] = None
+_llm_cache_lock = threading.Lock()
+
+
+def llm_cache_bypassed() -> bool:
+    """True when caching is disabled or bypassed for this process"""
+    return not settings.LLM_CACHE_ENABLED or os.getenv("LLM_CACHE_BYPASS", "false").lower() == "true"
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """Return the process-wide LLM response cache, or None when caching is off"""
+    global _llm_cache
+    if llm_cache_bypassed():
+        return None
+    if _llm_cache is None:
+        with _llm_cache_lock:
+            if _llm_cache is None:
+                try:
+                    _llm_cache = LLMResponseCache(
+                        settings.LLM_CACHE_PATH,
+                        max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+                        ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+                    )
+                    print(f"💾 LLM response cache enabled at {settings.LLM_CACHE_PATH}")
+                except Exception as e:
+                    print(f"⚠️ Failed to open LLM response cache, continuing without it: {e}")
+                    return None
+    return _llm_cache
+
+
+def create_langchain_cache(deployment: str, api_version: str, temperature: Optional[float]):
+    """
+    Build a LangChain cache for a chat model, or None if the call should not be cached.
+
+    Only temperature 0 calls are deterministic enough to cache.
+    """
+    if temperature != 0:
+        return None
+    cache = get_llm_cache()
+    if cache is None:
+        return None
+
+    from langchain_core.caches import BaseCache
+    from langchain_core.load import dumps, loads
+
+    class LangChainResponseCache(BaseCache):
+        """Adapter exposing LLMResponseCache through LangChain's cache interface"""
+
+        def _key(self, prompt: str, llm_string: str) -> str:
+            return make_cache_key(None, deployment, api_version, temperature, [llm_string, prompt])
+
+        def lookup(self, prompt: str, llm_string: str):
+            value = cache.get(self._key(prompt, llm_string))
+            if value is None:
+                return None
+            print(f"💾 LLM cache hit ({deployment})")
+            return [loads(generation) for generation in json.loads(value)]
+
+        def update(self, prompt: str, llm_string: str, return_val: List[Any]) -> None:
+            cache.set(self._key(prompt, llm_string), json.dumps([dumps(generation) for generation in return_val]))
+
+        def clear(self, **kwargs: Any) -> None:
+            cache.clear()
+
+    return LangChainResponseCache()
@@ -2,11 +2,16 @@
 LLM and embeddings configuration
 """
 
-import httpx
-from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings
-from langchain_community.vectorstores import OpenSearchVectorSearch
-from langchain.tools.retriever import create_retriever_tool
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict
+from langchain_core.embeddings import Embeddings
 from .settings import settings
+from .llm_cache import get_llm_cache, make_cache_key
+from .http_clients import get_http_client
+from .embedding_cache import with_embedding_cache
+from .tracing import SPAN_LLM, annotate_current_span, record_openai_usage, trace_span
 
 from dotenv import load_dotenv
 import os
@@ -27,6 +32,9 @@ load_dotenv(dotenv_path)
 # print(f"  OPENSEARCH_PASSWORD: {os.getenv('OPENSEARCH_PASSWORD', 'NOT_SET')}")
 
 
+# Set by streaming endpoints to receive LLM output tokens as they are generated
+llm_token_callback: ContextVar = ContextVar("llm_token_callback", default=None)
+
 # Add rate limiting configuration
 RATE_LIMIT_RETRIES = 3
 RATE_LIMIT_DELAY = 30  # seconds
@@ -49,7 +57,7 @@ def create_llm():
             api_key=settings.OPENAI_API_KEY,
             api_version=settings.API_VERSION,
             azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
-            http_client=httpx.Client(verify=False, timeout=http_timeout)  # Disable SSL verification and set timeout
+            http_client=get_http_client(verify=False, timeout=http_timeout)  # Shared keep-alive pool, SSL verification disabled
         )
         
         print(f"✅ Azure OpenAI client created successfully")
@@ -58,8 +66,25 @@ def create_llm():
         print(f"❌ Failed to create Azure OpenAI client: {e}")
         raise e
     
-    def llm_simple(prompt):
+    def llm_simple(prompt, bypass_cache=False):
         """Simple LLM call without retry logic"""
+        with trace_span("llm_simple", SPAN_LLM, model=settings.AZURE_DEPLOYMENT):
+            return _llm_simple_call(prompt, bypass_cache)
+    
+    def _llm_simple_call(prompt, bypass_cache):
+        messages = [{"role": "user", "content": prompt}]
+        cache = None if bypass_cache else get_llm_cache()
+        cache_key = make_cache_key(settings.AZURE_DEPLOYMENT, settings.AZURE_DEPLOYMENT, settings.API_VERSION, 0.0, messages)
+        if cache is not None:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                print(f"💾 LLM cache hit ({settings.AZURE_DEPLOYMENT})")
+                annotate_current_span(cache_hit=True)
+                on_token = llm_token_callback.get()
+                if on_token:
+                    on_token(cached)
+                return cached
+
         try:
             print(f"🔄 Making LLM call...")
             
@@ -84,14 +109,39 @@ def create_llm():
             # print("✅ LLM call successful")
             # return result
             # updated to included streaming -- 09152025
-            response = client.chat.completions.create(
-                model=settings.AZURE_DEPLOYMENT,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.0,
-                max_tokens=8000
-            )
+            on_token = llm_token_callback.get()
+            if on_token:
+                # Stream the completion so callers can forward tokens as they arrive
+                chunks = []
+                stream = client.chat.completions.create(
+                    model=settings.AZURE_DEPLOYMENT,
+                    messages=messages,
+                    temperature=0.0,
+                    max_tokens=8000,
+                    stream=True,
+                    # The last chunk then carries the token usage (with no choices)
+                    stream_options={"include_usage": True},
+                )
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                        chunks.append(chunk.choices[0].delta.content)
+                        on_token(chunk.choices[0].delta.content)
+                    if getattr(chunk, "usage", None):
+                        record_openai_usage(chunk.usage)
+                content = "".join(chunks)
+            else:
+                response = client.chat.completions.create(
+                    model=settings.AZURE_DEPLOYMENT,
+                    messages=messages,
+                    temperature=0.0,
+                    max_tokens=8000
+                )
+                content = response.choices[0].message.content
+                record_openai_usage(response.usage)
             print(f"✅ LLM call successful")
-            return response.choices[0].message.content
+            if cache is not None and content:
+                cache.set(cache_key, content)
+            return content
             
         except Exception as e:
             print(f"❌ LLM call failed: {e}")
@@ -99,13 +149,15 @@ def create_llm():
     
     return llm_simple
 
-def create_embeddings() -> AzureOpenAIEmbeddings:
-    """Create and configure the embeddings instance"""
+def create_embeddings() -> Embeddings:
+    """Create and configure the embeddings instance, wrapped with the shared embedding cache"""
+    from langchain_openai import AzureOpenAIEmbeddings
+
     try:
-        return AzureOpenAIEmbeddings(
+        embeddings = AzureOpenAIEmbeddings(
             model=settings.EMBEDDINGS_MODEL,
             api_version=settings.API_VERSION,
-            http_client=httpx.Client(verify=False),
+            http_client=get_http_client(verify=False),
             timeout=settings.EMBEDDINGS_TIMEOUT,
             chunk_size=settings.EMBEDDINGS_CHUNK_SIZE,
             max_retries=settings.EMBEDDINGS_MAX_RETRIES,
@@ -116,7 +168,7 @@ def create_embeddings() -> AzureOpenAIEmbeddings:
     except Exception as e:
         print(f"Warning: Failed to create embeddings with SSL verification disabled: {e}")
         # Try without http_client specification
-        return AzureOpenAIEmbeddings(
+        embeddings = AzureOpenAIEmbeddings(
             model=settings.EMBEDDINGS_MODEL,
             api_version=settings.API_VERSION,
             timeout=settings.EMBEDDINGS_TIMEOUT,
@@ -126,6 +178,7 @@ def create_embeddings() -> AzureOpenAIEmbeddings:
             retry_max_seconds=settings.EMBEDDINGS_RETRY_MAX_SECONDS,
             show_progress_bar=True
         )
+    return with_embedding_cache(embeddings, model=settings.EMBEDDINGS_MODEL)
 
 def create_opensearch_client():
     """Create and configure the OpenSearch client"""
@@ -146,6 +199,8 @@ def create_opensearch_client():
         if not settings.OPENSEARCH_PASSWORD:
             raise ValueError("OPENSEARCH_PASSWORD not found in environment variables")
         
+        from langchain_community.vectorstores import OpenSearchVectorSearch
+
         embeddings = create_embeddings()
         
         client = OpenSearchVectorSearch(
@@ -174,9 +229,48 @@ def create_opensearch_client():
                 return MockRetriever()
         return MockOpenSearchClient()
 
-def create_sop_retriever_tool():
+def create_local_vector_index():
+    """Open the on-disk SOP vector index used when SOP_RETRIEVER_BACKEND=local"""
+    from nodes.adapters.local_vector_index import LocalVectorIndex
+
+    print(f"🔧 Opening local vector index at {settings.LOCAL_VECTOR_INDEX_PATH}")
+    index = LocalVectorIndex(
+        settings.LOCAL_VECTOR_INDEX_PATH,
+        create_embeddings(),
+        nprobe=settings.LOCAL_VECTOR_INDEX_NPROBE,
+        ivf_min_vectors=settings.LOCAL_VECTOR_INDEX_IVF_MIN_VECTORS,
+        ivf_lists=settings.LOCAL_VECTOR_INDEX_IVF_LISTS,
+    )
+    if not len(index):
+        print(f"⚠️ Local vector index is empty - build it with: python -m nodes.adapters.local_vector_index")
+    return index
+
+def create_pgvector_store():
+    """Connect to the pgvector SOP table used when SOP_RETRIEVER_BACKEND=pgvector"""
+    from nodes.adapters.pgvector_store import create_pgvector_store as build_pgvector_store
+
+    print(f"🔧 Connecting to pgvector SOP store (table {settings.SOP_PGVECTOR_TABLE})...")
+    store = build_pgvector_store(create_embeddings())
+    print(f"✅ pgvector SOP store ready ({store.count()} documents)")
+    return store
+
+def create_sop_store():
+    """Create the SOP vector store selected by SOP_RETRIEVER_BACKEND"""
+    if settings.SOP_RETRIEVER_BACKEND == "local":
+        return create_local_vector_index()
+    if settings.SOP_RETRIEVER_BACKEND == "pgvector":
+        try:
+            return create_pgvector_store()
+        except Exception as e:
+            print(f"❌ Failed to connect to pgvector SOP store, falling back to OpenSearch: {e}")
+    return create_opensearch_client()
+
+def create_sop_retriever_tool(opensearch_client=None):
     """Create the retriever tool"""
-    opensearch_client = create_opensearch_client()
+    from langchain.tools.retriever import create_retriever_tool
+
+    if opensearch_client is None:
+        opensearch_client = create_sop_store()
     retriever = opensearch_client.as_retriever(search_kwargs={"k": 1})
     print(retriever)
     return create_retriever_tool(
@@ -185,16 +279,70 @@ def create_sop_retriever_tool():
         description="Read the given user story and then try to retrieve the SOP that would be relevant for generating detailed steps for running the test scenario in the user story. Search and return information or relevant steps from the SOP documents.",
     )
 
-# Global instances with error handling
-try:
-    llm = create_llm()
-    embeddings = create_embeddings()
-    opensearch_client = create_opensearch_client()
-    retriever_tool = create_sop_retriever_tool()
-except Exception as e:
-    print(f"Error initializing global instances: {e}")
-    # Create fallback instances
-    llm = None
-    embeddings = None
-    opensearch_client = None
-    retriever_tool = None 
\ No newline at end of file
+# Shared instances, created on first use so importing this module stays cheap
+_instances: Dict[str, Any] = {}
+_instance_locks: Dict[str, threading.Lock] = {}
+_instance_locks_guard = threading.Lock()
+
+
+def _shared(name: str, factory: Callable[[], Any]) -> Any:
+    """
+    Build the named instance once per process; concurrent first callers wait for one build.
+
+    A failed build is reported and returns None without being cached, so the next
+    call tries again.
+    """
+    if name in _instances:
+        return _instances[name]
+    with _instance_locks_guard:
+        lock = _instance_locks.setdefault(name, threading.Lock())
+    with lock:
+        if name not in _instances:
+            started = time.perf_counter()
+            try:
+                instance = factory()
+            except Exception as e:
+                print(f"Error initializing {name}: {e}")
+                return None
+            print(f"⏱️ Initialized {name} in {time.perf_counter() - started:.2f}s")
+            _instances[name] = instance
+    return _instances[name]
+
+
+def get_llm():
+    return _shared("llm", create_llm)
+
+
+def get_embeddings():
+    return _shared("embeddings", create_embeddings)
+
+
+def get_sop_store():
+    """The SOP vector store (OpenSearch, local index or pgvector)"""
+    return _shared("opensearch_client", create_sop_store)
+
+
+def get_retriever_tool():
+    return _shared("retriever_tool", lambda: create_sop_retriever_tool(get_sop_store()))
+
+
+def llm(prompt, bypass_cache=False):
+    """Call the shared LLM, creating its client on first use"""
+    client = get_llm()
+    if client is None:
+        raise RuntimeError("Azure OpenAI client is not available")
+    return client(prompt, bypass_cache=bypass_cache)
+
+
+_LAZY_ATTRIBUTES = {
+    "embeddings": get_embeddings,
+    "opensearch_client": get_sop_store,
+    "retriever_tool": get_retriever_tool,
+}
+
+
+def __getattr__(name: str):
+    # Keeps `from config.llm_config import opensearch_client` working without building it at import time
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
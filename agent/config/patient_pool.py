@@ -0,0 +1,505 @@
+"""
+SQLite-backed pool of test patients (Patient ID + intake Document Id)
+
+    python -m config.patient_pool import [--pool direct] [--file "config/Direct Patient.xlsx"] [--candidates]
+    python -m config.patient_pool export [--pool direct] [--file out.xlsx]
+    python -m config.patient_pool status
+    python -m config.patient_pool replenish
+    python -m config.patient_pool restore --pool direct --patient 17164202
+    python -m config.patient_pool burn --pool direct --patient 17164202
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .settings import settings
+
+_CONFIG_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Pool name -> seed workbook; the pool names match patient__type() ("Direct", "Integrated", anything else)
+POOL_WORKBOOKS = {
+    "direct": os.path.join(_CONFIG_DIR, "Direct Patient.xlsx"),
+    "integrated": os.path.join(_CONFIG_DIR, "Integrated Patient.xlsx"),
+    "reject": os.path.join(_CONFIG_DIR, "Direct Patient for ref reject.xlsx"),
+}
+
+AVAILABLE = "available"
+LEASED = "leased"
+RESERVED = "reserved"
+REVIEW = "review"
+USED = "used"
+CANDIDATE = "candidate"
+REJECTED = "rejected"
+STATES = (AVAILABLE, LEASED, RESERVED, REVIEW, USED, CANDIDATE, REJECTED)
+
+
+def pool_for_patient_type(patient_type: Optional[str]) -> str:
+    if patient_type == "Direct":
+        return "direct"
+    if patient_type == "Integrated":
+        return "integrated"
+    return "reject"
+
+
+def _cell_text(value) -> str:
+    """Excel hands back numeric IDs as int or float (17164202.0); store them as plain text"""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+@dataclass
+class PatientLease:
+    pool: str
+    patient_id: str
+    intake_id: str
+    lease_id: str
+    leased_until: float
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "pool": self.pool,
+            "patient_id": self.patient_id,
+            "intake_id": self.intake_id,
+            "lease_id": self.lease_id,
+            "leased_until": self.leased_until,
+        }
+
+
+class PatientPool:
+    """
+    Test patients in one SQLite table, shared by every worker on the host.
+
+    A patient is `available`, `leased` or `used`. Allocation is a single
+    `UPDATE ... RETURNING` that leases the first free row (or one whose lease
+    expired), so concurrent workers never get the same patient and nothing is
+    rewritten but that row. Newly imported rows can start as `candidate` and
+    only become `available` once validated (see `PatientPoolReplenisher`);
+    candidates that fail validation are kept as `rejected`.
+
+    Once a script carrying the lease is handed out the patient is `reserved`:
+    a run may have used it, so a reservation that expires, or a run whose
+    outcome was lost, puts the patient up for `review` instead of back in the
+    pool. Reviewed patients are restored or burnt by hand.
+    """
+
+    def __init__(self, path: str, lease_seconds: int = 1800, low_watermark: int = 5):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.low_watermark = low_watermark
+        self._lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS patient_pool (
+                pool TEXT NOT NULL,
+                patient_id TEXT NOT NULL,
+                intake_id TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT '',
+                state TEXT NOT NULL DEFAULT 'available',
+                lease_id TEXT,
+                leased_until REAL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (pool, patient_id)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_patient_pool_state ON patient_pool(pool, state, leased_until)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_patient_pool_lease ON patient_pool(lease_id)")
+        self._conn.commit()
+
+    def allocate(self, pool: str, lease_seconds: Optional[int] = None) -> Optional[PatientLease]:
+        """Lease one patient from `pool`, or return None when it is exhausted"""
+        now = time.time()
+        lease_id = uuid.uuid4().hex
+        leased_until = now + (lease_seconds or self.lease_seconds)
+        with self._lock:
+            row = self._conn.execute(
+                """
+                UPDATE patient_pool
+                SET state = 'leased', lease_id = ?, leased_until = ?, updated_at = ?
+                WHERE rowid = (
+                    SELECT rowid FROM patient_pool
+                    WHERE pool = ? AND (state = 'available' OR (state = 'leased' AND leased_until < ?))
+                    ORDER BY state, rowid
+                    LIMIT 1
+                )
+                RETURNING patient_id, intake_id
+                """,
+                (lease_id, leased_until, now, pool, now),
+            ).fetchone()
+            self._conn.commit()
+        if row is None:
+            print(f"⚠️ Patient pool '{pool}' is exhausted")
+            return None
+
+        remaining = self.available(pool)
+        if remaining < self.low_watermark:
+            print(f"⚠️ Patient pool '{pool}' is running low: {remaining} patients left")
+        return PatientLease(pool, row[0], row[1], lease_id, leased_until)
+
+    def reserve(self, lease: PatientLease, seconds: int) -> bool:
+        """Hold a lease for `seconds` from now for a script that uses it; False if it already expired and was re-leased"""
+        leased_until = time.time() + seconds
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE patient_pool SET state = 'reserved', leased_until = ?, updated_at = ? WHERE lease_id = ? AND state IN ('leased', 'reserved')",
+                (leased_until, time.time(), lease.lease_id),
+            )
+            self._conn.commit()
+        if cur.rowcount:
+            lease.leased_until = leased_until
+        return cur.rowcount > 0
+
+    def get_lease(self, lease_id: str) -> Optional[PatientLease]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT pool, patient_id, intake_id, lease_id, leased_until FROM patient_pool WHERE lease_id = ? AND state IN ('leased', 'reserved')",
+                (lease_id,),
+            ).fetchone()
+        return PatientLease(*row) if row else None
+
+    def mark_used(self, lease: PatientLease) -> bool:
+        """Burn a leased patient; False if the lease expired and the patient went to someone else"""
+        return self.settle(lease.lease_id, used=True)
+
+    def release(self, lease: PatientLease) -> bool:
+        """Return a leased patient to the pool"""
+        return self.settle(lease.lease_id, used=False)
+
+    def settle(self, lease_id: str, used: bool) -> bool:
+        """Burn (`used`) or return the patient held by `lease_id`; False if there is no such lease"""
+        return self._end_lease(lease_id, USED if used else AVAILABLE)
+
+    def flag_for_review(self, lease_id: str) -> bool:
+        """Take the patient held by `lease_id` out of the pool until someone checks it; False if there is no such lease"""
+        return self._end_lease(lease_id, REVIEW)
+
+    def _end_lease(self, lease_id: str, state: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                """
+                UPDATE patient_pool SET state = ?, lease_id = NULL, leased_until = NULL, updated_at = ?
+                WHERE lease_id = ? AND state IN ('leased', 'reserved')
+                RETURNING pool, patient_id
+                """,
+                (state, time.time(), lease_id),
+            ).fetchone()
+            self._conn.commit()
+        if row and state == AVAILABLE:
+            print(f"↩️ Returned patient {row[1]} to pool '{row[0]}'")
+        elif row and state == REVIEW:
+            print(f"🔎 Patient {row[1]} of pool '{row[0]}' needs review: its run did not report an outcome")
+        return row is not None
+
+    def reclaim_expired(self) -> int:
+        """
+        Return patients whose lease ran out before a script was generated for them.
+
+        Expired reservations are not returned: their script may have run and used
+        the patient, so they are put up for review instead.
+        """
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                """
+                UPDATE patient_pool SET state = 'available', lease_id = NULL, leased_until = NULL, updated_at = ?
+                WHERE state = 'leased' AND leased_until < ?
+                """,
+                (now, now),
+            )
+            flagged = self._conn.execute(
+                """
+                UPDATE patient_pool SET state = 'review', lease_id = NULL, leased_until = NULL, updated_at = ?
+                WHERE state = 'reserved' AND leased_until < ?
+                """,
+                (now, now),
+            ).rowcount
+            self._conn.commit()
+        if flagged:
+            print(f"🔎 {flagged} patients need review: their reservation expired without a reported run")
+        return cur.rowcount
+
+    def resolve_review(self, pool: str, patient_ids: Iterable[str], used: bool) -> int:
+        """Burn (`used`) or return patients that were up for review"""
+        with self._lock:
+            cur = self._conn.executemany(
+                "UPDATE patient_pool SET state = ?, updated_at = ? WHERE pool = ? AND patient_id = ? AND state = 'review'",
+                [(USED if used else AVAILABLE, time.time(), pool, patient_id) for patient_id in patient_ids],
+            )
+            self._conn.commit()
+        return cur.rowcount
+
+    def available(self, pool: str) -> int:
+        """Patients that can be allocated now, counting expired leases"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM patient_pool WHERE pool = ? AND (state = 'available' OR (state = 'leased' AND leased_until < ?))",
+                (pool, time.time()),
+            ).fetchone()[0]
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """Number of patients per pool and state"""
+        with self._lock:
+            rows = self._conn.execute("SELECT pool, state, COUNT(*) FROM patient_pool GROUP BY pool, state").fetchall()
+        counts: Dict[str, Dict[str, int]] = {}
+        for pool, state, count in rows:
+            counts.setdefault(pool, dict.fromkeys(STATES, 0))[state] = count
+        return counts
+
+    def candidates(self, pool: str, limit: int) -> List[Tuple[str, str]]:
+        """(patient_id, intake_id) of candidates waiting for validation, oldest first"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT patient_id, intake_id FROM patient_pool WHERE pool = ? AND state = 'candidate' ORDER BY rowid LIMIT ?",
+                (pool, limit),
+            ).fetchall()
+
+    def resolve_candidates(self, pool: str, valid: Iterable[str], invalid: Iterable[str]) -> None:
+        """Make validated candidates available and keep the rest as rejected"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE patient_pool SET state = ?, updated_at = ? WHERE pool = ? AND patient_id = ? AND state = 'candidate'",
+                [(AVAILABLE, now, pool, patient_id) for patient_id in valid] + [(REJECTED, now, pool, patient_id) for patient_id in invalid],
+            )
+            self._conn.commit()
+
+    def add_patients(self, pool: str, patients: List[Tuple[str, str, str, bool]], candidates: bool = False) -> int:
+        """
+        Insert (patient_id, intake_id, status, used) rows; patients already in the pool are left as they are.
+
+        With `candidates`, unused rows wait for validation instead of becoming available.
+        """
+        now = time.time()
+        fresh = CANDIDATE if candidates else AVAILABLE
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                """
+                INSERT OR IGNORE INTO patient_pool (pool, patient_id, intake_id, status, state, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                [(pool, patient_id, intake_id, status, USED if used else fresh, now) for patient_id, intake_id, status, used in patients],
+            )
+            self._conn.commit()
+            return self._conn.total_changes - before
+
+    def import_workbook(self, pool: str, path: str, candidates: bool = False) -> int:
+        """Add the rows of a patient workbook (Patient ID, Document Id, status, comment)"""
+        import pandas as pd
+
+        data = pd.read_excel(path).fillna("")
+        patients = [
+            (_cell_text(row["Patient ID"]), _cell_text(row["Document Id"]), _cell_text(row.get("status", "")), _cell_text(row.get("comment", "")) == "used")
+            for _, row in data.iterrows()
+            if _cell_text(row["Patient ID"]) and _cell_text(row["Document Id"])
+        ]
+        added = self.add_patients(pool, patients, candidates=candidates)
+        print(f"📥 Imported {added} new {'candidates' if candidates else 'patients'} into pool '{pool}' from {path}")
+        return added
+
+    def export_workbook(self, pool: str, path: str) -> int:
+        """Write the pool back out in the workbook layout; anything not available is marked used"""
+        import pandas as pd
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT patient_id, intake_id, status, state FROM patient_pool WHERE pool = ? ORDER BY rowid",
+                (pool,),
+            ).fetchall()
+        data = pd.DataFrame(
+            [(patient_id, intake_id, status, "" if state == AVAILABLE else "used") for patient_id, intake_id, status, state in rows],
+            columns=["Patient ID", "Document Id", "status", "comment"],
+        )
+        data.to_excel(path, index=False, sheet_name="sheet_1")
+        print(f"📤 Exported {len(rows)} patients from pool '{pool}' to {path}")
+        return len(rows)
+
+    def seed_from_workbooks(self) -> None:
+        """Import the bundled workbooks into pools that are still empty"""
+        counts = self.counts()
+        for pool, path in POOL_WORKBOOKS.items():
+            if pool not in counts and os.path.exists(path):
+                try:
+                    self.import_workbook(pool, path)
+                except Exception as e:
+                    print(f"⚠️ Failed to seed patient pool '{pool}' from {path}: {e}")
+
+
+_PATIENT_ID = re.compile(r"^\d+$")
+_INTAKE_ID = re.compile(r"^CMNINTAKE\d+$")
+
+
+def validate_candidates(candidates: List[Tuple[str, str]]) -> Set[str]:
+    """
+    Patient IDs among (patient_id, intake_id) `candidates` that can be handed out.
+
+    Rows must be well formed. When PATIENT_POOL_VALIDATION_SQL is set, the
+    well-formed rows are also checked in one query against the QA Oracle
+    database: `{ids}` in the query is expanded to one bind variable per patient
+    ID, and the query returns the IDs that are valid.
+    """
+    well_formed = [patient_id for patient_id, intake_id in candidates if _PATIENT_ID.match(patient_id) and _INTAKE_ID.match(intake_id)]
+    if not well_formed or not settings.PATIENT_POOL_VALIDATION_SQL:
+        return set(well_formed)
+
+    import oracledb
+
+    binds = {f"id{i}": patient_id for i, patient_id in enumerate(well_formed)}
+    sql = settings.PATIENT_POOL_VALIDATION_SQL.format(ids=", ".join(f":{name}" for name in binds))
+    with oracledb.connect(
+        user=settings.ORACLE_DB_USER,
+        password=settings.ORACLE_DB_PASSWORD,
+        host=settings.ORACLE_DB_HOST,
+        port=settings.ORACLE_DB_PORT,
+        service_name=settings.ORACLE_DB_SERVICE_NAME,
+    ) as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, binds)
+            return {_cell_text(row[0]) for row in cur.fetchall()}
+
+
+class PatientPoolReplenisher:
+    """Background thread returning expired leases to the pool and validating candidates in bulk"""
+
+    def __init__(
+        self,
+        pool: PatientPool,
+        interval_seconds: float,
+        batch_size: int = 500,
+        validate: Callable[[List[Tuple[str, str]]], Set[str]] = validate_candidates,
+    ):
+        self.pool = pool
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.validate = validate
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="patient-pool-replenisher", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run_once(self, pools: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """Reclaim expired leases, then validate every waiting candidate of `pools` (default: all)"""
+        with self._run_lock:
+            reclaimed = self.pool.reclaim_expired()
+            if reclaimed:
+                print(f"↩️ Returned {reclaimed} patients whose lease expired")
+            counts = self.pool.counts()
+            promoted: Dict[str, int] = {}
+            for name in pools or sorted(counts):
+                if not counts.get(name, {}).get(CANDIDATE):
+                    continue
+                promoted[name] = 0
+                while True:
+                    batch = self.pool.candidates(name, self.batch_size)
+                    if not batch:
+                        break
+                    valid = self.validate(batch)
+                    self.pool.resolve_candidates(
+                        name,
+                        [patient_id for patient_id, _ in batch if patient_id in valid],
+                        [patient_id for patient_id, _ in batch if patient_id not in valid],
+                    )
+                    promoted[name] += sum(1 for patient_id, _ in batch if patient_id in valid)
+                print(f"🧑‍⚕️ Validated candidates for pool '{name}': {promoted[name]} now available")
+            return promoted
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"⚠️ Patient pool replenishment failed: {e}")
+
+
+_patient_pool: Optional[PatientPool] = None
+_patient_pool_replenisher: Optional[PatientPoolReplenisher] = None
+_patient_pool_lock = threading.Lock()
+
+
+def get_patient_pool() -> PatientPool:
+    """
+    Return the process-wide patient pool, seeding empty pools from the bundled workbooks
+    and starting its replenisher.
+    """
+    global _patient_pool, _patient_pool_replenisher
+    if _patient_pool is None:
+        with _patient_pool_lock:
+            if _patient_pool is None:
+                pool = PatientPool(
+                    settings.PATIENT_POOL_PATH,
+                    lease_seconds=settings.PATIENT_POOL_LEASE_SECONDS,
+                    low_watermark=settings.PATIENT_POOL_LOW_WATERMARK,
+                )
+                pool.seed_from_workbooks()
+                _patient_pool_replenisher = PatientPoolReplenisher(
+                    pool,
+                    interval_seconds=settings.PATIENT_POOL_REPLENISH_INTERVAL_SECONDS,
+                    batch_size=settings.PATIENT_POOL_VALIDATION_BATCH_SIZE,
+                )
+                if settings.PATIENT_POOL_REPLENISH_INTERVAL_SECONDS > 0:
+                    _patient_pool_replenisher.start()
+                print(f"🧑‍⚕️ Patient pool ready at {settings.PATIENT_POOL_PATH}")
+                _patient_pool = pool
+    return _patient_pool
+
+
+def replenish_patient_pool(pool: Optional[str] = None) -> Dict[str, int]:
+    """Run the replenisher now, e.g. when an allocation found the pool empty"""
+    get_patient_pool()
+    try:
+        return _patient_pool_replenisher.run_once([pool] if pool else None)
+    except Exception as e:
+        print(f"⚠️ Patient pool replenishment failed: {e}")
+        return {}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Manage the test patient pool")
+    parser.add_argument("command", choices=["import", "export", "status", "replenish", "restore", "burn"])
+    parser.add_argument("--pool", choices=sorted(POOL_WORKBOOKS), help="Defaults to every pool")
+    parser.add_argument("--file", help="Workbook to read or write; defaults to the pool's bundled workbook")
+    parser.add_argument("--candidates", action="store_true", help="Import rows as candidates that must be validated before use")
+    parser.add_argument("--patient", action="append", default=[], help="Patient ID up for review to restore or burn; repeatable")
+    args = parser.parse_args(argv)
+
+    if args.file and not args.pool:
+        parser.error("--file needs --pool")
+    if args.command in ("restore", "burn") and not (args.pool and args.patient):
+        parser.error(f"{args.command} needs --pool and --patient")
+    store = PatientPool(settings.PATIENT_POOL_PATH, settings.PATIENT_POOL_LEASE_SECONDS, settings.PATIENT_POOL_LOW_WATERMARK)
+    pools = [args.pool] if args.pool else sorted(POOL_WORKBOOKS)
+    if args.command == "import":
+        for pool in pools:
+            store.import_workbook(pool, args.file or POOL_WORKBOOKS[pool], candidates=args.candidates)
+    elif args.command == "export":
+        for pool in pools:
+            store.export_workbook(pool, args.file or POOL_WORKBOOKS[pool])
+    elif args.command == "replenish":
+        PatientPoolReplenisher(store, 0, batch_size=settings.PATIENT_POOL_VALIDATION_BATCH_SIZE).run_once(pools if args.pool else None)
+    elif args.command in ("restore", "burn"):
+        resolved = store.resolve_review(args.pool, args.patient, used=args.command == "burn")
+        print(f"{'Burnt' if args.command == 'burn' else 'Restored'} {resolved} patients of pool '{args.pool}'")
+    for pool, counts in sorted(store.counts().items()):
+        print(f"{pool}: " + ", ".join(f"{counts[state]} {state}" for state in STATES))
+
+
+if __name__ == "__main__":
+    main()
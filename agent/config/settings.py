@@ -5,6 +5,7 @@ Configuration settings for the workflow application
 import os
 import dotenv
 from typing import Optional
+from urllib.parse import quote_plus
 
 # Load environment variables
 dotenv.load_dotenv()
@@ -35,6 +36,24 @@ class Settings:
     OPENSEARCH_INDEX: str = os.getenv("OPENSEARCH_INDEX")
     OPENSEARCH_USERNAME: str = os.getenv("OPENSEARCH_USERNAME")
     OPENSEARCH_PASSWORD: str = os.getenv("OPENSEARCH_PASSWORD")
+    
+    # SOP Retriever Configuration (opensearch, local or pgvector)
+    SOP_RETRIEVER_BACKEND: str = os.getenv("SOP_RETRIEVER_BACKEND", "opensearch").lower()
+    LOCAL_VECTOR_INDEX_PATH: str = os.getenv("LOCAL_VECTOR_INDEX_PATH") or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "sop_index")
+    LOCAL_VECTOR_INDEX_NPROBE: int = int(os.getenv("LOCAL_VECTOR_INDEX_NPROBE", "4"))
+    LOCAL_VECTOR_INDEX_IVF_MIN_VECTORS: int = int(os.getenv("LOCAL_VECTOR_INDEX_IVF_MIN_VECTORS", "2048"))
+    LOCAL_VECTOR_INDEX_IVF_LISTS: int = int(os.getenv("LOCAL_VECTOR_INDEX_IVF_LISTS", "0"))
+    
+    # SOP Retrieval Configuration (the original single vector hit, or hybrid BM25 + vector).
+    # Hybrid packs chunks into a token budget, so enable it once the index is ingested in chunks
+    SOP_RETRIEVAL_MODE: str = os.getenv("SOP_RETRIEVAL_MODE", "vector").lower()
+    SOP_RETRIEVAL_CANDIDATES: int = int(os.getenv("SOP_RETRIEVAL_CANDIDATES", "20"))
+    SOP_HYBRID_VECTOR_WEIGHT: float = float(os.getenv("SOP_HYBRID_VECTOR_WEIGHT", "0.5"))
+    SOP_RERANKER_MODEL: str = os.getenv("SOP_RERANKER_MODEL", "")
+    SOP_CONTEXT_TOKEN_BUDGET: int = int(os.getenv("SOP_CONTEXT_TOKEN_BUDGET", "3000"))
+    SOP_CONTEXT_MAX_CHUNKS: int = int(os.getenv("SOP_CONTEXT_MAX_CHUNKS", "5"))
+    SOP_CONTEXT_COMPRESSION: bool = os.getenv("SOP_CONTEXT_COMPRESSION", "true").lower() == "true"
+    SOP_COMPRESSION_CACHE_SIZE: int = int(os.getenv("SOP_COMPRESSION_CACHE_SIZE", "256"))
 
 
     # Embeddings Configuration
@@ -45,11 +64,123 @@ class Settings:
     EMBEDDINGS_RETRY_MIN_SECONDS: int = 60
     EMBEDDINGS_RETRY_MAX_SECONDS: int = 120
     
+    # SOP Ingestion Configuration
+    SOP_INGEST_BATCH_SIZE: int = int(os.getenv("SOP_INGEST_BATCH_SIZE", str(EMBEDDINGS_CHUNK_SIZE)))
+    SOP_INGEST_CHUNK_SIZE: int = int(os.getenv("SOP_INGEST_CHUNK_SIZE", "1500"))
+    SOP_INGEST_CHUNK_OVERLAP: int = int(os.getenv("SOP_INGEST_CHUNK_OVERLAP", "150"))
+    SOP_INGEST_MANIFEST_PATH: str = os.getenv("SOP_INGEST_MANIFEST_PATH") or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "sop_ingest.sqlite")
+    
+    # Code Generation Configuration
+    CODEGEN_MAX_CONCURRENCY: int = int(os.getenv("CODEGEN_MAX_CONCURRENCY", "5"))
+    CODEGEN_CALL_TIMEOUT_SECONDS: int = int(os.getenv("CODEGEN_CALL_TIMEOUT_SECONDS", "600"))
+    
+    # HTTP Connection Pool Configuration (shared by all Azure OpenAI clients)
+    HTTP_CLIENT_MAX_CONNECTIONS: int = int(os.getenv("HTTP_CLIENT_MAX_CONNECTIONS", "20"))
+    HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS", "10"))
+    HTTP_CLIENT_KEEPALIVE_EXPIRY: float = float(os.getenv("HTTP_CLIENT_KEEPALIVE_EXPIRY", "60"))
+    HTTP_CLIENT_TIMEOUT: float = float(os.getenv("HTTP_CLIENT_TIMEOUT", "600"))
+    HTTP_CLIENT_HTTP2: bool = os.getenv("HTTP_CLIENT_HTTP2", "true").lower() == "true"
+    
+    # LLM Response Cache Configuration
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_PATH: str = os.getenv("LLM_CACHE_PATH") or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "llm_cache.sqlite")
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+    LLM_CACHE_TTL_SECONDS: int = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    
+    # Embedding Cache Configuration
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_PATH: str = os.getenv("EMBEDDING_CACHE_PATH") or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "embedding_cache.sqlite")
+    EMBEDDING_CACHE_MEMORY_ENTRIES: int = int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "512"))
+    EMBEDDING_CACHE_MAX_ENTRIES: int = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "20000"))
+    EMBEDDING_CACHE_TTL_SECONDS: int = int(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+    
+    # Test Patient Pool Configuration (seeded from the config/*.xlsx workbooks)
+    PATIENT_POOL_PATH: str = os.getenv("PATIENT_POOL_PATH") or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "patient_pool.sqlite")
+    PATIENT_POOL_LEASE_SECONDS: int = int(os.getenv("PATIENT_POOL_LEASE_SECONDS", "1800"))
+    PATIENT_POOL_LOW_WATERMARK: int = int(os.getenv("PATIENT_POOL_LOW_WATERMARK", "5"))
+    PATIENT_POOL_RESERVATION_SECONDS: int = int(os.getenv("PATIENT_POOL_RESERVATION_SECONDS", str(24 * 3600)))
+    PATIENT_POOL_REPLENISH_INTERVAL_SECONDS: int = int(os.getenv("PATIENT_POOL_REPLENISH_INTERVAL_SECONDS", "300"))
+    PATIENT_POOL_VALIDATION_BATCH_SIZE: int = int(os.getenv("PATIENT_POOL_VALIDATION_BATCH_SIZE", "500"))
+    # Oracle query returning the valid IDs among candidates; {ids} expands to bind variables
+    PATIENT_POOL_VALIDATION_SQL: str = os.getenv("PATIENT_POOL_VALIDATION_SQL", "")
+    
+    # QA Oracle Database (candidate patient validation)
+    ORACLE_DB_USER: Optional[str] = os.getenv("ORACLE_DB_USER")
+    ORACLE_DB_PASSWORD: Optional[str] = os.getenv("ORACLE_DB_PASSWORD")
+    ORACLE_DB_HOST: Optional[str] = os.getenv("ORACLE_DB_HOST")
+    ORACLE_DB_PORT: int = int(os.getenv("ORACLE_DB_PORT", "1521"))
+    ORACLE_DB_SERVICE_NAME: Optional[str] = os.getenv("ORACLE_DB_SERVICE_NAME")
+    
+    # Artifact Store Configuration (generated steps, Gherkin and scripts, one directory per RunID)
+    ARTIFACT_STORE_BACKEND: str = os.getenv("ARTIFACT_STORE_BACKEND", "local")
+    ARTIFACT_STORE_PATH: str = os.getenv("ARTIFACT_STORE_PATH") or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "artifacts")
+    ARTIFACT_STORE_S3_BUCKET: Optional[str] = os.getenv("ARTIFACT_STORE_S3_BUCKET")
+    ARTIFACT_STORE_S3_PREFIX: str = os.getenv("ARTIFACT_STORE_S3_PREFIX", "agent-artifacts")
+    ARTIFACT_RETENTION_HOURS: float = float(os.getenv("ARTIFACT_RETENTION_HOURS", "72"))
+    ARTIFACT_STORE_MAX_BYTES: int = int(os.getenv("ARTIFACT_STORE_MAX_BYTES", str(1024 ** 3)))
+    ARTIFACT_SWEEP_INTERVAL_SECONDS: int = int(os.getenv("ARTIFACT_SWEEP_INTERVAL_SECONDS", "900"))
+    
+    # Startup Configuration (clients are built on first use unless warmed up at startup)
+    STARTUP_WARMUP: bool = os.getenv("STARTUP_WARMUP", "false").lower() == "true"
+    
+    # Workflow Job Queue Configuration
+    WORKFLOW_MAX_CONCURRENT_JOBS: int = int(os.getenv("WORKFLOW_MAX_CONCURRENT_JOBS", "4"))
+    WORKFLOW_MAX_QUEUED_JOBS: int = int(os.getenv("WORKFLOW_MAX_QUEUED_JOBS", "50"))
+    WORKFLOW_JOB_RETENTION: int = int(os.getenv("WORKFLOW_JOB_RETENTION", "200"))
+    
+    # Workflow Checkpointer Configuration (memory, sqlite or postgres)
+    CHECKPOINTER_BACKEND: str = os.getenv("CHECKPOINTER_BACKEND", "memory")
+    CHECKPOINTER_SQLITE_PATH: str = os.getenv("CHECKPOINTER_SQLITE_PATH") or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "checkpoints.sqlite")
+    CHECKPOINTER_POSTGRES_URL: Optional[str] = os.getenv("CHECKPOINTER_POSTGRES_URL")
+    CHECKPOINTER_POSTGRES_POOL_SIZE: int = int(os.getenv("CHECKPOINTER_POSTGRES_POOL_SIZE", "10"))
+    CHECKPOINT_COMPRESSION_MIN_BYTES: int = int(os.getenv("CHECKPOINT_COMPRESSION_MIN_BYTES", "1024"))
+    CHECKPOINT_RETENTION_HOURS: float = float(os.getenv("CHECKPOINT_RETENTION_HOURS", "72"))
+    CHECKPOINT_SWEEP_INTERVAL_SECONDS: int = int(os.getenv("CHECKPOINT_SWEEP_INTERVAL_SECONDS", "900"))
+    
+    # Aurora PostgreSQL Configuration
+    DB_HOST: Optional[str] = os.getenv("DB_HOST")
+    DB_PORT: str = os.getenv("DB_PORT", "5432")
+    DB_DATABASE: Optional[str] = os.getenv("DB_DATABASE")
+    DB_USERNAME: Optional[str] = os.getenv("DB_USERNAME")
+    DB_PASSWORD: Optional[str] = os.getenv("DB_PASSWORD")
+    DB_SSLMODE: str = os.getenv("DB_SSLMODE", "require")
+    
+    # SOP pgvector Store Configuration (SOP_RETRIEVER_BACKEND=pgvector)
+    SOP_PGVECTOR_URL: Optional[str] = os.getenv("SOP_PGVECTOR_URL")
+    SOP_PGVECTOR_TABLE: str = os.getenv("SOP_PGVECTOR_TABLE", "sop_documents")
+    SOP_PGVECTOR_DIMENSIONS: int = int(os.getenv("SOP_PGVECTOR_DIMENSIONS", "1536"))
+    SOP_PGVECTOR_POOL_SIZE: int = int(os.getenv("SOP_PGVECTOR_POOL_SIZE", "5"))
+    SOP_PGVECTOR_HNSW_M: int = int(os.getenv("SOP_PGVECTOR_HNSW_M", "16"))
+    SOP_PGVECTOR_HNSW_EF_CONSTRUCTION: int = int(os.getenv("SOP_PGVECTOR_HNSW_EF_CONSTRUCTION", "64"))
+    SOP_PGVECTOR_EF_SEARCH: int = int(os.getenv("SOP_PGVECTOR_EF_SEARCH", "40"))
+    
+    # Workflow State History Caps (older entries are rolled up into one summary entry)
+    STATE_MAX_MESSAGES: int = int(os.getenv("STATE_MAX_MESSAGES", "50"))
+    STATE_MAX_WORKFLOW_STEPS: int = int(os.getenv("STATE_MAX_WORKFLOW_STEPS", "100"))
+    STATE_MAX_AUDIT_ENTRIES: int = int(os.getenv("STATE_MAX_AUDIT_ENTRIES", "200"))
+    
+    # Workflow Tracing Configuration (per-node latency, tokens and cost)
+    TRACING_ENABLED: bool = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+    TRACING_DB_PATH: str = os.getenv("TRACING_DB_PATH") or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "traces.sqlite")
+    TRACING_RETENTION_DAYS: float = float(os.getenv("TRACING_RETENTION_DAYS", "14"))
+    TRACING_COST_PER_1K_PROMPT_TOKENS: float = float(os.getenv("TRACING_COST_PER_1K_PROMPT_TOKENS", "0.002"))
+    TRACING_COST_PER_1K_CACHED_TOKENS: float = float(os.getenv("TRACING_COST_PER_1K_CACHED_TOKENS", "0.0005"))
+    TRACING_COST_PER_1K_COMPLETION_TOKENS: float = float(os.getenv("TRACING_COST_PER_1K_COMPLETION_TOKENS", "0.008"))
+    
     # API Configuration
     API_HOST: str = "localhost"
     API_PORT: int = 5000
     API_DEBUG: bool = True
     
+    @classmethod
+    def db_conn_string(cls) -> str:
+        """libpq URL for the Aurora cluster built from the DB_* variables"""
+        if not cls.DB_HOST:
+            raise ValueError("DB_HOST is not set")
+        user = quote_plus(cls.DB_USERNAME or "")
+        password = quote_plus(cls.DB_PASSWORD or "")
+        return f"postgresql://{user}:{password}@{cls.DB_HOST}:{cls.DB_PORT}/{cls.DB_DATABASE}?sslmode={cls.DB_SSLMODE}"
+    
     @classmethod
     def setup_environment(cls):
         """Setup environment variables"""
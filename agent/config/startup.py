@@ -0,0 +1,132 @@
+"""
+Service startup: optional warm-up of the shared clients and an import-time benchmark
+
+    python -m config.startup [--module fastapi_workflow_api] [--top 20] [--json report.json] [--max-seconds 10]
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .settings import settings
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Warm-up progress, reported by /health
+warmup_status: Dict[str, Any] = {"state": "disabled"}
+
+
+def warm_up() -> Dict[str, Any]:
+    """Build the shared clients before the first request needs them; returns per-component timings"""
+    from .llm_config import get_embeddings, get_llm, get_retriever_tool, get_sop_store
+    from .patient_pool import get_patient_pool
+
+    components = [
+        ("llm", get_llm),
+        ("embeddings", get_embeddings),
+        ("sop_store", get_sop_store),
+        ("retriever_tool", get_retriever_tool),
+        ("patient_pool", get_patient_pool),
+    ]
+    warmup_status.update(state="running", components={})
+    started = time.perf_counter()
+    for name, factory in components:
+        component_started = time.perf_counter()
+        try:
+            ok = factory() is not None
+        except Exception as e:
+            print(f"⚠️ Warm-up of {name} failed: {e}")
+            ok = False
+        warmup_status["components"][name] = {"ok": ok, "seconds": round(time.perf_counter() - component_started, 3)}
+    warmup_status.update(state="done", seconds=round(time.perf_counter() - started, 3))
+    print(f"🔥 Warm-up finished in {warmup_status['seconds']}s: {warmup_status['components']}")
+    return warmup_status
+
+
+def start_warm_up() -> None:
+    """Run warm_up() on a background thread when STARTUP_WARMUP is on, so /health answers immediately"""
+    if not settings.STARTUP_WARMUP:
+        return
+    warmup_status["state"] = "pending"
+    threading.Thread(target=warm_up, name="startup-warmup", daemon=True).start()
+
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """Rows of `python -X importtime` output: module, self and cumulative microseconds, nesting depth"""
+    rows = []
+    for line in stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append({"module": module, "self_us": int(self_us), "cumulative_us": int(cumulative_us), "depth": (len(indent) - 1) // 2})
+    return rows
+
+
+def benchmark_import(module: str, cwd: str) -> Dict[str, Any]:
+    """Import `module` in a fresh interpreter, as the container entry point would, and time it"""
+    code = (
+        "import time; started = time.perf_counter(); "
+        f"import {module}; "
+        "print('__IMPORT_SECONDS__', time.perf_counter() - started)"
+    )
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [AGENT_DIR, os.environ.get("PYTHONPATH")]))}
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=cwd, env=env, capture_output=True, text=True)
+    wall_seconds = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    import_seconds = next(
+        (float(line.split()[1]) for line in result.stdout.splitlines() if line.startswith("__IMPORT_SECONDS__")),
+        None,
+    )
+    return {
+        "module": module,
+        "python": sys.version.split()[0],
+        "wall_seconds": round(wall_seconds, 3),
+        "import_seconds": round(import_seconds, 3) if import_seconds is not None else None,
+        "imports": parse_importtime(result.stderr),
+    }
+
+
+def print_report(report: Dict[str, Any], top: int) -> None:
+    imports = report["imports"]
+    print(f"⏱️ import {report['module']}: {report['import_seconds']}s ({report['wall_seconds']}s including interpreter start)")
+    print(f"\nTop {top} by cumulative time (top-level imports):")
+    for row in sorted((r for r in imports if r["depth"] == 0), key=lambda r: r["cumulative_us"], reverse=True)[:top]:
+        print(f"  {row['cumulative_us'] / 1000:9.1f} ms  {row['module']}")
+    print(f"\nTop {top} by self time:")
+    for row in sorted(imports, key=lambda r: r["self_us"], reverse=True)[:top]:
+        print(f"  {row['self_us'] / 1000:9.1f} ms  {row['module']}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Measure how long the agent takes to import and start")
+    parser.add_argument("--module", default="fastapi_workflow_api", help="Module to import (default: the API entry point)")
+    parser.add_argument("--cwd", default=os.path.join(AGENT_DIR, "fastapi"), help="Directory to import from, like the container CMD")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--json", help="Also write the full report to this file, to compare between builds")
+    parser.add_argument("--max-seconds", type=float, help="Exit with status 1 if the import takes longer")
+    args = parser.parse_args(argv)
+
+    report = benchmark_import(args.module, args.cwd)
+    print_report(report, args.top)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.max_seconds is not None and (report["import_seconds"] or 0) > args.max_seconds:
+        print(f"❌ Startup regression: {report['import_seconds']}s exceeds {args.max_seconds}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""
+Per-run tracing of workflow nodes, LLM calls and retriever calls.
+
+Each graph node runs inside a `node` span tied to the RunID. While a node span
+is open, every LangChain chat model and retriever call is recorded as a child
+span through a callback handler registered with LangChain's configure hooks,
+so nodes need no changes. Calls made outside LangChain (the raw Azure client
+in llm_config) open their own span with `trace_span`.
+
+Spans are written to SQLite and summarised per run by `get_run_trace`.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+from .settings import settings
+
+SPAN_NODE = "node"
+SPAN_LLM = "llm"
+SPAN_RETRIEVER = "retriever"
+
+
+class Span:
+    """One timed operation within a run"""
+
+    def __init__(self, name: str, kind: str, run_id: Optional[str], node: Optional[str], parent_id: Optional[str], attributes: Optional[Dict[str, Any]] = None):
+        self.span_id = uuid.uuid4().hex
+        self.name = name
+        self.kind = kind
+        self.run_id = run_id
+        self.node = node
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.started_at = time.time()
+        self.duration_ms: Optional[float] = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self._t0 = time.perf_counter()
+
+    def record_usage(self, prompt_tokens: int = 0, completion_tokens: int = 0, cached_tokens: int = 0) -> None:
+        self.prompt_tokens += prompt_tokens or 0
+        self.completion_tokens += completion_tokens or 0
+        self.cached_tokens += cached_tokens or 0
+
+    def fail(self, error: BaseException) -> None:
+        self.status = "error"
+        self.error = f"{error.__class__.__name__}: {error}"
+
+    def end(self) -> None:
+        if self.duration_ms is None:
+            self.duration_ms = (time.perf_counter() - self._t0) * 1000
+
+    @property
+    def cost(self) -> float:
+        """Estimated USD cost from the configured per-1K-token prices"""
+        uncached = max(self.prompt_tokens - self.cached_tokens, 0)
+        return (
+            uncached * settings.TRACING_COST_PER_1K_PROMPT_TOKENS
+            + self.cached_tokens * settings.TRACING_COST_PER_1K_CACHED_TOKENS
+            + self.completion_tokens * settings.TRACING_COST_PER_1K_COMPLETION_TOKENS
+        ) / 1000
+
+
+class SpanStore:
+    """SQLite store for finished spans, pruned to the retention window"""
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path: str, retention_days: float):
+        self.path = path
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS spans (
+                span_id TEXT PRIMARY KEY,
+                run_id TEXT,
+                parent_id TEXT,
+                node TEXT,
+                name TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                duration_ms REAL,
+                prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                completion_tokens INTEGER NOT NULL DEFAULT 0,
+                cached_tokens INTEGER NOT NULL DEFAULT 0,
+                cost REAL NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                error TEXT,
+                attributes TEXT
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_spans_run_id ON spans(run_id, started_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_spans_started_at ON spans(started_at)")
+        self._conn.commit()
+        self._prune()
+
+    def record(self, span: Span) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO spans VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    span.span_id, span.run_id, span.parent_id, span.node, span.name, span.kind,
+                    span.started_at, span.duration_ms, span.prompt_tokens, span.completion_tokens,
+                    span.cached_tokens, span.cost, span.status, span.error,
+                    json.dumps(span.attributes, default=str),
+                ),
+            )
+            self._conn.commit()
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._prune()
+
+    def spans_for_run(self, run_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            cur = self._conn.execute("SELECT * FROM spans WHERE run_id = ? ORDER BY started_at", (run_id,))
+            columns = [column[0] for column in cur.description]
+            rows = [dict(zip(columns, row)) for row in cur.fetchall()]
+        for row in rows:
+            row["attributes"] = json.loads(row["attributes"]) if row["attributes"] else {}
+        return rows
+
+    def _prune(self) -> None:
+        if self.retention_days:
+            self._conn.execute("DELETE FROM spans WHERE started_at < ?", (time.time() - self.retention_days * 86400,))
+            self._conn.commit()
+
+
+_span_store: Optional[SpanStore] = None
+_span_store_lock = threading.Lock()
+
+
+def get_span_store() -> Optional[SpanStore]:
+    """Return the process-wide span store, or None when tracing is off"""
+    global _span_store
+    if not settings.TRACING_ENABLED:
+        return None
+    if _span_store is None:
+        with _span_store_lock:
+            if _span_store is None:
+                try:
+                    _span_store = SpanStore(settings.TRACING_DB_PATH, settings.TRACING_RETENTION_DAYS)
+                    print(f"⏱️ Workflow tracing enabled at {settings.TRACING_DB_PATH}")
+                except Exception as e:
+                    print(f"⚠️ Failed to open trace store, continuing without tracing: {e}")
+                    return None
+    return _span_store
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("workflow_current_span", default=None)
+_tracing_handler: ContextVar[Optional[BaseCallbackHandler]] = ContextVar("workflow_tracing_handler", default=None)
+
+
+def _finish(span: Span) -> None:
+    span.end()
+    store = get_span_store()
+    if store is None:
+        return
+    try:
+        store.record(span)
+    except Exception as e:
+        print(f"⚠️ Failed to record trace span {span.name}: {e}")
+
+
+@contextmanager
+def trace_span(name: str, kind: str, run_id: Optional[str] = None, **attributes: Any):
+    """Time the enclosed block as a span of the current run"""
+    parent = _current_span.get()
+    span = Span(
+        name,
+        kind,
+        run_id=run_id or (parent.run_id if parent else None),
+        node=name if kind == SPAN_NODE else (parent.node if parent else None),
+        parent_id=parent.span_id if parent else None,
+        attributes=attributes,
+    )
+    token = _current_span.set(span)
+    handler_token = _tracing_handler.set(_callback_handler) if settings.TRACING_ENABLED else None
+    try:
+        yield span
+    except BaseException as e:
+        span.fail(e)
+        raise
+    finally:
+        if handler_token is not None:
+            _tracing_handler.reset(handler_token)
+        _current_span.reset(token)
+        _finish(span)
+
+
+def annotate_current_span(**attributes: Any) -> None:
+    """Add attributes to the innermost open span, if any"""
+    span = _current_span.get()
+    if span is not None:
+        span.attributes.update(attributes)
+
+
+def record_openai_usage(usage) -> None:
+    """Add an OpenAI `usage` object's token counts to the innermost open span"""
+    span = _current_span.get()
+    if span is None or usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    span.record_usage(
+        prompt_tokens=getattr(usage, "prompt_tokens", 0),
+        completion_tokens=getattr(usage, "completion_tokens", 0),
+        cached_tokens=getattr(details, "cached_tokens", 0) if details else 0,
+    )
+
+
+def _usage_from_llm_result(response) -> Dict[str, int]:
+    """Token usage from a LangChain LLMResult (usage_metadata first, then llm_output)"""
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+    found = False
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if metadata:
+                found = True
+                usage["prompt_tokens"] += metadata.get("input_tokens", 0)
+                usage["completion_tokens"] += metadata.get("output_tokens", 0)
+                usage["cached_tokens"] += (metadata.get("input_token_details") or {}).get("cache_read", 0) or 0
+    if not found:
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+        usage["prompt_tokens"] = token_usage.get("prompt_tokens", 0) or 0
+        usage["completion_tokens"] = token_usage.get("completion_tokens", 0) or 0
+        usage["cached_tokens"] = (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0) or 0
+    return usage
+
+
+class SpanCallbackHandler(BaseCallbackHandler):
+    """Records LangChain chat model and retriever calls as child spans of the current node"""
+
+    def __init__(self):
+        self._spans: Dict[Any, Span] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, name: str, kind: str, attributes: Dict[str, Any]) -> None:
+        parent = _current_span.get()
+        if parent is None:
+            return
+        span = Span(name, kind, run_id=parent.run_id, node=parent.node, parent_id=parent.span_id, attributes=attributes)
+        with self._lock:
+            self._spans[run_id] = span
+
+    def _pop(self, run_id) -> Optional[Span]:
+        with self._lock:
+            return self._spans.pop(run_id, None)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs: Any) -> None:
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("azure_deployment") or params.get("model") or params.get("model_name")
+        self._start(run_id, model or "chat_model", SPAN_LLM, {"model": model})
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs: Any) -> None:
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("azure_deployment") or params.get("model") or params.get("model_name")
+        self._start(run_id, model or "llm", SPAN_LLM, {"model": model})
+
+    def on_llm_end(self, response, *, run_id, **kwargs: Any) -> None:
+        span = self._pop(run_id)
+        if span is None:
+            return
+        span.record_usage(**_usage_from_llm_result(response))
+        _finish(span)
+
+    def on_llm_error(self, error: BaseException, *, run_id, **kwargs: Any) -> None:
+        span = self._pop(run_id)
+        if span is None:
+            return
+        span.fail(error)
+        _finish(span)
+
+    def on_retriever_start(self, serialized, query: str, *, run_id, **kwargs: Any) -> None:
+        name = (serialized or {}).get("name") or "retriever"
+        self._start(run_id, name, SPAN_RETRIEVER, {"query_chars": len(query or "")})
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs: Any) -> None:
+        span = self._pop(run_id)
+        if span is None:
+            return
+        span.attributes["documents"] = len(documents or [])
+        _finish(span)
+
+    def on_retriever_error(self, error: BaseException, *, run_id, **kwargs: Any) -> None:
+        span = self._pop(run_id)
+        if span is None:
+            return
+        span.fail(error)
+        _finish(span)
+
+
+_callback_handler = SpanCallbackHandler()
+
+# Every LangChain callback manager created while a span is open picks up the handler
+register_configure_hook(_tracing_handler, inheritable=True)
+
+
+def traced_node(name: str, node):
+    """Wrap a graph node so it runs inside a node span tied to the state's RunID"""
+    @wraps(node)
+    def wrapper(state):
+        with trace_span(name, SPAN_NODE, run_id=state.get("RunID")):
+            return node(state)
+
+    return wrapper
+
+
+def _totals(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "prompt_tokens": sum(span["prompt_tokens"] for span in spans),
+        "completion_tokens": sum(span["completion_tokens"] for span in spans),
+        "cached_tokens": sum(span["cached_tokens"] for span in spans),
+        "cost": round(sum(span["cost"] for span in spans), 6),
+        "errors": sum(1 for span in spans if span["status"] == "error"),
+    }
+
+
+def get_run_trace(run_id: str) -> Optional[Dict[str, Any]]:
+    """Per-node latency, token and cost breakdown of a run, or None if it has no spans"""
+    store = get_span_store()
+    if store is None:
+        return None
+    spans = store.spans_for_run(run_id)
+    if not spans:
+        return None
+
+    nodes: Dict[str, Dict[str, Any]] = {}
+    for span in spans:
+        if span["kind"] != SPAN_NODE:
+            continue
+        entry = nodes.setdefault(span["name"], {"node": span["name"], "calls": 0, "duration_ms": 0.0})
+        entry["calls"] += 1
+        entry["duration_ms"] += span["duration_ms"] or 0
+
+    for name, entry in nodes.items():
+        children = [span for span in spans if span["node"] == name and span["kind"] != SPAN_NODE]
+        entry["duration_ms"] = round(entry["duration_ms"], 1)
+        entry["llm_calls"] = sum(1 for span in children if span["kind"] == SPAN_LLM)
+        entry["llm_ms"] = round(sum(span["duration_ms"] or 0 for span in children if span["kind"] == SPAN_LLM), 1)
+        entry["retriever_calls"] = sum(1 for span in children if span["kind"] == SPAN_RETRIEVER)
+        entry["retriever_ms"] = round(sum(span["duration_ms"] or 0 for span in children if span["kind"] == SPAN_RETRIEVER), 1)
+        entry.update(_totals(children))
+        entry["errors"] += sum(1 for span in spans if span["name"] == name and span["kind"] == SPAN_NODE and span["status"] == "error")
+
+    node_spans = [span for span in spans if span["kind"] == SPAN_NODE]
+    return {
+        "run_id": run_id,
+        "started_at": datetime.fromtimestamp(spans[0]["started_at"]).isoformat(),
+        "node_time_ms": round(sum(span["duration_ms"] or 0 for span in node_spans), 1),
+        "totals": _totals(spans),
+        "nodes": sorted(nodes.values(), key=lambda entry: entry["duration_ms"], reverse=True),
+        "spans": spans,
+    }
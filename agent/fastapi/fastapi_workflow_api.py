@@ -5,11 +5,16 @@ Single endpoint for all workflow operations
 """
 
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from langchain_core.callbacks import BaseCallbackHandler
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
 import os
 import sys
 import json
+import asyncio
+import queue
+import uuid
 from datetime import datetime
 
 # Add the parent directory to the path to import workflow modules
@@ -19,6 +24,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from models.messages import format_state_to_ai_output
 from models.state import GraphState
 from workflow.builder import build_workflow
+from workflow.jobs import JobQueueFull, RunAlreadyActive, create_job_manager
+from config.llm_config import llm_token_callback
+from config.startup import start_warm_up, warmup_status
 
 app = FastAPI(title="QA Workflow API with LangGraph Integration", version="3.0.0")
 
@@ -27,6 +35,22 @@ print("🔄 Building LangGraph workflow...")
 workflow = build_workflow()
 print("✅ LangGraph workflow built successfully")
 
+@app.on_event("startup")
+async def warm_up_clients():
+    """Build the LLM, SOP store and patient pool in the background when STARTUP_WARMUP is on"""
+    start_warm_up()
+
+@app.on_event("shutdown")
+async def stop_workflow_jobs():
+    """Stop accepting queued workflow jobs"""
+    job_manager.shutdown()
+
+@app.on_event("shutdown")
+async def close_pooled_clients():
+    """Close the shared Azure OpenAI connection pools"""
+    from config.http_clients import aclose_http_clients
+    await aclose_http_clients()
+
 class WorkflowRequest(BaseModel):
     """Enhanced request model for workflow operations"""
     input: Optional[str] = None
@@ -52,171 +76,167 @@ async def health_check():
     return {
         "status": "healthy",
         "langgraph_workflow": "built",
+        "workflow_jobs": job_manager.stats(),
+        "warmup": warmup_status,
         "timestamp": datetime.now().isoformat()
     }
 
 @app.get("/opensearch-health")
 async def opensearch_health_check():
     """Opensearch health check endpoint"""
-    from config.llm_config import opensearch_client
+    from config.llm_config import get_sop_store
     return {
         "status": "healthy",
-        "opensearch_client": opensearch_client.as_retriever(search_kwargs={"k": 1}).get_relevant_documents("sop test")
+        "opensearch_client": get_sop_store().as_retriever(search_kwargs={"k": 1}).get_relevant_documents("sop test")
     }
 
-@app.post("/workflow")
-async def workflow_handler(request: WorkflowRequest):
-    print("Received request:", request.dict())
+@app.get("/llm-cache")
+async def llm_cache_stats():
+    """LLM response cache hit/miss counters"""
+    from config.llm_cache import get_llm_cache
+    cache = get_llm_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+def build_run_input(request: WorkflowRequest):
+    """Return the run id and graph input for a new or resumed workflow"""
+    # Generate run_id if not provided
+    if not request.run_id:
+        # Unique even for submissions in the same second, which would otherwise share a checkpoint thread
+        run_id = f"workflow_{uuid.uuid4().hex}"
+    else:
+        run_id = request.run_id
+        
+    print(f"🔄 Processing workflow with run_id: {run_id}")
     
-    try:
-        # Generate run_id if not provided
-        if not request.run_id:
-            run_id = f"workflow_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        else:
-            run_id = request.run_id
-            
-        print(f"🔄 Processing workflow with run_id: {run_id}")
+    # Initialize state based on request type
+    if request.input and not request.run_id:
+        # New workflow - start with user story parsing
+        print("🔄 Starting new workflow with user story parsing")
+        initial_state = GraphState({
+            "RunID": run_id,
+            "input": request.input,
+            "user_story": request.input,
+            "parsed_story": {},
+            "missing_fields": [],
+            "updated_info": {},
+            "steps": [],
+            "validated": False,
+            "updated_steps": [],
+            "gherkins_scenario": "",
+            "message": "",
+            "messages": [],
+            "llm_suggestion": "",
+            "llm_feedback": "",
+            "accept": False,
+            "edited_fields": {},
+            "sop_context": [],
+            "workflow_status": "Starting",
+            "Test_case": "",
+            "last": {},
+            "awaiting_human_input": False,
+            "human_input": {},
+            "validation_step": "",
+            "playwright_code": ""
+        })
         
-        # Initialize state based on request type
-        if request.input and not request.run_id:
-            # New workflow - start with user story parsing
-            print("🔄 Starting new workflow with user story parsing")
-            initial_state = GraphState({
-                "RunID": run_id,
-                "input": request.input,
-                "user_story": request.input,
-                "parsed_story": {},
-                "missing_fields": [],
-                "updated_info": {},
-                "steps": [],
-                "validated": False,
-                "updated_steps": [],
-                "gherkins_scenario": "",
-                "message": "",
-                "messages": [],
-                "llm_suggestion": "",
-                "llm_feedback": "",
-                "accept": False,
-                "edited_fields": {},
-                "sop_context": [],
-                "workflow_status": "Starting",
-                "Test_case": "",
-                "last": {},
-                "awaiting_human_input": False,
-                "human_input": {},
-                "validation_step": "",
-                "playwright_code": ""
-            })
-            
-            # Start the workflow from the beginning
-            config = {"configurable": {"thread_id": run_id}}
-            result = workflow.invoke(initial_state, config)
-            
-        elif request.input and request.run_id:
-            # Resume workflow with human input
-            print(f"🔄 Resuming workflow {request.run_id} with human input")
-            
-            # Create state with human input for resuming
-            # Note: We only provide the human_input, the rest will be loaded from checkpoint
-            resume_state = GraphState({
-                "RunID": request.run_id,
-                "human_input": {"feedback": request.input},
-                "awaiting_human_input": False,
-                "workflow_status": "Resuming with human input"
-            })
-            
-            # Resume the workflow from checkpoint
-            config = {"configurable": {"thread_id": request.run_id}}
-            result = workflow.invoke(resume_state, config)
-            print("++++++++++++++++++",config)
-            print("++++++++++++++++++",resume_state)
-            # result = None
-            # for chunk in workflow.stream(resume_state, config):
-            #     result = chunk
-            #     print(chunk)
-            
-            # result = result or workflow.get_state(config).values
+        return run_id, initial_state
         
-        else:
-            raise HTTPException(
-                status_code=400, 
-                detail="Invalid request. Provide 'input' (user story) for new workflows or 'input' + 'run_id' for resuming workflows"
-            )
+    elif request.input and request.run_id:
+        # Resume workflow with human input
+        print(f"🔄 Resuming workflow {request.run_id} with human input")
+        
+        # Create state with human input for resuming
+        # Note: We only provide the human_input, the rest will be loaded from checkpoint
+        resume_state = GraphState({
+            "RunID": request.run_id,
+            "human_input": {"feedback": request.input},
+            "awaiting_human_input": False,
+            "workflow_status": "Resuming with human input"
+        })
+        
+        return run_id, resume_state
+    
+    else:
+        raise HTTPException(
+            status_code=400, 
+            detail="Invalid request. Provide 'input' (user story) for new workflows or 'input' + 'run_id' for resuming workflows"
+        )
+    
+
+def format_workflow_result(result: Dict[str, Any], run_id: str) -> Dict[str, Any]:
+    """Format the final workflow state as the /workflow response"""
+    # Format the response based on workflow state
+    if result.get("awaiting_human_input", False):
+        # Workflow is awaiting human input - show parsed story for validation
+        parsed_story = result.get("parsed_story", {})
+        
+        # Create formatted message for human validation
+        message_parts = []
+        message_parts.append("## Parsed User Story")
         
-        print(f"✅ Workflow execution completed")
-        print(f"  Final status: {result.get('workflow_status', 'unknown')}")
-        print(f"  Awaiting human input: {result.get('awaiting_human_input', False)}")
+        if parsed_story:
+            if 'Objective' in parsed_story and parsed_story['Objective']:
+                message_parts.append(f"**Objective:** {parsed_story['Objective']}")
+            if 'Test Summary' in parsed_story and parsed_story['Test Summary']:
+                message_parts.append(f"**Test Summary:** {parsed_story['Test Summary']}")
+            if 'Acceptance Criteria' in parsed_story and parsed_story['Acceptance Criteria']:
+                message_parts.append("**Acceptance Criteria:**")
+                for i, crit in enumerate(parsed_story['Acceptance Criteria'], 1):
+                    message_parts.append(f"{i}. {crit}")
+            if 'Applications Involved' in parsed_story and parsed_story['Applications Involved']:
+                message_parts.append(f"**Applications Involved:** {', '.join(parsed_story['Applications Involved'])}")
+            if 'Manual_Steps' in parsed_story and parsed_story['Manual_Steps']:
+                message_parts.append("**Manual Steps:**")
+                for i, step in enumerate(parsed_story['Manual_Steps'], 1):
+                    message_parts.append(f"{i}. {step}")
+            if 'Test_Automation' in parsed_story and parsed_story['Test_Automation']:
+                message_parts.append("**Test Automation Steps:**")
+                for i, step in enumerate(parsed_story['Test_Automation'], 1):
+                    message_parts.append(f"{i}. {step}")
         
-        # Format the response based on workflow state
-        if result.get("awaiting_human_input", False):
-            # Workflow is awaiting human input - show parsed story for validation
-            parsed_story = result.get("parsed_story", {})
-            
-            # Create formatted message for human validation
-            message_parts = []
-            message_parts.append("## Parsed User Story")
-            
-            if parsed_story:
-                if 'Objective' in parsed_story and parsed_story['Objective']:
-                    message_parts.append(f"**Objective:** {parsed_story['Objective']}")
-                if 'Test Summary' in parsed_story and parsed_story['Test Summary']:
-                    message_parts.append(f"**Test Summary:** {parsed_story['Test Summary']}")
-                if 'Acceptance Criteria' in parsed_story and parsed_story['Acceptance Criteria']:
-                    message_parts.append("**Acceptance Criteria:**")
-                    for i, crit in enumerate(parsed_story['Acceptance Criteria'], 1):
-                        message_parts.append(f"{i}. {crit}")
-                if 'Applications Involved' in parsed_story and parsed_story['Applications Involved']:
-                    message_parts.append(f"**Applications Involved:** {', '.join(parsed_story['Applications Involved'])}")
-                if 'Manual_Steps' in parsed_story and parsed_story['Manual_Steps']:
-                    message_parts.append("**Manual Steps:**")
-                    for i, step in enumerate(parsed_story['Manual_Steps'], 1):
-                        message_parts.append(f"{i}. {step}")
-                if 'Test_Automation' in parsed_story and parsed_story['Test_Automation']:
-                    message_parts.append("**Test Automation Steps:**")
-                    for i, step in enumerate(parsed_story['Test_Automation'], 1):
-                        message_parts.append(f"{i}. {step}")
-            
-            # Add missing fields if any
-            missing_fields = result.get("missing_fields", [])
-            if missing_fields:
-                message_parts.append("")
-                message_parts.append("## Missing Fields")
-                message_parts.append(f"The following fields are missing: {', '.join(missing_fields)}")
-            
-            # Add feedback prompt
+        # Add missing fields if any
+        missing_fields = result.get("missing_fields", [])
+        if missing_fields:
             message_parts.append("")
-            message_parts.append("**Please review the parsed user story above and provide feedback.**")
-            message_parts.append("**Type 'approve' to proceed or provide specific feedback.**")
-            
-            message_md = "\n".join(message_parts)
-            
-            return {
-                "role": "ai",
-                "message": parsed_story,
-                "metadata": {
-                    "run_id": result.get("RunID", run_id),
-                }
+            message_parts.append("## Missing Fields")
+            message_parts.append(f"The following fields are missing: {', '.join(missing_fields)}")
+        
+        # Add feedback prompt
+        message_parts.append("")
+        message_parts.append("**Please review the parsed user story above and provide feedback.**")
+        message_parts.append("**Type 'approve' to proceed or provide specific feedback.**")
+        
+        message_md = "\n".join(message_parts)
+        
+        return {
+            "role": "ai",
+            "message": parsed_story,
+            "metadata": {
+                "run_id": result.get("RunID", run_id),
             }
-            
-        else:
-            # Workflow completed - return final results
-            test_case = result.get("Test_case", "")
-            gherkin_scenario = result.get("gherkins_scenario", "")
-            playwright_script = result.get("playwright_code", "")
-            steps = result.get("steps", [])
-            
-            print(f"✅ Workflow completed successfully")
-            print(f"  Test case generated: {bool(test_case)}")
-            print(f"  Gherkin scenario generated: {bool(gherkin_scenario)}")
-            print(f"  Playwright script generated: {bool(playwright_script)}")
-            print(f"  Steps generated: {len(steps)}")
-            
-            # Generate markdown report if test artifacts exist
-            markdown_content = ""
-            try:
-                if test_case or gherkin_scenario or playwright_script:
-                    # Create a simple markdown report since the generator doesn't exist
-                    markdown_content = f"""# Test Generation Report
+        }
+        
+    else:
+        # Workflow completed - return final results
+        test_case = result.get("Test_case", "")
+        gherkin_scenario = result.get("gherkins_scenario", "")
+        playwright_script = result.get("playwright_code", "")
+        steps = result.get("steps", [])
+        
+        print(f"✅ Workflow completed successfully")
+        print(f"  Test case generated: {bool(test_case)}")
+        print(f"  Gherkin scenario generated: {bool(gherkin_scenario)}")
+        print(f"  Playwright script generated: {bool(playwright_script)}")
+        print(f"  Steps generated: {len(steps)}")
+        
+        # Generate markdown report if test artifacts exist
+        markdown_content = ""
+        try:
+            if test_case or gherkin_scenario or playwright_script:
+                # Create a simple markdown report since the generator doesn't exist
+                markdown_content = f"""# Test Generation Report
 
 ## Run ID: {run_id}
 
@@ -241,28 +261,257 @@ async def workflow_handler(request: WorkflowRequest):
 
 Generated on: {datetime.now().isoformat()}
 """
-                    print(f"📄 Simple markdown report generated")
-                        
-            except Exception as e:
-                print(f"⚠️ Error generating markdown report: {e}")
-                markdown_content = f"Error generating markdown report: {str(e)}"
-            
-            return {
-                "role": "ai",
-                "message": "Test Generation Completed Successfully",
-                "metadata": {
-                    "run_id": result.get("RunID", run_id),
-                    "test_case": test_case,
-                    "test_script": playwright_script
-                    }
-            }
+                print(f"📄 Simple markdown report generated")
+                    
+        except Exception as e:
+            print(f"⚠️ Error generating markdown report: {e}")
+            markdown_content = f"Error generating markdown report: {str(e)}"
+        
+        return {
+            "role": "ai",
+            "message": "Test Generation Completed Successfully",
+            "metadata": {
+                "run_id": result.get("RunID", run_id),
+                "test_case": test_case,
+                "test_script": playwright_script
+                }
+        }
+
+
+def run_workflow_job(run_input: Dict[str, Any], config: Dict[str, Any], job) -> Dict[str, Any]:
+    """Run the graph on a job worker thread, recording per-node progress"""
+    token_callback = None
+    if job.progress is not None:
+        # Streamed runs also forward the LLM tokens of every node
+        def on_token(content: str):
+            job.emit("token", {"content": content})
+
+        token_callback = llm_token_callback.set(on_token)
+        config = {**config, "callbacks": [TokenStreamHandler(on_token)]}
+    try:
+        for mode, chunk in workflow.stream(run_input, config, stream_mode=["updates", "debug"]):
+            if mode == "debug":
+                if chunk.get("type") == "task":
+                    job.record_node_start(chunk["payload"]["name"])
+                    job.emit("node_start", {"node": chunk["payload"]["name"]})
+                continue
+            for node, update in chunk.items():
+                job.record_node_end(node, update)
+                artifacts = {key: value for key, value in (update or {}).items() if key in STREAM_ARTIFACT_KEYS}
+                job.emit("node_end", {"node": node, "artifacts": artifacts})
+    finally:
+        # Pool threads are reused, so the next job must not inherit this run's token sink
+        if token_callback is not None:
+            llm_token_callback.reset(token_callback)
+    
+    result = workflow.get_state(config).values
+    print(f"✅ Workflow execution completed")
+    print(f"  Final status: {result.get('workflow_status', 'unknown')}")
+    print(f"  Awaiting human input: {result.get('awaiting_human_input', False)}")
+    return result
+
+
+# Workflow runs execute on a bounded thread pool so the event loop stays free
+job_manager = create_job_manager(run_workflow_job, format_workflow_result)
+
+
+def submit_workflow_job(request: WorkflowRequest, progress=None):
+    """Queue a workflow run, mapping queue errors to HTTP errors"""
+    run_id, run_input = build_run_input(request)
+    try:
+        return job_manager.submit(run_id, run_input, progress)
+    except RunAlreadyActive as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
 
+
+@app.post("/workflow")
+async def workflow_handler(request: WorkflowRequest):
+    print("Received request:", request.dict())
+    
+    try:
+        job = submit_workflow_job(request)
+        
+        # Wait for the job without blocking the event loop. A client that disconnects cancels
+        # this wait, not the job: it keeps running and can still be polled at /workflow/jobs
+        return await asyncio.shield(asyncio.wrap_future(job.future))
+
+    except HTTPException as e:
+        if e.status_code in (409, 429):
+            raise
+        print(f"❌ Exception in workflow_handler: {str(e.detail)}")
+        raise HTTPException(status_code=500, detail=f"Workflow error: {str(e)}")
     except Exception as e:
         print(f"❌ Exception in workflow_handler: {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Workflow error: {str(e)}")
 
+@app.post("/jobs", status_code=202)
+async def create_job(request: WorkflowRequest):
+    """Queue a workflow run and return its job id immediately"""
+    print("Received job request:", request.dict())
+    job = submit_workflow_job(request)
+    return {
+        **job.to_dict(),
+        "status_url": f"/jobs/{job.job_id}",
+        "result_url": f"/jobs/{job.job_id}/result",
+    }
+
+@app.get("/jobs")
+async def list_jobs():
+    """Status of queued, running and recently finished jobs"""
+    return {
+        **job_manager.stats(),
+        "items": [job.to_dict() for job in job_manager.list()],
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status and per-node progress of one job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """The /workflow response of a finished job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if not job.finished:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is still {job.status}")
+    if job.error:
+        raise HTTPException(status_code=500, detail=f"Workflow error: {job.error}")
+    return job.result
+
+@app.get("/runs")
+async def list_runs(status: Optional[str] = None, limit: int = 100):
+    """Checkpointed runs, optionally filtered by status (running, awaiting_human_input, completed)"""
+    return {"items": workflow.checkpointer.run_index.list(status=status, limit=limit)}
+
+@app.get("/runs/{run_id}")
+async def get_run(run_id: str):
+    """Index entry of one checkpointed run"""
+    run = workflow.checkpointer.run_index.get(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail=f"Run {run_id} not found")
+    return run
+
+@app.get("/runs/{run_id}/trace")
+async def get_run_trace_breakdown(run_id: str):
+    """Per-node latency, token and cost breakdown of a run"""
+    from config.tracing import get_run_trace
+    trace = get_run_trace(run_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"No trace recorded for run {run_id}")
+    return trace
+
+@app.get("/patient-pool")
+async def patient_pool_status():
+    """Number of test patients per pool and state"""
+    from config.patient_pool import get_patient_pool
+    return {"pools": get_patient_pool().counts()}
+
+@app.post("/patient-pool/leases/{lease_id}/{action}")
+async def settle_patient_lease(lease_id: str, action: str):
+    """Confirm (the run got past intake), release, or flag for review (the run's outcome is unknown) the patient reserved for a generated script"""
+    from config.patient_pool import get_patient_pool
+    if action not in ("confirm", "release", "review"):
+        raise HTTPException(status_code=404, detail=f"Unknown lease action '{action}', expected confirm, release or review")
+    pool = get_patient_pool()
+    settled = pool.flag_for_review(lease_id) if action == "review" else pool.settle(lease_id, used=action == "confirm")
+    if not settled:
+        raise HTTPException(status_code=404, detail=f"Lease {lease_id} not found or already expired")
+    return {"lease_id": lease_id, "status": {"confirm": "used", "release": "available", "review": "review"}[action]}
+
+# State fields sent with each node_end event so clients can render partial results
+STREAM_ARTIFACT_KEYS = [
+    "workflow_status",
+    "parsed_story",
+    "missing_fields",
+    "steps",
+    "Test_case",
+    "gherkins_scenario",
+    "playwright_code",
+    "awaiting_human_input",
+]
+STREAM_KEEPALIVE_SECONDS = 15
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Encode one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class TokenStreamHandler(BaseCallbackHandler):
+    """Forwards tokens from LangChain chat models invoked inside graph nodes"""
+
+    def __init__(self, on_token):
+        self.on_token = on_token
+        self.streamed_runs = set()
+
+    def on_llm_new_token(self, token: str, *, run_id=None, **kwargs: Any) -> None:
+        if token:
+            self.streamed_runs.add(run_id)
+            self.on_token(token)
+
+    def on_llm_end(self, response, *, run_id=None, **kwargs: Any) -> None:
+        # Non-streaming models only report their output once it is complete
+        if run_id in self.streamed_runs:
+            self.streamed_runs.discard(run_id)
+            return
+        for generations in response.generations:
+            for generation in generations:
+                if generation.text:
+                    self.on_token(generation.text)
+
+
+@app.post("/workflow/stream")
+def workflow_stream_handler(request: WorkflowRequest):
+    """
+    Same as /workflow, but streams progress as server-sent events:
+    run_started, node_start, token, node_end, then done (the /workflow response) or error.
+
+    The run is queued on the same job pool as /workflow and /jobs, so it counts
+    against WORKFLOW_MAX_CONCURRENT_JOBS and is refused while its run is active.
+    """
+    print("Received stream request:", request.dict())
+    events: "queue.Queue" = queue.Queue()
+    job = submit_workflow_job(request, progress=lambda event, data: events.put((event, data)))
+
+    def on_done(future):
+        if future.cancelled():
+            events.put(("error", {"detail": "Workflow job was cancelled"}))
+        elif future.exception() is not None:
+            events.put(("error", {"detail": f"Workflow error: {str(future.exception())}"}))
+        else:
+            print(f"✅ Workflow stream completed")
+            events.put(("done", future.result()))
+
+    job.future.add_done_callback(on_done)
+
+    def event_stream():
+        yield sse_event("run_started", {"run_id": job.run_id, "job_id": job.job_id})
+        while True:
+            try:
+                event, data = events.get(timeout=STREAM_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                continue
+            yield sse_event(event, data)
+            if event in ("done", "error"):
+                break
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, timeout_keep_alive=200000)
\ No newline at end of file
@@ -0,0 +1,3 @@
+"""
+SOP ingestion module
+"""
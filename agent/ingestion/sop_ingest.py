@@ -0,0 +1,280 @@
+"""
+Incremental SOP ingestion: chunk, hash, embed only new or changed chunks and bulk-upsert them
+
+    python -m ingestion.sop_ingest path/to/sops [more paths] [--prune] [--dry-run] [--full]
+"""
+
+import argparse
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from config.embedding_cache import normalize_embedding_text
+from config.settings import settings
+
+DOCUMENT_TYPES = {".md": "markdown", ".markdown": "markdown", ".txt": "text", ".docx": "docx"}
+HEADERS_TO_SPLIT_ON = [("#", "h1"), ("##", "h2"), ("###", "h3")]
+
+
+def collect_files(paths: Iterable[str]) -> List[Path]:
+    """Expand files and directories into the supported SOP documents, sorted for stable ordering"""
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(p for p in path.rglob("*") if p.suffix.lower() in DOCUMENT_TYPES and not p.name.startswith("~$"))
+        elif path.suffix.lower() in DOCUMENT_TYPES:
+            files.append(path)
+        else:
+            print(f"⚠️ Skipping unsupported file: {path}")
+    return sorted(set(files))
+
+
+def load_document(path: Path) -> str:
+    """Read a document as markdown; docx headings become markdown headers"""
+    if DOCUMENT_TYPES[path.suffix.lower()] != "docx":
+        return path.read_text(encoding="utf-8", errors="replace")
+    try:
+        import docx
+    except ImportError:
+        raise RuntimeError("Reading .docx SOPs needs the 'python-docx' package")
+
+    lines = []
+    for paragraph in docx.Document(str(path)).paragraphs:
+        text = paragraph.text.strip()
+        if not text:
+            continue
+        style = paragraph.style.name if paragraph.style is not None else ""
+        if style.startswith("Heading ") and style[8:].isdigit():
+            lines.append("#" * min(int(style[8:]), 3) + " " + text)
+        elif style == "Title":
+            lines.append("# " + text)
+        else:
+            lines.append(text)
+    return "\n\n".join(lines)
+
+
+def chunk_hash(text: str, metadata: Dict[str, Any]) -> str:
+    payload = "\n".join([metadata.get("scenario", ""), metadata.get("file_name", ""), normalize_embedding_text(text)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def chunk_document(path: Path, source: str, chunk_size: int, chunk_overlap: int) -> List[Dict[str, Any]]:
+    """
+    Split a document on its headers, then by size.
+
+    Chunk ids are derived from the source and the content hash, so an unchanged
+    chunk keeps its id across runs and an edited one gets a new id.
+    """
+    from langchain_text_splitters import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
+
+    sections = MarkdownHeaderTextSplitter(HEADERS_TO_SPLIT_ON, strip_headers=False).split_text(load_document(path))
+    pieces = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap).split_documents(sections)
+
+    chunks = []
+    seen: Set[str] = set()
+    for index, piece in enumerate(pieces):
+        headers = [piece.metadata[key] for _, key in HEADERS_TO_SPLIT_ON if piece.metadata.get(key)]
+        metadata = {
+            "scenario": headers[-1] if headers else path.stem,
+            "section": " > ".join(headers),
+            "file_name": path.name,
+            "document_type": DOCUMENT_TYPES[path.suffix.lower()],
+            "source": source,
+            "chunk_index": index,
+        }
+        content_hash = chunk_hash(piece.page_content, metadata)
+        chunk_id = hashlib.sha256(f"{source}\n{content_hash}".encode("utf-8")).hexdigest()[:32]
+        if chunk_id in seen:
+            # Repeated boilerplate within a file adds nothing to retrieval
+            continue
+        seen.add(chunk_id)
+        metadata["content_hash"] = content_hash
+        chunks.append({"id": chunk_id, "text": piece.page_content, "metadata": metadata})
+    return chunks
+
+
+class IngestManifest:
+    """SQLite record of which chunk ids each target index already holds"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ingested_chunks (
+                target TEXT NOT NULL,
+                id TEXT NOT NULL,
+                source TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                indexed_at REAL NOT NULL,
+                PRIMARY KEY (target, id)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ingested_chunks_source ON ingested_chunks(target, source)")
+        self._conn.commit()
+
+    def ids_for_source(self, target: str, source: str) -> Set[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT id FROM ingested_chunks WHERE target = ? AND source = ?", (target, source)).fetchall()
+        return {row[0] for row in rows}
+
+    def sources(self, target: str) -> Set[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT source FROM ingested_chunks WHERE target = ?", (target,)).fetchall()
+        return {row[0] for row in rows}
+
+    def record(self, target: str, chunks: List[Dict[str, Any]]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO ingested_chunks (target, id, source, content_hash, indexed_at) VALUES (?, ?, ?, ?, ?)",
+                [(target, c["id"], c["metadata"]["source"], c["metadata"]["content_hash"], now) for c in chunks],
+            )
+            self._conn.commit()
+
+    def forget(self, target: str, ids: List[str]) -> None:
+        with self._lock:
+            self._conn.executemany("DELETE FROM ingested_chunks WHERE target = ? AND id = ?", [(target, i) for i in ids])
+            self._conn.commit()
+
+
+def store_target_name(store) -> str:
+    """Identify the index a store writes to, so the manifest can track several targets"""
+    for attr in ("index_name", "table", "path"):
+        if getattr(store, attr, None):
+            return f"{type(store).__name__}:{getattr(store, attr)}"
+    return type(store).__name__
+
+
+def upsert_vectors(store, vectors: List[List[float]], chunks: List[Dict[str, Any]], bulk_size: int) -> None:
+    """Write pre-computed vectors with whichever bulk API the store offers"""
+    texts = [c["text"] for c in chunks]
+    metadatas = [c["metadata"] for c in chunks]
+    ids = [c["id"] for c in chunks]
+    if hasattr(store, "add_vectors"):
+        store.add_vectors(vectors, texts, metadatas, ids)
+    elif hasattr(store, "add_embeddings"):
+        # OpenSearchVectorSearch indexes by _id, so re-sending an id overwrites it
+        store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids, bulk_size=max(bulk_size, len(ids)))
+    else:
+        raise TypeError(f"{type(store).__name__} does not support bulk vector upserts")
+
+
+def ingest(
+    paths: Iterable[str],
+    store,
+    embeddings,
+    manifest: IngestManifest,
+    batch_size: int,
+    chunk_size: int,
+    chunk_overlap: int,
+    prune: bool = False,
+    dry_run: bool = False,
+    full: bool = False,
+) -> Dict[str, int]:
+    """
+    Bring the target index in line with the given SOP files.
+
+    Chunks already recorded in the manifest are skipped. New chunks are embedded
+    and upserted `batch_size` at a time and recorded after each batch, so an
+    interrupted run (e.g. after throttling) resumes where it stopped. Chunks that
+    disappeared from a file are deleted at the end; with `prune`, so are files
+    that are no longer present.
+    """
+    paths = list(paths)
+    target = store_target_name(store)
+    files = collect_files(paths)
+    roots = [Path(p).resolve() for p in paths]
+
+    pending: List[Dict[str, Any]] = []
+    stale: List[str] = []
+    seen_sources: Set[str] = set()
+    total_chunks = 0
+    for path in files:
+        resolved = path.resolve()
+        root = next((r for r in roots if r.is_dir() and r in resolved.parents), resolved.parent)
+        source = resolved.relative_to(root).as_posix()
+        seen_sources.add(source)
+
+        chunks = chunk_document(path, source, chunk_size, chunk_overlap)
+        total_chunks += len(chunks)
+        known = set() if full else manifest.ids_for_source(target, source)
+        current = {c["id"] for c in chunks}
+        pending.extend(c for c in chunks if c["id"] not in known)
+        stale.extend(known - current)
+
+    if prune:
+        for source in manifest.sources(target) - seen_sources:
+            stale.extend(manifest.ids_for_source(target, source))
+
+    print(f"📚 {len(files)} SOP files, {total_chunks} chunks: {len(pending)} to embed, {len(stale)} to delete ({target})")
+    stats = {"files": len(files), "chunks": total_chunks, "embedded": 0, "deleted": 0}
+    if dry_run:
+        return stats
+
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        try:
+            vectors = embeddings.embed_documents([c["text"] for c in batch])
+            upsert_vectors(store, vectors, batch, bulk_size=batch_size)
+        except Exception as e:
+            print(f"❌ Ingestion stopped after {stats['embedded']}/{len(pending)} chunks: {e}")
+            print("   Re-run the same command to resume; finished batches will be skipped")
+            raise
+        manifest.record(target, batch)
+        stats["embedded"] += len(batch)
+        print(f"✅ Upserted {stats['embedded']}/{len(pending)} chunks")
+
+    if stale:
+        store.delete(ids=stale)
+        manifest.forget(target, stale)
+        stats["deleted"] = len(stale)
+        print(f"🗑️ Deleted {len(stale)} stale chunks")
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Incrementally ingest SOP markdown/docx files into the SOP index")
+    parser.add_argument("paths", nargs="+", help="SOP files or directories")
+    parser.add_argument("--backend", choices=["opensearch", "local", "pgvector"], help="Defaults to SOP_RETRIEVER_BACKEND")
+    parser.add_argument("--batch-size", type=int, default=settings.SOP_INGEST_BATCH_SIZE)
+    parser.add_argument("--chunk-size", type=int, default=settings.SOP_INGEST_CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=settings.SOP_INGEST_CHUNK_OVERLAP)
+    parser.add_argument("--prune", action="store_true", help="Delete chunks of files that are no longer present")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without embedding")
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and re-upsert every chunk")
+    args = parser.parse_args(argv)
+
+    if args.backend:
+        settings.SOP_RETRIEVER_BACKEND = args.backend
+    from config.llm_config import create_embeddings, create_sop_store
+
+    store = create_sop_store()
+    if not (hasattr(store, "add_vectors") or hasattr(store, "add_embeddings")):
+        raise SystemExit(f"❌ SOP store for backend '{settings.SOP_RETRIEVER_BACKEND}' is not available")
+    if hasattr(store, "migrate"):
+        store.migrate()
+
+    ingest(
+        args.paths,
+        store,
+        create_embeddings(),
+        IngestManifest(settings.SOP_INGEST_MANIFEST_PATH),
+        batch_size=args.batch_size,
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        prune=args.prune,
+        dry_run=args.dry_run,
+        full=args.full,
+    )
+
+
+if __name__ == "__main__":
+    main()
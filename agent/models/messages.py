@@ -14,7 +14,12 @@ def add_message_to_state(
     content: str, 
     metadata: Optional[Dict[str, Any]] = None
 ) -> GraphState:
-    """Helper function to add messages to state"""
+    """
+    Helper function to add messages to state.
+
+    Inside a graph node `messages` holds only the node's own new messages; the
+    `messages` reducer appends them to the run history.
+    """
     current_messages = state.get("messages", []) or []
     
     if role == "human":
@@ -40,8 +45,8 @@ def add_workflow_step(
     details: Optional[str] = None, 
     error: Optional[str] = None
 ) -> GraphState:
-    """Add a workflow step to the state"""
-    current_steps = state.get("workflow_steps", [])
+    """Add a workflow step to the state (appended by the `workflow_steps` reducer)"""
+    current_steps = state.get("workflow_steps", []) or []
     
     new_step = {
         "step_name": step_name,
@@ -61,8 +66,8 @@ def add_audit_entry(
     user: Optional[str] = None, 
     data: Optional[Dict[str, Any]] = None
 ) -> GraphState:
-    """Add an audit entry to the state"""
-    current_audit = state.get("audit_trail", [])
+    """Add an audit entry to the state (appended by the `audit_trail` reducer)"""
+    current_audit = state.get("audit_trail", []) or []
     
     new_entry = {
         "action": action,
@@ -100,8 +105,8 @@ class MessageUtils:
     
     @staticmethod
     def clear_messages(state: GraphState) -> GraphState:
-        """Clear all messages"""
-        return {**state, "messages": []}
+        """Clear all messages (None resets the `messages` channel)"""
+        return {**state, "messages": None}
     
     @staticmethod
     def format_messages_for_display(state: GraphState) -> str:
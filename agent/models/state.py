@@ -2,9 +2,103 @@
 State models for the workflow
 """
 
-from typing import TypedDict, Optional, List, Dict, Any, Union
+from collections import Counter
+from typing import Annotated, TypedDict, Optional, List, Dict, Any, Union
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 
+from config.settings import settings
+
+
+def _append_capped(left: Optional[list], right: Optional[list], limit: int, rollup) -> list:
+    """
+    Append `right` to `left`, rolling entries beyond `limit` into one summary entry.
+
+    Returning None from a node clears the channel.
+    """
+    if right is None:
+        return []
+    merged = (left or []) + list(right)
+    if not limit or len(merged) <= limit:
+        return merged
+    # Keep the newest limit - 1 entries and fold the rest (and any earlier rollup) into one
+    rolled, kept = merged[: len(merged) - limit + 1], merged[len(merged) - limit + 1:]
+    return [rollup(rolled)] + kept
+
+
+def _is_rollup(entry: Any) -> bool:
+    if isinstance(entry, dict):
+        return entry.get("rollup_count") is not None
+    return getattr(entry, "additional_kwargs", {}).get("rollup_count") is not None
+
+
+def _rollup_count(entries: list) -> int:
+    count = 0
+    for entry in entries:
+        if isinstance(entry, dict):
+            count += entry.get("rollup_count") or 1
+        else:
+            count += getattr(entry, "additional_kwargs", {}).get("rollup_count") or 1
+    return count
+
+
+def _rollup_messages(messages: list) -> SystemMessage:
+    count = _rollup_count(messages)
+    return SystemMessage(
+        content=f"[{count} earlier messages rolled up]",
+        additional_kwargs={"rollup_count": count},
+    )
+
+
+def _rollup_workflow_steps(steps: list) -> Dict[str, Any]:
+    count = _rollup_count(steps)
+    failed = sum(1 for step in steps if step.get("status") == "failed")
+    return {
+        "step_name": "rollup",
+        "status": "rolled_up",
+        "timestamp": steps[-1].get("timestamp"),
+        "details": f"{count} earlier workflow steps rolled up",
+        "error": f"{failed} failed steps rolled up" if failed else None,
+        "rollup_count": count,
+    }
+
+
+def _rollup_audit_entries(entries: list) -> Dict[str, Any]:
+    actions = Counter()
+    for entry in entries:
+        if _is_rollup(entry):
+            actions.update((entry.get("data") or {}).get("actions", {}))
+        else:
+            actions[entry.get("action")] += 1
+    count = _rollup_count(entries)
+    return {
+        "action": "rollup",
+        "timestamp": entries[-1].get("timestamp"),
+        "user": None,
+        "details": f"{count} earlier audit entries rolled up",
+        "data": {"actions": dict(actions)},
+        "rollup_count": count,
+    }
+
+
+def append_messages(left: Optional[list], right: Optional[list]) -> list:
+    """Reducer for `messages`: nodes return only the messages they add"""
+    return _append_capped(left, right, settings.STATE_MAX_MESSAGES, _rollup_messages)
+
+
+def append_workflow_steps(left: Optional[list], right: Optional[list]) -> list:
+    """Reducer for `workflow_steps`: nodes return only the steps they add"""
+    return _append_capped(left, right, settings.STATE_MAX_WORKFLOW_STEPS, _rollup_workflow_steps)
+
+
+def append_audit_entries(left: Optional[list], right: Optional[list]) -> list:
+    """Reducer for `audit_trail`: nodes return only the entries they add"""
+    return _append_capped(left, right, settings.STATE_MAX_AUDIT_ENTRIES, _rollup_audit_entries)
+
+
+# Channels whose node outputs are appended rather than replaced
+APPEND_ONLY_KEYS = ("messages", "workflow_steps", "audit_trail")
+
+
 class GraphState(TypedDict):
     """Main state for the workflow graph"""
     RunID: str
@@ -17,13 +111,16 @@ class GraphState(TypedDict):
     validated: Optional[bool]
     updated_steps: Optional[List[str]]
     gherkins_scenario: Optional[str]
+    steps_markdown_file: Optional[str]  # Artifact URIs, see config.artifact_store
+    gherkin_file: Optional[str]
     message: Optional[str]
-    messages: Optional[List[Union[HumanMessage, AIMessage, SystemMessage]]]
+    messages: Annotated[Optional[List[Union[HumanMessage, AIMessage, SystemMessage]]], append_messages]
     llm_suggestion: Optional[str]
     llm_feedback: Optional[str]
     accept: Optional[bool]
     edited_fields: Optional[dict]
     sop_context: List[str]
+    sop_prefetch: Optional[Dict[str, Any]]  # SOP retrieval started alongside parse_user_story
     workflow_status: str
     Test_case: Optional[str]
     last: Optional[Dict[str, Any]]
@@ -35,6 +132,13 @@ class GraphState(TypedDict):
     
     # Playwright code generation fields
     playwright_code: Optional[str]
+    patient_lease: Optional[Dict[str, Any]]  # Patient reserved for playwright_code until its run is reported
+    playwright_file: Optional[str]
+    
+    # Append-only history, see APPEND_ONLY_KEYS
+    workflow_steps: Annotated[Optional[List[Dict[str, Any]]], append_workflow_steps]
+    audit_trail: Annotated[Optional[List[Dict[str, Any]]], append_audit_entries]
+    current_step: Optional[str]
 
 class WorkflowStep(TypedDict):
     """Individual workflow step tracking"""
@@ -1,20 +1,32 @@
 from langchain_openai import AzureOpenAIEmbeddings
-import httpx
+from config.http_clients import get_http_client
+from config.embedding_cache import with_embedding_cache
+import threading
 import os
 
-import httpx
+# Process-wide registry of embeddings clients keyed by model and options
+_embeddings_registry = {}
+_embeddings_registry_lock = threading.Lock()
 
 def get_azure_embeddings(model_name: str, api_version: str = '2023-05-15', **kwargs):
-    return AzureOpenAIEmbeddings(
-            model=model_name,
-            # azure_deployment=model_name,
-            api_version=api_version,
-            http_client= httpx.Client(verify = False),
-            timeout = 4000,
-            chunk_size=8000,
-            max_retries=5,                  # <--- This is the main control
-            retry_min_seconds=60,
-            retry_max_seconds=120,
-            show_progress_bar=True,
-            **kwargs
-        )
\ No newline at end of file
+    key = (model_name, api_version, repr(sorted(kwargs.items())))
+    with _embeddings_registry_lock:
+        embeddings = _embeddings_registry.get(key)
+        if embeddings is None:
+            embeddings = AzureOpenAIEmbeddings(
+                    model=model_name,
+                    # azure_deployment=model_name,
+                    api_version=api_version,
+                    http_client=get_http_client(verify=False),
+                    timeout = 4000,
+                    chunk_size=8000,
+                    max_retries=5,                  # <--- This is the main control
+                    retry_min_seconds=60,
+                    retry_max_seconds=120,
+                    show_progress_bar=True,
+                    **kwargs
+                )
+            # Repeat queries are served from the shared embedding cache
+            embeddings = with_embedding_cache(embeddings, model=model_name)
+            _embeddings_registry[key] = embeddings
+        return embeddings
\ No newline at end of file
@@ -0,0 +1,220 @@
+"""
+Hybrid lexical + vector SOP retrieval with reranking and token-budgeted context packing
+"""
+
+import math
+import re
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has in is it of on or that the this to was were will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(str(text).lower()) if t not in _STOPWORDS]
+
+
+class BM25:
+    """Okapi BM25 over a fixed list of texts"""
+
+    def __init__(self, texts: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(tokenize(text)) for text in texts]
+        self.lengths = [sum(counts.values()) for counts in self.term_counts]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        document_frequency: Counter = Counter()
+        for counts in self.term_counts:
+            document_frequency.update(counts.keys())
+        n = len(self.term_counts)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()}
+
+    def scores(self, query: str) -> List[float]:
+        terms = [t for t in set(tokenize(query)) if t in self.idf]
+        results = []
+        for counts, length in zip(self.term_counts, self.lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length) if self.avg_length else self.k1
+            for term in terms:
+                tf = counts.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            results.append(score)
+        return results
+
+    def top(self, query: str, k: int) -> List[Tuple[int, float]]:
+        scored = [(i, s) for i, s in enumerate(self.scores(query)) if s > 0]
+        return sorted(scored, key=lambda item: item[1], reverse=True)[:k]
+
+
+def _doc_key(doc: Document) -> str:
+    return doc.id or doc.metadata.get("id") or str(hash(doc.page_content))
+
+
+def vector_candidates(store, query: str, k: int) -> List[Tuple[Document, float]]:
+    if hasattr(store, "similarity_search_with_score"):
+        return store.similarity_search_with_score(query, k=k)
+    docs = store.as_retriever(search_kwargs={"k": k}).get_relevant_documents(query, k=k)
+    return [(doc, float(doc.metadata.get("score") or 0.0)) for doc in docs]
+
+
+def lexical_candidates(store, query: str, k: int) -> List[Tuple[Document, float]]:
+    """Keyword matches from the store's own full-text search, when it has one"""
+    try:
+        if hasattr(store, "lexical_search"):
+            return store.lexical_search(query, k=k)
+        if hasattr(store, "client") and hasattr(store, "index_name"):
+            from nodes.adapters.opensearch_aws import opensearch_lexical_search
+
+            return opensearch_lexical_search(store, query, k=k)
+    except Exception as e:
+        print(f"⚠️ Lexical SOP search failed, using vector candidates only: {e}")
+    return []
+
+
+def reciprocal_rank_fusion(rankings: List[Tuple[List[str], float]], k: int = 60) -> Dict[str, float]:
+    """Weighted RRF: each ranking is (keys best-first, weight)"""
+    fused: Dict[str, float] = {}
+    for keys, weight in rankings:
+        for rank, key in enumerate(keys):
+            fused[key] = fused.get(key, 0.0) + weight / (k + rank + 1)
+    return fused
+
+
+_cross_encoders: Dict[str, Any] = {}
+_cross_encoder_lock = threading.Lock()
+
+
+def get_cross_encoder(model_name: str):
+    """Load a sentence-transformers CrossEncoder once per process, or None if unavailable"""
+    if not model_name:
+        return None
+    with _cross_encoder_lock:
+        if model_name not in _cross_encoders:
+            try:
+                from sentence_transformers import CrossEncoder
+
+                _cross_encoders[model_name] = CrossEncoder(model_name)
+                print(f"✅ Loaded SOP reranker {model_name}")
+            except ImportError:
+                print("⚠️ SOP reranker requested but 'sentence-transformers' is not installed, using score fusion")
+                _cross_encoders[model_name] = None
+            except Exception as e:
+                print(f"⚠️ Failed to load SOP reranker {model_name}, using score fusion: {e}")
+                _cross_encoders[model_name] = None
+        return _cross_encoders[model_name]
+
+
+_token_encoder = None
+
+
+def count_tokens(text: str) -> int:
+    """tiktoken count when the encoding is available, otherwise a 4-characters-per-token estimate"""
+    global _token_encoder
+    if _token_encoder is None:
+        try:
+            import tiktoken
+
+            _token_encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _token_encoder = False
+    if _token_encoder:
+        return len(_token_encoder.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+
+def pack_context(
+    docs: List[Document],
+    token_budget: int,
+    max_chunks: int,
+    count: Callable[[str], int] = count_tokens,
+) -> List[Document]:
+    """
+    Take the best-ranked chunks that fit in the token budget.
+
+    The best chunk is always kept, truncated to the budget if it is too long. The
+    rest of the budget goes to lower-ranked chunks in order, skipping any that do
+    not fit in what is left.
+    """
+    if not docs or max_chunks <= 0:
+        return []
+    top = docs[0]
+    tokens = count(top.page_content)
+    if tokens > token_budget:
+        ratio = token_budget / max(tokens, 1)
+        text = top.page_content[: int(len(top.page_content) * ratio)]
+        top = Document(page_content=text, metadata={**top.metadata, "truncated": True}, id=top.id)
+        tokens = count(text)
+    packed, used = [top], tokens
+    for doc in docs[1:]:
+        if len(packed) >= max_chunks:
+            break
+        tokens = count(doc.page_content)
+        if used + tokens <= token_budget:
+            packed.append(doc)
+            used += tokens
+    return packed
+
+
+def hybrid_search(
+    store,
+    query: str,
+    candidates: int = 20,
+    vector_weight: float = 0.5,
+    reranker_model: Optional[str] = None,
+    token_budget: int = 3000,
+    max_chunks: int = 5,
+) -> List[Document]:
+    """
+    Retrieve SOP chunks by vector and keyword similarity and pack the best under a token budget.
+
+    Vector and lexical candidates are pooled, BM25 is scored over the pool, and the
+    two rankings are combined with weighted reciprocal rank fusion. A cross-encoder,
+    when configured, reorders the fused list. Each returned document carries
+    `vector_score`, `bm25_score` and `score` (the final ranking score) in its metadata.
+    """
+    pool: Dict[str, Document] = {}
+    vector_scores: Dict[str, float] = {}
+    for doc, score in vector_candidates(store, query, candidates):
+        key = _doc_key(doc)
+        pool[key] = doc
+        vector_scores[key] = float(score)
+    for doc, _ in lexical_candidates(store, query, candidates):
+        pool.setdefault(_doc_key(doc), doc)
+    if not pool:
+        return []
+
+    keys = list(pool)
+    bm25 = BM25([pool[key].page_content for key in keys])
+    bm25_scores = dict(zip(keys, bm25.scores(query)))
+    vector_ranking = sorted(vector_scores, key=vector_scores.get, reverse=True)
+    lexical_ranking = [key for key in sorted(bm25_scores, key=bm25_scores.get, reverse=True) if bm25_scores[key] > 0]
+    fused = reciprocal_rank_fusion([(vector_ranking, vector_weight), (lexical_ranking, 1.0 - vector_weight)])
+    ranked = sorted(keys, key=lambda key: fused.get(key, 0.0), reverse=True)
+    final_scores = {key: fused.get(key, 0.0) for key in keys}
+
+    cross_encoder = get_cross_encoder(reranker_model) if reranker_model else None
+    if cross_encoder is not None:
+        rerank_scores = cross_encoder.predict([(query, pool[key].page_content) for key in ranked])
+        final_scores = {key: float(score) for key, score in zip(ranked, rerank_scores)}
+        ranked = sorted(ranked, key=final_scores.get, reverse=True)
+
+    docs = []
+    for key in ranked:
+        doc = pool[key]
+        metadata = {
+            **doc.metadata,
+            "vector_score": vector_scores.get(key),
+            "bm25_score": round(bm25_scores.get(key, 0.0), 4),
+            "score": final_scores[key],
+        }
+        docs.append(Document(page_content=doc.page_content, metadata=metadata, id=doc.id))
+    packed = pack_context(docs, token_budget, max_chunks)
+    print(f"🔍 Hybrid SOP retrieval: {len(pool)} candidates, packed {len(packed)} chunks under {token_budget} tokens")
+    return packed
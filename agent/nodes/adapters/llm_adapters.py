@@ -1,18 +1,41 @@
-import httpx
+import threading
 import dotenv
 
 dotenv.load_dotenv()
 
+# Process-wide registry of chat clients keyed by deployment and options
+_llm_registry = {}
+_llm_registry_lock = threading.Lock()
+
 def get_azure_llm(model_name: str, api_version: str = '2024-10-21', **kwargs):
     from langchain_openai.chat_models import AzureChatOpenAI
     from dotenv import load_dotenv
-    load_dotenv()
-    return AzureChatOpenAI(
-            azure_deployment=model_name,
-            api_version=api_version,
-            http_client= httpx.Client(verify = False),
-            **kwargs
-        )
+    from config.llm_cache import create_langchain_cache
+    from config.http_clients import get_http_client, get_async_http_client
+
+    key = (model_name, api_version, repr(sorted(kwargs.items())))
+    llm = _llm_registry.get(key)
+    if llm is not None:
+        return llm
+
+    with _llm_registry_lock:
+        llm = _llm_registry.get(key)
+        if llm is None:
+            load_dotenv()
+            # Temperature 0 calls are served from the response cache unless the caller passes cache=False
+            if "cache" not in kwargs:
+                cache = create_langchain_cache(model_name, api_version, kwargs.get("temperature"))
+                if cache is not None:
+                    kwargs["cache"] = cache
+            llm = AzureChatOpenAI(
+                    azure_deployment=model_name,
+                    api_version=api_version,
+                    http_client=get_http_client(verify=False),
+                    http_async_client=get_async_http_client(verify=False),
+                    **kwargs
+                )
+            _llm_registry[key] = llm
+        return llm
 
 if __name__ == "__main__":
     llm = get_azure_llm("ai-coe-gpt41")
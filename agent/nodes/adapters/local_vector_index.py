@@ -0,0 +1,318 @@
+"""
+In-process vector index for SOP documents, a local alternative to OpenSearch
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+VECTORS_FILE = "vectors.npy"
+DOCUMENTS_FILE = "documents.jsonl"
+IVF_FILE = "ivf.npz"
+MANIFEST_FILE = "index.json"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+def train_ivf(vectors: np.ndarray, n_lists: int, iterations: int = 20, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Spherical k-means over normalized vectors; returns the centroids and each vector's list"""
+    rng = np.random.default_rng(seed)
+    n_lists = max(1, min(n_lists, len(vectors)))
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    assignments = np.zeros(len(vectors), dtype=np.int64)
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for i in range(n_lists):
+            members = vectors[assignments == i]
+            if len(members):
+                centroids[i] = members.sum(axis=0)
+        centroids = _normalize(centroids)
+    return centroids, assignments
+
+
+class LocalVectorIndex(VectorStore):
+    """
+    Cosine-similarity index over a memory-mapped float32 matrix.
+
+    An index directory holds `vectors.npy` (normalized, row-aligned with
+    `documents.jsonl`), `index.json` with the dimension, count and embeddings
+    model, and, for larger indexes, `ivf.npz` with k-means centroids. With IVF
+    the rows are stored grouped by list so a probe scans contiguous slices;
+    without it every query is an exact matrix-vector product.
+
+    The index is reloaded when `index.json` changes on disk, so a rebuild is
+    picked up by running servers without a restart.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        embedding: Embeddings,
+        nprobe: int = 4,
+        ivf_min_vectors: int = 2048,
+        ivf_lists: int = 0,
+    ):
+        self.path = Path(path)
+        self.embedding = embedding
+        self.nprobe = nprobe
+        self.ivf_min_vectors = ivf_min_vectors
+        self.ivf_lists = ivf_lists
+        self._lock = threading.Lock()
+        self._loaded_mtime: Optional[int] = None
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._documents: List[Dict[str, Any]] = []
+        self._centroids: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+        self._manifest: Dict[str, Any] = {}
+        self._bm25 = None
+        self._maybe_reload()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self) -> int:
+        self._maybe_reload()
+        return len(self._documents)
+
+    # Loading and saving
+
+    def _maybe_reload(self) -> None:
+        manifest_path = self.path / MANIFEST_FILE
+        try:
+            mtime = manifest_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._loaded_mtime:
+            return
+        with self._lock:
+            if mtime == self._loaded_mtime:
+                return
+            try:
+                manifest = json.loads(manifest_path.read_text())
+                vectors = np.load(self.path / VECTORS_FILE, mmap_mode="r")
+                with open(self.path / DOCUMENTS_FILE, encoding="utf-8") as f:
+                    documents = [json.loads(line) for line in f if line.strip()]
+                centroids = offsets = None
+                if manifest.get("ivf"):
+                    ivf = np.load(self.path / IVF_FILE)
+                    centroids, offsets = ivf["centroids"], ivf["offsets"]
+                if len(documents) != vectors.shape[0]:
+                    raise ValueError(f"{len(documents)} documents but {vectors.shape[0]} vectors")
+            except Exception as e:
+                # Most likely a rebuild in progress; keep serving the previous snapshot
+                print(f"⚠️ Could not load local vector index at {self.path}: {e}")
+                return
+
+            self._vectors, self._documents = vectors, documents
+            self._centroids, self._offsets = centroids, offsets
+            self._manifest = manifest
+            self._bm25 = None
+            self._loaded_mtime = mtime
+        print(f"📚 Loaded local vector index from {self.path} ({len(documents)} documents, IVF={'on' if centroids is not None else 'off'})")
+
+    def save(self, vectors: np.ndarray, documents: List[Dict[str, Any]]) -> None:
+        """Write a complete index, replacing whatever is in the directory"""
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        manifest: Dict[str, Any] = {
+            "count": len(documents),
+            "dim": int(vectors.shape[1]) if len(vectors) else 0,
+            "model": getattr(self.embedding, "model", None),
+            "ivf": False,
+            "updated_at": time.time(),
+        }
+
+        ivf_arrays = None
+        if len(vectors) >= self.ivf_min_vectors:
+            n_lists = self.ivf_lists or int(np.sqrt(len(vectors)))
+            centroids, assignments = train_ivf(vectors, n_lists)
+            order = np.argsort(assignments, kind="stable")
+            vectors = vectors[order]
+            documents = [documents[i] for i in order]
+            offsets = np.searchsorted(assignments[order], np.arange(len(centroids) + 1))
+            ivf_arrays = {"centroids": centroids, "offsets": offsets}
+            manifest.update({"ivf": True, "n_lists": len(centroids)})
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        suffix = f".{uuid.uuid4().hex}.tmp"
+        with open(self.path / (VECTORS_FILE + suffix), "wb") as f:
+            np.save(f, vectors)
+        with open(self.path / (DOCUMENTS_FILE + suffix), "w", encoding="utf-8") as f:
+            for document in documents:
+                f.write(json.dumps(document, default=str) + "\n")
+        if ivf_arrays is not None:
+            with open(self.path / (IVF_FILE + suffix), "wb") as f:
+                np.savez(f, **ivf_arrays)
+            os.replace(self.path / (IVF_FILE + suffix), self.path / IVF_FILE)
+        os.replace(self.path / (VECTORS_FILE + suffix), self.path / VECTORS_FILE)
+        os.replace(self.path / (DOCUMENTS_FILE + suffix), self.path / DOCUMENTS_FILE)
+        # The manifest is written last; readers reload when it changes
+        (self.path / (MANIFEST_FILE + suffix)).write_text(json.dumps(manifest, indent=1))
+        os.replace(self.path / (MANIFEST_FILE + suffix), self.path / MANIFEST_FILE)
+        self._maybe_reload()
+
+    # VectorStore interface
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        """Embed and append texts, rewriting the index files"""
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [uuid.uuid4().hex for _ in texts]
+        new_vectors = np.asarray(self.embedding.embed_documents(texts), dtype=np.float32)
+        return self.add_vectors(new_vectors, texts, metadatas, ids)
+
+    def add_vectors(self, vectors: np.ndarray, texts: List[str], metadatas: List[dict], ids: List[str]) -> List[str]:
+        """Upsert pre-computed vectors by id, e.g. exported from OpenSearch, without calling the embeddings API"""
+        self._maybe_reload()
+        vectors = np.asarray(vectors, dtype=np.float32)
+        new_documents = [
+            {"id": doc_id, "page_content": text, "metadata": metadata or {}}
+            for doc_id, text, metadata in zip(ids, texts, metadatas)
+        ]
+        replaced = set(ids)
+        keep = [i for i, document in enumerate(self._documents) if document["id"] not in replaced]
+        existing = np.asarray(self._vectors)[keep] if keep else np.zeros((0, vectors.shape[1]), dtype=np.float32)
+        self.save(np.vstack([existing, vectors]), [self._documents[i] for i in keep] + new_documents)
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        self._maybe_reload()
+        drop = set(ids)
+        keep = [i for i, document in enumerate(self._documents) if document["id"] not in drop]
+        if len(keep) == len(self._documents):
+            return False
+        self.save(np.asarray(self._vectors)[keep], [self._documents[i] for i in keep])
+        return True
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k=k, **kwargs)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k=k, **kwargs)]
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 4, nprobe: Optional[int] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        """Top-k documents by cosine similarity; `score` is also copied into each document's metadata"""
+        self._maybe_reload()
+        vectors, documents = self._vectors, self._documents
+        centroids, offsets = self._centroids, self._offsets
+        if not documents or k <= 0:
+            return []
+
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        if query.shape[0] != vectors.shape[1]:
+            raise ValueError(f"Query has {query.shape[0]} dimensions but the local index at {self.path} has {vectors.shape[1]}")
+        if centroids is not None:
+            probe = min(nprobe or self.nprobe, len(centroids))
+            lists = np.argsort(centroids @ query)[::-1][:probe]
+            rows = np.concatenate([np.arange(offsets[i], offsets[i + 1]) for i in lists])
+            scores = np.asarray(vectors[rows]) @ query
+        else:
+            rows = None
+            scores = np.asarray(vectors) @ query
+        if not len(scores):
+            return []
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for i in top:
+            row = int(rows[i]) if rows is not None else int(i)
+            document = documents[row]
+            score = float(scores[i])
+            metadata = {**document["metadata"], "score": score}
+            results.append((Document(page_content=document["page_content"], metadata=metadata, id=document["id"]), score))
+        return results
+
+    def lexical_search(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        """BM25 keyword search over every document in the index"""
+        from nodes.adapters.hybrid_retriever import BM25
+
+        self._maybe_reload()
+        documents = self._documents
+        bm25 = self._bm25
+        if bm25 is None or bm25[0] is not documents:
+            bm25 = (documents, BM25([document["page_content"] for document in documents]))
+            self._bm25 = bm25
+        results = []
+        for row, score in bm25[1].top(query, k):
+            document = documents[row]
+            metadata = {**document["metadata"], "score": score}
+            results.append((Document(page_content=document["page_content"], metadata=metadata, id=document["id"]), score))
+        return results
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # Scores are cosine similarities in [-1, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        path: Optional[str] = None,
+        **kwargs: Any,
+    ) -> "LocalVectorIndex":
+        if path is None:
+            raise ValueError("LocalVectorIndex.from_texts requires an index path")
+        index = cls(path, embedding, **kwargs)
+        index.add_texts(texts, metadatas=metadatas)
+        return index
+
+
+def export_opensearch_index(store, index: LocalVectorIndex, batch_size: int = 500) -> int:
+    """
+    Copy every document and its stored vector from an OpenSearchVectorSearch index.
+
+    Vectors are reused as-is, so no embeddings calls are made.
+    """
+    from nodes.adapters.opensearch_aws import iter_opensearch_documents
+
+    vectors, documents = [], []
+    for document in iter_opensearch_documents(store, batch_size=batch_size):
+        vectors.append(document.pop("vector"))
+        documents.append(document)
+    if not vectors:
+        return 0
+    index.save(np.asarray(vectors, dtype=np.float32), documents)
+    return len(vectors)
+
+
+if __name__ == "__main__":
+    # Snapshot the configured OpenSearch index into LOCAL_VECTOR_INDEX_PATH
+    from config.settings import settings
+    from config.llm_config import create_embeddings, create_opensearch_client
+
+    embeddings = create_embeddings()
+    local_index = LocalVectorIndex(settings.LOCAL_VECTOR_INDEX_PATH, embeddings,
+                                   ivf_min_vectors=settings.LOCAL_VECTOR_INDEX_IVF_MIN_VECTORS,
+                                   ivf_lists=settings.LOCAL_VECTOR_INDEX_IVF_LISTS)
+    store = create_opensearch_client()
+    if not hasattr(store, "client"):
+        raise SystemExit("❌ OpenSearch is not reachable, nothing to export")
+    count = export_opensearch_index(store, local_index)
+    print(f"✅ Exported {count} documents to {settings.LOCAL_VECTOR_INDEX_PATH}")
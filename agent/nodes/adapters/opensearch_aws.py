@@ -19,6 +19,34 @@ def get_aws_open_search(index_name : str , embeddings : Embeddings):
         http_auth = (os.getenv("OPENSEARCH_USERNAME"), os.getenv("OPENSEARCH_PASS"))
     )
 
+def iter_opensearch_documents(store: OpenSearchVectorSearch, batch_size: int = 500):
+    """Yield every stored document of an OpenSearchVectorSearch index with its vector"""
+    from opensearchpy.helpers import scan
+
+    for hit in scan(store.client, index=store.index_name, query={"query": {"match_all": {}}}, size=batch_size):
+        source = hit["_source"]
+        if "vector_field" not in source:
+            continue
+        yield {
+            "id": hit["_id"],
+            "page_content": source.get("text", ""),
+            "metadata": source.get("metadata") or {},
+            "vector": source["vector_field"],
+        }
+
+def opensearch_lexical_search(store: OpenSearchVectorSearch, query: str, k: int = 4):
+    """BM25 match query on the text field of an OpenSearchVectorSearch index"""
+    from langchain_core.documents import Document
+
+    response = store.client.search(index=store.index_name, body={"size": k, "query": {"match": {"text": query}}, "_source": {"excludes": ["vector_field"]}})
+    results = []
+    for hit in response["hits"]["hits"]:
+        source = hit["_source"]
+        score = float(hit["_score"])
+        metadata = {**(source.get("metadata") or {}), "score": score}
+        results.append((Document(page_content=source.get("text", ""), metadata=metadata, id=hit["_id"]), score))
+    return results
+
 if __name__ ==  "__main__":
     from langchain_core.documents import Document
     from uuid import uuid4
@@ -0,0 +1,296 @@
+"""
+pgvector-backed SOP store on the Aurora PostgreSQL cluster
+"""
+
+import asyncio
+import json
+import re
+import uuid
+from typing import Any, Callable, Iterable, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def to_vector_literal(vector: Sequence[float]) -> str:
+    """pgvector text format, so no client-side vector adapter is needed"""
+    return "[" + ",".join(repr(float(x)) for x in vector) + "]"
+
+
+class PgVectorStore(VectorStore):
+    """
+    SOP documents and embeddings in one Postgres table with an HNSW cosine index.
+
+    Sync calls use a psycopg ConnectionPool; async calls (ainvoke, aget_relevant_documents)
+    use an AsyncConnectionPool opened on first use. Documents are upserted by id, so
+    re-ingesting an SOP replaces its rows in place.
+    """
+
+    def __init__(
+        self,
+        conn_string: str,
+        embedding: Embeddings,
+        table: str = "sop_documents",
+        dimensions: int = 1536,
+        pool_size: int = 5,
+        hnsw_m: int = 16,
+        hnsw_ef_construction: int = 64,
+        ef_search: int = 40,
+    ):
+        if not _IDENTIFIER.match(table):
+            raise ValueError(f"Invalid pgvector table name: {table!r}")
+        from psycopg_pool import ConnectionPool
+
+        self.conn_string = conn_string
+        self.embedding = embedding
+        self.table = table
+        self.dimensions = dimensions
+        self.pool_size = pool_size
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.ef_search = ef_search
+        self.pool = ConnectionPool(
+            conn_string,
+            min_size=1,
+            max_size=pool_size,
+            kwargs={"autocommit": True, "prepare_threshold": 0},
+            open=True,
+        )
+        self._async_pool = None
+        # Held across create + open, so no caller gets the async pool before it is open
+        self._async_pool_lock = asyncio.Lock()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    # Schema
+
+    def migrate(self) -> None:
+        """Create the extension, table and HNSW index if they do not exist"""
+        with self.pool.connection() as conn:
+            conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+            conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    id TEXT PRIMARY KEY,
+                    content TEXT NOT NULL,
+                    metadata JSONB NOT NULL DEFAULT '{{}}'::jsonb,
+                    embedding vector({int(self.dimensions)}) NOT NULL,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+                """
+            )
+            conn.execute(
+                f"""
+                CREATE INDEX IF NOT EXISTS {self.table}_embedding_hnsw
+                ON {self.table} USING hnsw (embedding vector_cosine_ops)
+                WITH (m = {int(self.hnsw_m)}, ef_construction = {int(self.hnsw_ef_construction)})
+                """
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_file_name ON {self.table} ((metadata->>'file_name'))")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_content_fts ON {self.table} USING gin (to_tsvector('english', content))")
+        print(f"✅ pgvector table {self.table} is ready ({self.dimensions} dimensions)")
+
+    def count(self) -> int:
+        with self.pool.connection() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    # Writes
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        vectors = self.embedding.embed_documents(texts)
+        return self.add_vectors(vectors, texts, metadatas or [{} for _ in texts], ids or [uuid.uuid4().hex for _ in texts])
+
+    def add_vectors(self, vectors: Sequence[Sequence[float]], texts: List[str], metadatas: List[dict], ids: List[str]) -> List[str]:
+        """Upsert pre-computed vectors in one batch"""
+        rows = [
+            (doc_id, text, json.dumps(metadata or {}, default=str), to_vector_literal(vector))
+            for doc_id, text, metadata, vector in zip(ids, texts, metadatas, vectors)
+        ]
+        with self.pool.connection() as conn:
+            with conn.transaction():
+                with conn.cursor() as cur:
+                    cur.executemany(
+                        f"""
+                        INSERT INTO {self.table} (id, content, metadata, embedding, updated_at)
+                        VALUES (%s, %s, %s::jsonb, %s::vector, now())
+                        ON CONFLICT (id) DO UPDATE SET
+                            content = EXCLUDED.content,
+                            metadata = EXCLUDED.metadata,
+                            embedding = EXCLUDED.embedding,
+                            updated_at = now()
+                        """,
+                        rows,
+                    )
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        with self.pool.connection() as conn:
+            cur = conn.execute(f"DELETE FROM {self.table} WHERE id = ANY(%s)", (list(ids),))
+            return cur.rowcount > 0
+
+    # Search
+
+    def _search_sql(self) -> str:
+        return (
+            f"SELECT id, content, metadata, 1 - (embedding <=> %(q)s::vector) AS score "
+            f"FROM {self.table} ORDER BY embedding <=> %(q)s::vector LIMIT %(k)s"
+        )
+
+    @staticmethod
+    def _to_results(rows) -> List[Tuple[Document, float]]:
+        results = []
+        for doc_id, content, metadata, score in rows:
+            metadata = metadata if isinstance(metadata, dict) else json.loads(metadata or "{}")
+            score = float(score)
+            results.append((Document(page_content=content, metadata={**metadata, "score": score}, id=doc_id), score))
+        return results
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k=k, **kwargs)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k=k, **kwargs)]
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        """Top-k documents by cosine similarity; `score` is also copied into each document's metadata"""
+        params = {"q": to_vector_literal(embedding), "k": k}
+        with self.pool.connection() as conn:
+            with conn.transaction():
+                conn.execute(f"SET LOCAL hnsw.ef_search = {int(self.ef_search)}")
+                rows = conn.execute(self._search_sql(), params).fetchall()
+        return self._to_results(rows)
+
+    def lexical_search(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        """Postgres full-text search, ranked by ts_rank_cd; any query term may match"""
+        # plainto_tsquery ANDs every term, which a long user story would never satisfy
+        sql = (
+            f"SELECT id, content, metadata, ts_rank_cd(to_tsvector('english', content), q) AS score "
+            f"FROM {self.table}, to_tsquery('english', replace(plainto_tsquery('english', %(q)s)::text, ' & ', ' | ')) q "
+            f"WHERE to_tsvector('english', content) @@ q ORDER BY score DESC LIMIT %(k)s"
+        )
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, {"q": query, "k": k}).fetchall()
+        return self._to_results(rows)
+
+    async def _get_async_pool(self):
+        if self._async_pool is None:
+            from psycopg_pool import AsyncConnectionPool
+
+            async with self._async_pool_lock:
+                if self._async_pool is None:
+                    pool = AsyncConnectionPool(
+                        self.conn_string,
+                        min_size=1,
+                        max_size=self.pool_size,
+                        kwargs={"autocommit": True, "prepare_threshold": 0},
+                        open=False,
+                    )
+                    await pool.open()
+                    self._async_pool = pool
+        return self._async_pool
+
+    async def asimilarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in await self.asimilarity_search_with_score(query, k=k, **kwargs)]
+
+    async def asimilarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        embedding = await self.embedding.aembed_query(query)
+        pool = await self._get_async_pool()
+        params = {"q": to_vector_literal(embedding), "k": k}
+        async with pool.connection() as conn:
+            async with conn.transaction():
+                await conn.execute(f"SET LOCAL hnsw.ef_search = {int(self.ef_search)}")
+                cur = await conn.execute(self._search_sql(), params)
+                rows = await cur.fetchall()
+        return self._to_results(rows)
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # Scores are cosine similarities in [-1, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    def close(self) -> None:
+        self.pool.close()
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        conn_string: Optional[str] = None,
+        **kwargs: Any,
+    ) -> "PgVectorStore":
+        if conn_string is None:
+            raise ValueError("PgVectorStore.from_texts requires a conn_string")
+        store = cls(conn_string, embedding, **kwargs)
+        store.migrate()
+        store.add_texts(texts, metadatas=metadatas)
+        return store
+
+
+def pgvector_conn_string() -> str:
+    """SOP_PGVECTOR_URL, or the Aurora cluster from the DB_* variables"""
+    from config.settings import settings
+
+    return settings.SOP_PGVECTOR_URL or settings.db_conn_string()
+
+
+def create_pgvector_store(embedding: Embeddings) -> PgVectorStore:
+    """Build the store from settings"""
+    from config.settings import settings
+
+    return PgVectorStore(
+        pgvector_conn_string(),
+        embedding,
+        table=settings.SOP_PGVECTOR_TABLE,
+        dimensions=settings.SOP_PGVECTOR_DIMENSIONS,
+        pool_size=settings.SOP_PGVECTOR_POOL_SIZE,
+        hnsw_m=settings.SOP_PGVECTOR_HNSW_M,
+        hnsw_ef_construction=settings.SOP_PGVECTOR_HNSW_EF_CONSTRUCTION,
+        ef_search=settings.SOP_PGVECTOR_EF_SEARCH,
+    )
+
+
+if __name__ == "__main__":
+    # python -m nodes.adapters.pgvector_store migrate            create the table and HNSW index
+    # python -m nodes.adapters.pgvector_store import-opensearch  copy documents and vectors from OpenSearch
+    import argparse
+
+    from config.llm_config import create_embeddings, create_opensearch_client
+    from nodes.adapters.opensearch_aws import iter_opensearch_documents
+
+    parser = argparse.ArgumentParser(description="Manage the pgvector SOP store")
+    parser.add_argument("command", choices=["migrate", "import-opensearch"])
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    store = create_pgvector_store(create_embeddings())
+    store.migrate()
+    if args.command == "import-opensearch":
+        source = create_opensearch_client()
+        if not hasattr(source, "client"):
+            raise SystemExit("❌ OpenSearch is not reachable, nothing to import")
+        batch, imported = [], 0
+        for document in iter_opensearch_documents(source, batch_size=args.batch_size):
+            batch.append(document)
+            if len(batch) >= args.batch_size:
+                store.add_vectors([d["vector"] for d in batch], [d["page_content"] for d in batch], [d["metadata"] for d in batch], [d["id"] for d in batch])
+                imported += len(batch)
+                batch = []
+        if batch:
+            store.add_vectors([d["vector"] for d in batch], [d["page_content"] for d in batch], [d["metadata"] for d in batch], [d["id"] for d in batch])
+            imported += len(batch)
+        print(f"✅ Imported {imported} documents into {store.table} ({store.count()} total)")
+    store.close()
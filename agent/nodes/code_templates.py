@@ -0,0 +1,179 @@
+"""
+Slot-filling code templates for the per-application Playwright scripts.
+
+Each application's element reference code is a fixed, working script in which
+only a handful of input values change between scenarios (NDC, SIG, quantity,
+BIN/PCN, ...). Instead of asking the LLM to re-emit the whole script, a
+template declares those values as typed slots, the LLM only returns a small
+JSON object of slot values, and the script is rendered locally.
+"""
+
+import json
+import re
+import textwrap
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_community.callbacks import get_openai_callback
+
+# Slot markers look like {{slot_name}} so they never clash with Python braces
+# or the {patient_id}/{intake_id} placeholders the templates already use
+SLOT_MARKER = re.compile(r"\{\{(\w+)\}\}")
+
+# Values are rendered inside quoted strings and XPath literals, so quotes,
+# backslashes and newlines are never allowed
+SAFE_VALUE = re.compile(r"[A-Za-z0-9 .,()/&+:%#_-]*")
+
+
+class TemplateSlot:
+    """A typed input value inside a code template"""
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        default: Any,
+        value_type: type = str,
+        pattern: Optional[str] = None,
+        choices: Optional[List[str]] = None,
+        upper: bool = False,
+    ):
+        self.name = name
+        self.description = description
+        self.default = default
+        self.value_type = value_type
+        self.pattern = re.compile(pattern) if pattern else None
+        self.choices = choices
+        # Upper-case codes and labels: the model's casing is normalised before validation
+        self.upper = upper
+
+    def coerce(self, value: Any) -> Optional[str]:
+        """Return the rendered form of `value`, or None if it is not valid for this slot"""
+        if value is None:
+            return None
+        try:
+            value = self.value_type(value)
+        except (TypeError, ValueError):
+            return None
+
+        rendered = str(value).strip()
+        if self.upper:
+            rendered = rendered.upper()
+        if self.choices and rendered not in self.choices:
+            return None
+        if self.pattern and not self.pattern.fullmatch(rendered):
+            return None
+        if not rendered or not SAFE_VALUE.fullmatch(rendered):
+            return None
+        return rendered
+
+    def describe(self) -> Dict[str, Any]:
+        """Slot description included in the extraction prompt"""
+        description = {
+            "type": "integer" if self.value_type is int else "string",
+            "description": self.description,
+            "default": self.default,
+        }
+        if self.choices:
+            description["choices"] = self.choices
+        return description
+
+
+class CodeTemplate:
+    """A working reference script with typed input slots"""
+
+    def __init__(self, application: str, source: str, slots: List[TemplateSlot]):
+        self.application = application
+        self.source = textwrap.dedent(source).strip("\n") + "\n"
+        self.slots = {slot.name: slot for slot in slots}
+
+        unknown = set(SLOT_MARKER.findall(self.source)) - set(self.slots)
+        if unknown:
+            raise ValueError(f"{application} template uses undeclared slots: {', '.join(sorted(unknown))}")
+
+    def defaults(self) -> Dict[str, str]:
+        """Slot values the reference script was written with"""
+        return {name: slot.coerce(slot.default) for name, slot in self.slots.items()}
+
+    def resolve(self, values: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+        """
+        Validate `values` against the slot types; slots left out (or null) keep their default.
+
+        Raises ValueError when a given value is invalid: rendering the default instead
+        would test a different scenario than the one in the steps.
+        """
+        resolved = self.defaults()
+        invalid = []
+        for name, value in (values or {}).items():
+            slot = self.slots.get(name)
+            if slot is None or value is None:
+                continue
+            rendered = slot.coerce(value)
+            if rendered is None:
+                invalid.append(f"{name}={value!r}")
+                continue
+            resolved[name] = rendered
+        if invalid:
+            raise ValueError(f"{self.application}: invalid slot values {', '.join(invalid)}")
+        return resolved
+
+    def render(self, values: Optional[Dict[str, Any]] = None) -> str:
+        """Render the script with the given slot values"""
+        return self._substitute(self.resolve(values))
+
+    def _substitute(self, resolved: Dict[str, str]) -> str:
+        return SLOT_MARKER.sub(lambda match: resolved[match.group(1)], self.source)
+
+    def extraction_messages(self, steps: str) -> list:
+        """Build the prompt asking the LLM for slot values only"""
+        slot_spec = json.dumps({name: slot.describe() for name, slot in self.slots.items()}, indent=1)
+        system_prompt = f"""
+    You are an expert QA automation engineer. A working Playwright script for the {self.application} application already exists.
+    Only its input values change between test scenarios. Your job is to read the scenario steps and return the input values.
+
+    Instructions:
+    1) Read the scenario steps and extract only the input values for the {self.application} application.
+    2) Return ONLY a JSON object whose keys are the slot names below. No explanation or markdown.
+    3) If a value is not given in the steps, use the slot's default.
+    4) When a slot has choices, return one of the choices exactly.
+    5) DO NOT return the patient id or common intake id; those are filled in automatically.
+
+    SLOTS:
+    {slot_spec}
+    """
+        return [SystemMessage(system_prompt), HumanMessage(f"<Scenario Steps>\n{steps}\n</Scenario Steps>")]
+
+    def extract_slot_values(self, steps: str, llm) -> Dict[str, Any]:
+        """Ask the LLM for the slot values used by `steps`"""
+        with get_openai_callback() as cb:
+            response = llm.invoke(self.extraction_messages(steps)).content
+        print(f"Script - {self.application} Total Tokens: {cb.total_tokens}")
+        print(f"Script - {self.application} Prompt Tokens: {cb.prompt_tokens}")
+        print(f"Script - {self.application} Completion Tokens: {cb.completion_tokens}")
+        return parse_slot_values(response)
+
+    def generate(self, steps: str, llm) -> str:
+        """Extract slot values for `steps` and render the script; raises if extraction fails or a value is invalid"""
+        try:
+            values = self.extract_slot_values(steps, llm)
+        except Exception as e:
+            print(f"[CODEGEN] ❌ {self.application}: slot extraction failed: {e}")
+            raise
+        try:
+            resolved = self.resolve(values)
+        except ValueError as e:
+            print(f"[CODEGEN] ❌ {e}")
+            raise
+        print(f"[CODEGEN] {self.application} slot values: {resolved}")
+        return self._substitute(resolved)
+
+
+def parse_slot_values(llm_output: str) -> Dict[str, Any]:
+    """Parse the JSON object of slot values out of an LLM response"""
+    match = re.search(r"\{.*\}", llm_output, re.DOTALL)
+    if not match:
+        raise ValueError("No JSON object found in slot extraction response")
+    values = json.loads(match.group(0))
+    if not isinstance(values, dict):
+        raise ValueError("Slot extraction response is not a JSON object")
+    return values
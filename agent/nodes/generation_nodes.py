@@ -20,12 +20,11 @@ from langchain_core.messages import SystemMessage, HumanMessage
 from langchain_community.callbacks import get_openai_callback
 #from Patient_ID_generator import get_random_patient_data
 from models.messages import add_message_to_state, add_workflow_step
-from nodes.agent_utils import find_element_across_frames
 from time import sleep
-import pytest
-from playwright.sync_api import sync_playwright, Page, expect
 from nodes.intake_code import generate_intake_steps
-from nodes.patient_id_generator import patient_id_generator
+from config.artifact_store import save_run_artifact
+from nodes.patient_id_generator import lease_patient, release_patient, reserve_patient, stamp_patient_lease
+from nodes.sop_compression import compress_sop_context
 
 # Add the current directory to Python path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -157,7 +156,7 @@ def generate_steps_llm(state: GraphState) -> GraphState:
         print("⚠️ No SOP documents found, unable to fetch SOP")
         raise RuntimeError("Unable to fetch SOP documents for test case generation")
     else:
-        sop_context_display = sop_context
+        sop_context_display = compress_sop_context(sop_context, state["parsed_story"], applications_involved)
         print("✅ Using retrieved SOP documents")
 
     patient_id = "1*******"
@@ -186,7 +185,7 @@ def generate_steps_llm(state: GraphState) -> GraphState:
     7. Do include any steps for TDM tool.
     8. Do include any steps for database check.
     9. **ALWAYS** Use the input fields given in the {parsed_story} except patient ID and common intake ID.
-    10. If all the required input fields are not there in {parsed_story} then used the input fields from {sop_context_display}
+    10. If all the required input fields are not there in {parsed_story} then used the input fields from the SOP CONTEXT above
     11. Use patient ID and common intake ID from {patient_id} and {COMMON_INTAKE_ID}. The document id is the common intake ID.
     12. Do not use this step **use the value from 'document_id' in the provided JSON; if None, skip this step or flag for manual input** 
     13. Do not use placeholder for common intake id or patient id use the actual values from {patient_id}
@@ -250,38 +249,11 @@ def generate_steps_llm(state: GraphState) -> GraphState:
             print(f"  {idx}. {step}")
         print()
     
-    # Save steps to markdown file with datetime
-    try:
-        from datetime import datetime
-        import os
-        
-        # Create steps directory if it doesn't exist
-        steps_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "steps")
-        os.makedirs(steps_dir, exist_ok=True)
-        
-        # Generate filename with datetime
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"automation_steps_{timestamp}.md"
-        filepath = os.path.join(steps_dir, filename)
-        
-        # Create markdown content - just the steps
-        markdown_content = ""
-        
-        # Add numbered steps only
-        for idx, step in enumerate(filtered_steps, 1):
-            markdown_content += f"{idx}. {step}\n"
-        
-        # Write to file
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(markdown_content)
-        
-        print(f"📄 Steps saved to: {filepath}")
-        
-        # Add file path to state
-        state["steps_markdown_file"] = filepath
-        
-    except Exception as e:
-        print(f"⚠️ Error saving steps to markdown: {e}")
+    # Save the steps as markdown in this run's artifact directory
+    markdown_content = "".join(f"{idx}. {step}\n" for idx, step in enumerate(filtered_steps, 1))
+    steps_artifact = save_run_artifact(state, "automation_steps.md", markdown_content)
+    if steps_artifact:
+        state["steps_markdown_file"] = steps_artifact["uri"]
     
     return {**state, "steps": filtered_steps, "workflow_status": workflow_status}
 
@@ -326,15 +298,8 @@ def generate_test_case(state: GraphState) -> GraphState:
             sop_context_display = "NO SOP CONTEXT AVAILABLE - USE ONLY USER STORY AND STEPS"
             print("⚠️ No SOP context available - will use only user story and steps")
         else:
-            # Format SOP context properly
-            sop_context_display = "SOP CONTEXT:\n"
-            for i, sop_item in enumerate(sop_context, 1):
-                if isinstance(sop_item, dict):
-                    scenario = sop_item.get('scenario', f'SOP Item {i}')
-                    steps = sop_item.get('steps', 'No steps available')
-                    sop_context_display += f"\n--- SOP Item {i}: {scenario} ---\n{steps}\n"
-                else:
-                    sop_context_display += f"\n--- SOP Item {i} ---\n{str(sop_item)}\n"
+            # Same compressed form as generate_steps_llm, served from the compression cache
+            sop_context_display = "SOP CONTEXT:\n" + compress_sop_context(sop_context, parsed_story)
             print(f"✅ Using {len(sop_context)} SOP context items")
         
         prompt = f"""
@@ -536,17 +501,10 @@ def convert_to_gherkin_llm(state: GraphState) -> GraphState:
         {"node": "convert_to_gherkin", "status": "completed"}
     )
     
-    # Save Gherkin scenario to file and print only a message with the file name
+    # Save the Gherkin scenario in this run's artifact directory
     gherkin_scenario = gherkins_scenario
-    from datetime import datetime
-    import os
-    gherkin_dir = "gherkin_scenarios"
-    os.makedirs(gherkin_dir, exist_ok=True)
-    gherkin_filename = f"gherkin_{datetime.now().strftime('%Y%m%d_%H%M%S')}.feature"
-    gherkin_path = os.path.join(gherkin_dir, gherkin_filename)
-    with open(gherkin_path, "w", encoding="utf-8") as f:
-        f.write(gherkin_scenario)
-    print(f"\nGherkin file generated: {gherkin_filename}\n")
+    gherkin_artifact = save_run_artifact(state, "scenario.feature", gherkin_scenario)
+    gherkin_filename = gherkin_artifact["uri"] if gherkin_artifact else None
     
     return {**state, "gherkins_scenario": gherkin_scenario, "gherkin_file": gherkin_filename, "workflow_status": workflow_status}
 
@@ -578,21 +536,39 @@ def generate_playwright_code(state: GraphState) -> GraphState:
         
         print("********************************",patient_type_result)
         
-        patient_id, intake_id = patient_id_generator(patient_type_result)
+        patient_lease = lease_patient(patient_type_result)
         
-        print("********************************",patient_id)
+        # A script without a usable patient would fail at intake, so stop here instead
+        if patient_lease is None:
+            error = f"No unused {patient_type_result} patients left in the patient pool"
+            print(f"❌ {error}")
+            state = add_workflow_step(state, "generate_playwright_code", "failed", error=error)
+            return {**state, "playwright_code": f"Error generating Playwright code: {error}", "workflow_status": "Playwright Code Not Generated"}
+        patient_id, intake_id = patient_lease.patient_id, patient_lease.intake_id
         
-        # Handle case where patient_id_generator returns None values
-        if patient_id is None or intake_id is None:
-            print("⚠️ No patient data available, using fallback values")
-            # Use default values for testing
-            patient_id = "17164202"
-            intake_id = "CMNINTAKE08212025105220254216083"
-            print(f"Using fallback patient_id: {patient_id}, intake_id: {intake_id}")
+        print("********************************",patient_id)
 
-        playwright_code = generate_intake_steps(patient_id, intake_id, patient_type_result,steps_str)
-    
-        return {**state, "playwright_code": playwright_code, "workflow_status": "Playwright Code Generated"}
+        parsed_story = state.get("parsed_story") or {}
+        applications_involved = parsed_story.get("Applications Involved") or parsed_story.get("Applications_Involved")
+
+        try:
+            playwright_code = generate_intake_steps(patient_id, intake_id, patient_type_result,steps_str,applications_involved)
+        except Exception:
+            # The script was never written, so the patient is still unused
+            release_patient(patient_lease)
+            raise
+        # The patient is confirmed or returned when the test executor reports the run. A lease that
+        # expired during code generation may already be someone else's; its patient is baked into
+        # the script, so the script is dropped rather than sharing the patient
+        if not reserve_patient(patient_lease):
+            error = f"Lease on patient {patient_id} expired during code generation; run the workflow again for a new patient"
+            print(f"❌ {error}")
+            state = add_workflow_step(state, "generate_playwright_code", "failed", error=error)
+            return {**state, "playwright_code": f"Error generating Playwright code: {error}", "workflow_status": "Playwright Code Not Generated"}
+        playwright_code = stamp_patient_lease(playwright_code, patient_lease)
+        script_artifact = save_run_artifact(state, "test_script.py", playwright_code)
+    
+        return {**state, "playwright_code": playwright_code, "patient_lease": patient_lease.to_dict(), "playwright_file": script_artifact["uri"] if script_artifact else None, "workflow_status": "Playwright Code Generated"}
         
     except Exception as e:
         print(f"EXCEPTION TYPE (Playwright code generation): {type(e)}")
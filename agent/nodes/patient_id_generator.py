@@ -1,113 +1,54 @@
-import pandas as pd
-import os
+from typing import Optional, Tuple
 
-# Handle file path for both local and Docker environments
-direct_patient_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config', 'Direct Patient.xlsx')
-integrated_patient_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config', 'Integrated Patient.xlsx')
-reject_patient_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config', 'Direct Patient for ref reject.xlsx')
+from config.patient_pool import PatientLease, get_patient_pool, pool_for_patient_type, replenish_patient_pool
+from config.settings import settings
 
-try:
-    direct_patient_data = pd.read_excel(direct_patient_file)
-    integrated_patient_data = pd.read_excel(integrated_patient_file)
-    reject_patient_data = pd.read_excel(reject_patient_file)
-except FileNotFoundError:
-    print(f"Error: Excel file not found at {direct_patient_file}")
-    raise
-except ImportError as e:
-    print(f"Error: Missing required dependency for Excel support. Please install openpyxl: {e}")
-    raise
+# First line of a generated script; the test executor reads it to confirm or return the patient
+PATIENT_LEASE_HEADER = "# patient-lease: "
 
-def patient_id_generator(type='Direct'):
-    if type == 'Direct':
-        data = direct_patient_data
-        unused_data = data[data['comment']!='used']
-        
-        # # Check if there are any unused patient IDs available
-        # if unused_data.empty:
-        #     print("⚠️ No unused patient IDs available. Using fallback values.")
-        #     # Reset all comments to unused to allow reuse
-        #     data['comment'] = data['comment'].replace('used', '')
-        #     unused_data = data[data['comment']!='used']
-            
-        # If still empty, use the first available patient ID
-        if unused_data.empty:
-            print("⚠️ No patient data available. Using first available patient ID.")
-            # patient_id = data['Patient ID'].iloc[0]
-            # intake_id = data[data['Patient ID']==patient_id]['Document Id'].iloc[0]
-            # return patient_id, intake_id
-        
-        # Sample from available unused data
-        patient_id = unused_data['Patient ID'].sample(n=1).iloc[0]
-        intake_id = unused_data[unused_data['Patient ID']==patient_id]['Document Id'].iloc[0]
-        print(patient_id)
-        print(intake_id)
-        data.loc[data['Patient ID']==patient_id, 'comment'] = 'used'
-        try:
-            data.to_excel(direct_patient_file, index=False, sheet_name='sheet_1')
-        except PermissionError:
-            print(f"Warning: Could not write to {direct_patient_file}. Changes not saved.")
-        except Exception as e:
-            print(f"Error saving Excel file: {e}")
-    elif type == 'Integrated':
-        data = integrated_patient_data
-        unused_data = data[data['comment']!='used']
-        
-        # # Check if there are any unused patient IDs available
-        # if unused_data.empty:
-        #     print("⚠️ No unused patient IDs available for Integrated. Using fallback values.")
-        #     # Reset all comments to unused to allow reuse
-        #     data['comment'] = data['comment'].replace('used', '')
-        #     unused_data = data[data['comment']!='used']
-            
-        # If still empty, use the first available patient ID
-        if unused_data.empty:
-            print("⚠️ No patient data available for Integrated.")
-            # patient_id = data['Patient ID'].iloc[0]
-            # intake_id = data[data['Patient ID']==patient_id]['Document Id'].iloc[0]
-            # return patient_id, intake_id
-        
-        # Sample from available unused data
-        patient_id = unused_data['Patient ID'].sample(n=1).iloc[0]
-        intake_id = unused_data[unused_data['Patient ID']==patient_id]['Document Id'].iloc[0]
-        print(patient_id)
-        print(intake_id)
-        data.loc[data['Patient ID']==patient_id, 'comment'] = 'used'
-        try:
-            data.to_excel(integrated_patient_file, index=False, sheet_name='sheet_1')
-        except PermissionError:
-            print(f"Warning: Could not write to {integrated_patient_file}. Changes not saved.")
-        except Exception as e:
-            print(f"Error saving Excel file: {e}")
-    else:
-        data = reject_patient_data
-        unused_data = data[data['comment']!='used']
-        
-        # # Check if there are any unused patient IDs available
-        # if unused_data.empty:
-        #     print("⚠️ No unused patient IDs available for Reject. Using fallback values.")
-        #     # Reset all comments to unused to allow reuse
-        #     data['comment'] = data['comment'].replace('used', '')
-        #     unused_data = data[data['comment']!='used']
-            
-        # If still empty, use the first available patient ID
-        if unused_data.empty:
-            print("⚠️ No patient data available for Reject.")
-            # patient_id = data['Patient ID'].iloc[0]
-            # intake_id = data[data['Patient ID']==patient_id]['Document Id'].iloc[0]
-            # return patient_id, intake_id
-        
-        # Sample from available unused data
-        patient_id = unused_data['Patient ID'].sample(n=1).iloc[0]
-        intake_id = unused_data[unused_data['Patient ID']==patient_id]['Document Id'].iloc[0]
-        print(patient_id)
-        print(intake_id)
-        data.loc[data['Patient ID']==patient_id, 'comment'] = 'used'
-        try:
-            data.to_excel(reject_patient_file, index=False, sheet_name='sheet_1')
-        except PermissionError:
-            print(f"Warning: Could not write to {reject_patient_file}. Changes not saved.")
-        except Exception as e:
-            print(f"Error saving Excel file: {e}")
 
-        
-    return patient_id, intake_id
+def lease_patient(type='Direct') -> Optional[PatientLease]:
+    """Lease a test patient of the given patient type; release it if the run cannot use it"""
+    pool = pool_for_patient_type(type)
+    lease = get_patient_pool().allocate(pool)
+    if lease is None and replenish_patient_pool(pool).get(pool):
+        lease = get_patient_pool().allocate(pool)
+    if lease is not None:
+        print(lease.patient_id)
+        print(lease.intake_id)
+    return lease
+
+
+def reserve_patient(lease: PatientLease) -> bool:
+    """
+    Hold a leased patient until the test executor reports the run, or PATIENT_POOL_RESERVATION_SECONDS pass.
+
+    Returns False when the lease expired first: the patient may already belong to another run.
+    """
+    if not get_patient_pool().reserve(lease, settings.PATIENT_POOL_RESERVATION_SECONDS):
+        print(f"⚠️ Lease on patient {lease.patient_id} expired before it could be reserved")
+        return False
+    return True
+
+
+def release_patient(lease: Optional[PatientLease]) -> None:
+    if lease is not None:
+        get_patient_pool().release(lease)
+
+
+def mark_patient_used(lease: Optional[PatientLease]) -> None:
+    if lease is not None and not get_patient_pool().mark_used(lease):
+        print(f"⚠️ Lease on patient {lease.patient_id} expired before it was marked used")
+
+
+def stamp_patient_lease(code: str, lease: PatientLease) -> str:
+    return f"{PATIENT_LEASE_HEADER}{lease.lease_id}\n{code}"
+
+
+def patient_id_generator(type='Direct') -> Tuple[Optional[str], Optional[str]]:
+    """Take a patient for good: returns (patient_id, intake_id), or (None, None) when the pool is empty"""
+    lease = lease_patient(type)
+    if lease is None:
+        return None, None
+    mark_patient_used(lease)
+    return lease.patient_id, lease.intake_id
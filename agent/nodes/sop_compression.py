@@ -0,0 +1,155 @@
+"""
+SOP context compression for generation prompts
+"""
+
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config.settings import settings
+
+KNOWN_APPLICATIONS = ("DaaS", "TDM", "Intake", "Clearance", "RxP", "RPH", "CRM", "Trend")
+
+_HEADER = re.compile(r"^\s*(#{1,6}\s+\S|step\s*\d+\s*[:.)-])", re.IGNORECASE)
+_TEST_DATA = re.compile(r"\b\d{3,}\b")
+_PATIENT_TYPES = ("direct", "integrated")
+MIN_DEDUP_LINE_LENGTH = 40
+
+_cache: "OrderedDict[Tuple, str]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _mentions(text: str, names: Iterable[str]) -> List[str]:
+    lowered = text.lower()
+    return [name for name in names if re.search(rf"\b{re.escape(name.lower())}\b", lowered)]
+
+
+def involved_applications(applications_involved: Any) -> Tuple[str, ...]:
+    """Known application names mentioned in the parsed story's 'Applications Involved' field"""
+    return tuple(_mentions(json.dumps(applications_involved, default=str), KNOWN_APPLICATIONS)) if applications_involved else ()
+
+
+def test_data_terms(parsed_story: Any) -> Tuple[str, ...]:
+    """Identifiers (service branch, NDC, BIN, ...) and patient type from the parsed story"""
+    text = json.dumps(parsed_story, default=str) if not isinstance(parsed_story, str) else parsed_story
+    terms = set(_TEST_DATA.findall(text))
+    terms.update(_mentions(text, _PATIENT_TYPES))
+    return tuple(sorted(terms))
+
+
+def split_sections(text: str) -> List[str]:
+    """Split on header-like lines, or on blank lines when the document has no headers"""
+    lines = text.splitlines()
+    sections: List[List[str]] = [[]]
+    for line in lines:
+        if _HEADER.match(line) and any(l.strip() for l in sections[-1]):
+            sections.append([])
+        sections[-1].append(line)
+    if len(sections) == 1:
+        return [block for block in re.split(r"\n\s*\n", text) if block.strip()]
+    return ["\n".join(section) for section in sections if any(l.strip() for l in section)]
+
+
+def compress_document(text: str, applications: Tuple[str, ...], terms: Tuple[str, ...]) -> str:
+    """
+    Keep the sections of one SOP that matter for this story.
+
+    Sections about an involved application are kept and sections about other
+    applications only are dropped. A section naming no application belongs to the
+    application of the section before it; the opening sections, before any
+    application is named, are always kept, as is any section containing one of
+    the story's test data values. If filtering would leave nothing, the whole
+    text is kept.
+    """
+    sections = split_sections(text)
+    if not applications or len(sections) <= 1:
+        return text.strip()
+
+    kept = []
+    current: List[str] = []
+    for section in sections:
+        current = _mentions(section, KNOWN_APPLICATIONS) or current
+        relevant = not current or any(app in applications for app in current)
+        if relevant or any(term in section.lower() for term in terms):
+            kept.append(section.strip())
+    return "\n\n".join(kept) if kept else text.strip()
+
+
+def _document_version(document: Dict[str, Any]) -> str:
+    metadata = document.get("all_metadata") or {}
+    return metadata.get("content_hash") or hashlib.sha256(str(document.get("steps", "")).encode("utf-8")).hexdigest()
+
+
+def _cached_compress(document: Dict[str, Any], applications: Tuple[str, ...], terms: Tuple[str, ...]) -> str:
+    """Compress one retrieved document, cached per document version and story filter"""
+    key = (_document_version(document), applications, terms)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    compressed = compress_document(str(document.get("steps", "")), applications, terms)
+    with _cache_lock:
+        _cache[key] = compressed
+        while len(_cache) > settings.SOP_COMPRESSION_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return compressed
+
+
+def _parse_documents(sop_context: Any) -> List[Dict[str, Any]]:
+    """sop_context is a list holding the JSON string written by fetch_sop_agent"""
+    items = sop_context if isinstance(sop_context, list) else [sop_context]
+    documents = []
+    for item in items:
+        if isinstance(item, dict):
+            documents.append(item)
+            continue
+        try:
+            parsed = json.loads(item)
+        except (TypeError, ValueError):
+            documents.append({"steps": str(item)})
+            continue
+        documents.extend(d if isinstance(d, dict) else {"steps": str(d)} for d in (parsed if isinstance(parsed, list) else [parsed]))
+    return documents
+
+
+def compress_sop_context(sop_context: Any, parsed_story: Any, applications_involved: Optional[Any] = None) -> str:
+    """
+    Render retrieved SOP documents for a prompt, keeping only what this story needs.
+
+    Retrieval metadata (scores, sources, `all_metadata`) is dropped, each document is
+    reduced to its relevant sections, and longer lines repeated across documents
+    (overlapping chunks, shared boilerplate) appear once.
+    """
+    documents = _parse_documents(sop_context)
+    if not settings.SOP_CONTEXT_COMPRESSION:
+        return "\n\n".join(f"### {d.get('scenario', f'SOP {i}')}\n{d.get('steps', '')}" for i, d in enumerate(documents, 1))
+
+    if applications_involved is None and isinstance(parsed_story, dict):
+        applications_involved = parsed_story.get("Applications Involved") or parsed_story.get("Applications_Involved")
+    applications = involved_applications(applications_involved)
+    terms = test_data_terms(parsed_story)
+
+    seen_lines = set()
+    rendered = []
+    original_size = 0
+    for i, document in enumerate(documents, 1):
+        original_size += len(json.dumps(document, default=str))
+        lines = []
+        for line in _cached_compress(document, applications, terms).splitlines():
+            normalized = " ".join(line.split()).lower()
+            # Short lines such as "Click Submit" legitimately repeat between sections
+            if len(normalized) >= MIN_DEDUP_LINE_LENGTH:
+                if normalized in seen_lines:
+                    continue
+                seen_lines.add(normalized)
+            lines.append(line)
+        text = re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+        if text:
+            rendered.append(f"### {document.get('scenario') or f'SOP {i}'}\n{text}")
+
+    compressed = "\n\n".join(rendered)
+    print(f"🗜️ SOP context compressed from {original_size} to {len(compressed)} characters (applications: {', '.join(applications) or 'all'})")
+    return compressed
@@ -5,31 +5,15 @@ SOP (Standard Operating Procedure) related nodes
 import json
 from datetime import datetime
 from typing import Dict, Any
-from config.llm_config import llm, opensearch_client
+from config.llm_config import get_sop_store, llm
+from config.settings import settings
+from config.tracing import SPAN_RETRIEVER, annotate_current_span, trace_span
+from nodes.adapters.hybrid_retriever import hybrid_search
 from models.state import GraphState
 from models.messages import add_message_to_state, add_workflow_step
 
-def fetch_sop_agent(state: GraphState) -> GraphState:
-    """Fetch relevant SOP documents"""
-    import warnings
-    warnings.filterwarnings("ignore", category=DeprecationWarning)
-    import os
-    os.environ['TOKENIZERS_PARALLELISM'] = 'false'
-    # Suppress tqdm progress bars
-    import sys
-    class DummyFile(object):
-        def write(self, x): pass
-        def flush(self): pass
-    sys.stderr = DummyFile()
-    print("\n### 🔄 Running node: FETCH SOP\n")
-    
-    # Add workflow step
-    state = add_workflow_step(state, "fetch_sop", "in_progress")
-    
-    user_story = state.get("user_story", {})
-
-    print("^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^",user_story)
-    
+def build_sop_query(user_story) -> str:
+    """Build the SOP retrieval query from the raw user story"""
     # Fix: Ensure query is always a string, not a list
     if isinstance(user_story, dict):
         # Try multiple fields to get a meaningful query
@@ -53,75 +37,164 @@ def fetch_sop_agent(state: GraphState) -> GraphState:
     if len(query) < 10:  # If query is too short, add some context
         query = f"clearance eligibility testing {query}"
     
-    print(f"🔍 SOP Query: {query[:200]}...")
-    
-    try:
-        # Get retriever from opensearch client
-        print(f"🔍 Attempting to retrieve SOP documents for query: {query[:100]}...")
-        print(f"🔍 OpenSearch client type: {type(opensearch_client)}")
-        
+    return query
+
+def retrieve_sop_context(query: str):
+    """Retrieve SOP documents for `query`; returns the JSON context string and the number of documents"""
+    # Get retriever from opensearch client
+    opensearch_client = get_sop_store()
+    print(f"🔍 Attempting to retrieve SOP documents for query: {query[:100]}...")
+    print(f"🔍 OpenSearch client type: {type(opensearch_client)}")
+
+    if settings.SOP_RETRIEVAL_MODE == "hybrid":
+        with trace_span("hybrid_sop_retrieval", SPAN_RETRIEVER, candidates=settings.SOP_RETRIEVAL_CANDIDATES):
+            sop_context = hybrid_search(
+                opensearch_client,
+                query,
+                candidates=settings.SOP_RETRIEVAL_CANDIDATES,
+                vector_weight=settings.SOP_HYBRID_VECTOR_WEIGHT,
+                reranker_model=settings.SOP_RERANKER_MODEL,
+                token_budget=settings.SOP_CONTEXT_TOKEN_BUDGET,
+                max_chunks=settings.SOP_CONTEXT_MAX_CHUNKS,
+            )
+            annotate_current_span(documents=len(sop_context))
+    else:
         retriever = opensearch_client.as_retriever(search_kwargs={"k": 1})  # Retrieve only 1 document
         print(f"🔍 Retriever type: {type(retriever)}")
-        
+
         sop_context = retriever.get_relevant_documents(query, k=1)
-        print(f"📄 Found {len(sop_context)} SOP documents")
-        
-        if sop_context:
-            print(f"📄 First document type: {type(sop_context[0])}")
-            print(f"📄 First document content preview: {sop_context[0].page_content[:200]}...")
+    print(f"📄 Found {len(sop_context)} SOP documents")
+
+    if sop_context:
+        print(f"📄 First document type: {type(sop_context[0])}")
+        print(f"📄 First document content preview: {sop_context[0].page_content[:200]}...")
+    else:
+        print("⚠️ No documents returned from retriever")
+        return "[]", 0
+
+    # Enhanced document processing with better metadata handling
+    processed_docs = []
+    for i, doc in enumerate(sop_context):
+        # Extract scenario from various possible metadata fields (including misspelled 'sceanrio')
+        scenario = (doc.metadata.get("scenario") or
+                   doc.metadata.get("sceanrio") or  # Handle misspelled field
+                   doc.metadata.get("title") or
+                   doc.metadata.get("document_title") or
+                   doc.metadata.get("file_name") or
+                   f"Document {i+1}")
+
+        # Extract additional metadata
+        metadata_info = {
+            "scenario": scenario,
+            "steps": doc.page_content,
+            "score": getattr(doc, 'metadata', {}).get('score', 'N/A'),
+            "source": doc.metadata.get("source", "Unknown"),
+            "file_name": doc.metadata.get("file_name", "Unknown"),
+            "document_type": doc.metadata.get("document_type", "Unknown"),
+            "all_metadata": doc.metadata  # Include all metadata for debugging
+        }
+
+        processed_docs.append(metadata_info)
+
+        # Debug output for each document
+        print(f"📋 Document {i+1} Metadata:")
+        print(f"  Scenario: {scenario}")
+        print(f"  Source: {metadata_info['source']}")
+        print(f"  File Name: {metadata_info['file_name']}")
+        print(f"  Document Type: {metadata_info['document_type']}")
+        print(f"  Content Length: {len(doc.page_content)} characters")
+        #print(f"  Content Preview: {doc.page_content[:200]}...")
+
+    return json.dumps(processed_docs, indent=1), len(sop_context)
+
+def prefetch_sop(state: GraphState) -> GraphState:
+    """
+    Retrieve SOP documents while the user story is being parsed.
+
+    Runs in parallel with parse_user_story at the start of every invocation and
+    stores the result in `sop_prefetch`, so fetch_sop_agent can skip the
+    embedding and vector search after human approval. Failures and empty results
+    are not stored, so fetch_sop_agent retries them.
+    """
+    print("\n### 🔄 Running node: PREFETCH SOP\n")
+    query = build_sop_query(state.get("user_story", {}))
+
+    prefetched = state.get("sop_prefetch") or {}
+    if prefetched.get("query") == query and prefetched.get("documents_found", 0) > 0:
+        # Resumed run: keep the earlier result. A fresh dict is returned because this
+        # node must write its own channel while parse_user_story owns the others
+        print("📄 SOP prefetch already available for this user story")
+        return {"sop_prefetch": dict(prefetched)}
+
+    try:
+        sop_context_str, documents_found = retrieve_sop_context(query)
+    except Exception as e:
+        print(f"⚠️ SOP prefetch failed, fetch_sop_agent will retry: {str(e)}")
+        return {"sop_prefetch": {}}
+
+    print(f"📄 Prefetched {documents_found} SOP documents")
+    if not documents_found:
+        # Nothing to reuse; the index may have been filled by the time fetch_sop_agent runs
+        return {"sop_prefetch": {}}
+    return {
+        "sop_prefetch": {
+            "query": query,
+            "sop_context": sop_context_str,
+            "documents_found": documents_found,
+            "retrieved_at": datetime.now().isoformat()
+        }
+    }
+
+def fetch_sop_agent(state: GraphState) -> GraphState:
+    """Fetch relevant SOP documents"""
+    import warnings
+    warnings.filterwarnings("ignore", category=DeprecationWarning)
+    import os
+    os.environ['TOKENIZERS_PARALLELISM'] = 'false'
+    # Suppress tqdm progress bars
+    import sys
+    class DummyFile(object):
+        def write(self, x): pass
+        def flush(self): pass
+    sys.stderr = DummyFile()
+    print("\n### 🔄 Running node: FETCH SOP\n")
+
+    # Add workflow step
+    state = add_workflow_step(state, "fetch_sop", "in_progress")
+
+    user_story = state.get("user_story", {})
+
+    print("^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^",user_story)
+
+    query = build_sop_query(user_story)
+
+    print(f"🔍 SOP Query: {query[:200]}...")
+    
+    try:
+        prefetched = state.get("sop_prefetch") or {}
+        if prefetched.get("query") == query and prefetched.get("documents_found", 0) > 0:
+            # Retrieved in parallel with parse_user_story
+            print(f"📄 Using SOP documents prefetched at {prefetched.get('retrieved_at')}")
+            sop_context_str = prefetched["sop_context"]
+            documents_found = prefetched.get("documents_found", 0)
         else:
-            print("⚠️ No documents returned from retriever")
+            sop_context_str, documents_found = retrieve_sop_context(query)
         
-        if not sop_context:
+        if not documents_found:
             print("⚠️ No SOP documents found, using empty context")
             sop_context_str = "[]"
             workflow_status = "No SOP Found"
             state = add_workflow_step(state, "fetch_sop", "completed", "No SOP documents found, proceeding without SOP context")
         else:
-            # Enhanced document processing with better metadata handling
-            processed_docs = []
-            for i, doc in enumerate(sop_context):
-                # Extract scenario from various possible metadata fields (including misspelled 'sceanrio')
-                scenario = (doc.metadata.get("scenario") or 
-                           doc.metadata.get("sceanrio") or  # Handle misspelled field
-                           doc.metadata.get("title") or 
-                           doc.metadata.get("document_title") or
-                           doc.metadata.get("file_name") or
-                           f"Document {i+1}")
-                
-                # Extract additional metadata
-                metadata_info = {
-                    "scenario": scenario,
-                    "steps": doc.page_content,
-                    "score": getattr(doc, 'metadata', {}).get('score', 'N/A'),
-                    "source": doc.metadata.get("source", "Unknown"),
-                    "file_name": doc.metadata.get("file_name", "Unknown"),
-                    "document_type": doc.metadata.get("document_type", "Unknown"),
-                    "all_metadata": doc.metadata  # Include all metadata for debugging
-                }
-                
-                processed_docs.append(metadata_info)
-                
-                # Debug output for each document
-                print(f"📋 Document {i+1} Metadata:")
-                print(f"  Scenario: {scenario}")
-                print(f"  Source: {metadata_info['source']}")
-                print(f"  File Name: {metadata_info['file_name']}")
-                print(f"  Document Type: {metadata_info['document_type']}")
-                print(f"  Content Length: {len(doc.page_content)} characters")
-                #print(f"  Content Preview: {doc.page_content[:200]}...")
-            
-            sop_context_str = json.dumps(processed_docs, indent=1)
-            
             workflow_status = "Retrieving SOP"
-            state = add_workflow_step(state, "fetch_sop", "completed", f"SOP documents retrieved successfully ({len(sop_context)} found)")
+            state = add_workflow_step(state, "fetch_sop", "completed", f"SOP documents retrieved successfully ({documents_found} found)")
         
         # Add message to state
         state = add_message_to_state(
             state, 
             "system", 
             f"SOP documents retrieved for query: {query[:100]}...",
-            {"node": "fetch_sop", "query": query, "documents_found": len(sop_context)}
+            {"node": "fetch_sop", "query": query, "documents_found": documents_found}
         )
         
     except Exception as e:
@@ -162,4 +235,4 @@ def fetch_sop_agent(state: GraphState) -> GraphState:
     #print(f"  Content: {sop_context_str}")
     print(f"  Is empty: {sop_context_str == '[]' or sop_context_str == ''}")
     
-    return {**state, "sop_context": [sop_context_str], "sop_query": query, "workflow_status": workflow_status} 
\ No newline at end of file
+    return {**state, "sop_context": [sop_context_str], "sop_query": query, "workflow_status": workflow_status} 
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test script for the SQLite test patient pool
+Checks that concurrent workers never share a patient and that expired leases are reclaimed
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+from config.patient_pool import PatientPool
+
+POOL = "direct"
+PATIENTS = 60
+WORKERS = 8
+
+
+def make_pool(path, patients=PATIENTS):
+    pool = PatientPool(path, lease_seconds=1800, low_watermark=0)
+    pool.add_patients(POOL, [(str(17000000 + i), f"CMNINTAKE{i:06d}", "", False) for i in range(patients)])
+    return pool
+
+
+def test_concurrent_allocation():
+    """Workers with their own connection drain the pool at once; no patient is handed out twice"""
+
+    print("🔄 Allocating from several threads...")
+    path = os.path.join(tempfile.mkdtemp(), "patient_pool.sqlite")
+    make_pool(path)
+
+    leased = []
+    leased_lock = threading.Lock()
+    start = threading.Barrier(WORKERS)
+
+    def worker():
+        # Each worker opens the database itself, like separate API workers on one host
+        pool = PatientPool(path, low_watermark=0)
+        start.wait()
+        while True:
+            lease = pool.allocate(POOL)
+            if lease is None:
+                return
+            with leased_lock:
+                leased.append(lease.patient_id)
+
+    threads = [threading.Thread(target=worker) for _ in range(WORKERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    duplicates = len(leased) - len(set(leased))
+    print(f"  Leased {len(leased)} patients, {duplicates} handed out twice")
+    assert duplicates == 0, "a patient was handed out twice"
+    assert len(leased) == PATIENTS, f"expected {PATIENTS} leases, got {len(leased)}"
+    print("✅ No patient was handed out twice")
+
+
+def test_expired_leases_are_reclaimed():
+    """Expired leases go back to the pool; expired reservations go to review"""
+
+    print("🔄 Letting leases expire...")
+    path = os.path.join(tempfile.mkdtemp(), "patient_pool.sqlite")
+    pool = make_pool(path, patients=3)
+
+    expired = pool.allocate(POOL, lease_seconds=1)
+    reserved = pool.allocate(POOL, lease_seconds=1)
+    assert pool.reserve(reserved, 1)
+    kept = pool.allocate(POOL)
+    time.sleep(1.5)
+
+    assert pool.reclaim_expired() == 1
+    counts = pool.counts()[POOL]
+    print(f"  Pool after reclaim: {counts}")
+    assert counts["available"] == 1 and counts["review"] == 1 and counts["leased"] == 1
+
+    # The reclaimed patient is handed out again, and its old lease can no longer settle it
+    again = pool.allocate(POOL)
+    assert again is not None and again.patient_id == expired.patient_id
+    assert not pool.settle(expired.lease_id, used=True)
+    assert pool.settle(kept.lease_id, used=True)
+    print("✅ Expired leases were reclaimed and expired reservations flagged for review")
+
+
+if __name__ == "__main__":
+    print("🚀 Testing the patient pool")
+    print("=" * 60)
+    test_concurrent_allocation()
+    print("\n" + "=" * 60)
+    test_expired_leases_are_reclaimed()
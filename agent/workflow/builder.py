@@ -2,16 +2,52 @@
 Workflow graph builder
 """
 
-from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import InMemorySaver
-from models.state import GraphState
+from functools import wraps
+
+from langgraph.graph import StateGraph, START, END
+from config.tracing import traced_node
+from models.state import APPEND_ONLY_KEYS, GraphState
+from workflow.checkpointer import create_checkpointer
 
 # Import all nodes
 from nodes.parsing_nodes import parse_user_story_llm, check_missing_fields, fill_missing_with_llm
 from nodes.validation_nodes import human_feedback, update_missing_fields
-from nodes.sop_nodes import fetch_sop_agent
+from nodes.sop_nodes import fetch_sop_agent, prefetch_sop
 from nodes.generation_nodes import generate_steps_llm, generate_test_case, convert_to_gherkin_llm, generate_playwright_code
 
+def append_only_node(node):
+    """
+    Wrap a node so it returns only what it changed.
+
+    The node sees empty append-only lists, so the message/step/audit helpers only
+    build the node's own entries and the GraphState reducers append them to the
+    history. Keys the node passed through unchanged are dropped from its output,
+    keeping per-node writes and checkpoints small as runs grow.
+    """
+    @wraps(node)
+    def wrapper(state: GraphState):
+        node_state = {**state, **{key: [] for key in APPEND_ONLY_KEYS}}
+        before = dict(node_state)
+        result = node(node_state)
+        if not isinstance(result, dict):
+            return result
+        
+        delta = {}
+        for key, value in result.items():
+            if key in APPEND_ONLY_KEYS:
+                if value is None or value:
+                    delta[key] = value
+            elif key not in before or value is not before[key]:
+                delta[key] = value
+        
+        # LangGraph requires every node to write at least one channel
+        if not delta and result:
+            key = "workflow_status" if "workflow_status" in result else next(iter(result))
+            delta[key] = result[key]
+        return delta
+    
+    return wrapper
+
 def build_workflow():
     """Build the complete workflow graph"""
     builder = StateGraph(GraphState)
@@ -19,20 +55,26 @@ def build_workflow():
     # Set entry point
     builder.set_entry_point("parse_user_story")
     
+    # SOP retrieval doesn't depend on the parsed story, so it runs alongside parsing
+    # and fetch_sop_agent reuses the result after human approval
+    builder.add_edge(START, "prefetch_sop")
+    
     # Add all nodes
-    builder.add_node("parse_user_story", parse_user_story_llm)
-    builder.add_node("check_missing_fields", check_missing_fields)
-    builder.add_node("fill_missing_with_llm", fill_missing_with_llm)
-    builder.add_node("human_input_missing_fields", human_feedback)
-    builder.add_node("update_missing_fields", update_missing_fields)
-    builder.add_node("fetch_sop_agent", fetch_sop_agent)
-    builder.add_node("generate_steps", generate_steps_llm)
-    builder.add_node("generate_test_case", generate_test_case)
-    builder.add_node("convert_to_gherkin", convert_to_gherkin_llm)
-    builder.add_node("generate_playwright_code", generate_playwright_code)
+    builder.add_node("parse_user_story", traced_node("parse_user_story", append_only_node(parse_user_story_llm)))
+    builder.add_node("check_missing_fields", traced_node("check_missing_fields", append_only_node(check_missing_fields)))
+    builder.add_node("fill_missing_with_llm", traced_node("fill_missing_with_llm", append_only_node(fill_missing_with_llm)))
+    builder.add_node("human_input_missing_fields", traced_node("human_input_missing_fields", append_only_node(human_feedback)))
+    builder.add_node("update_missing_fields", traced_node("update_missing_fields", append_only_node(update_missing_fields)))
+    builder.add_node("prefetch_sop", traced_node("prefetch_sop", append_only_node(prefetch_sop)))
+    builder.add_node("fetch_sop_agent", traced_node("fetch_sop_agent", append_only_node(fetch_sop_agent)))
+    builder.add_node("generate_steps", traced_node("generate_steps", append_only_node(generate_steps_llm)))
+    builder.add_node("generate_test_case", traced_node("generate_test_case", append_only_node(generate_test_case)))
+    builder.add_node("convert_to_gherkin", traced_node("convert_to_gherkin", append_only_node(convert_to_gherkin_llm)))
+    builder.add_node("generate_playwright_code", traced_node("generate_playwright_code", append_only_node(generate_playwright_code)))
     
     # Add edges
     builder.add_edge("parse_user_story", "check_missing_fields")
+    builder.add_edge("prefetch_sop", END)
     
     # Add conditional edge for missing fields check
     builder.add_conditional_edges(
@@ -69,7 +111,7 @@ def build_workflow():
     builder.add_edge("generate_playwright_code", END)
     
     # Compile with checkpointing
-    saver = InMemorySaver()
+    saver = create_checkpointer()
     workflow = builder.compile(checkpointer=saver)
     return workflow
 
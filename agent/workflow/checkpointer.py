@@ -0,0 +1,326 @@
+"""
+Checkpointer factory for the workflow graph.
+
+Paused human-in-the-loop runs are resumed from their checkpoint, so the saver
+decides whether a run survives a restart or can be resumed on another replica:
+
+- memory: in-process only (the original behaviour)
+- sqlite: a local file, for development and single-container deployments
+- postgres: the shared Aurora PostgreSQL cluster, for several replicas behind the ALB
+
+Every backend compresses large checkpoint blobs, keeps a `workflow_runs` index
+by run ID and status, and deletes runs that have not been touched within the
+retention window.
+"""
+
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from config.settings import settings
+
+# Node whose completion marks a run as finished
+FINAL_NODE = "generate_playwright_code"
+
+RUN_RUNNING = "running"
+RUN_AWAITING_HUMAN_INPUT = "awaiting_human_input"
+RUN_COMPLETED = "completed"
+
+
+class CompressedSerializer:
+    """Serializer that zlib-compresses payloads above a size threshold"""
+
+    PREFIX = "zlib+"
+
+    def __init__(self, serde=None, min_bytes: int = 1024, level: int = 6):
+        self.serde = serde or JsonPlusSerializer()
+        self.min_bytes = min_bytes
+        self.level = level
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.serde.dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        return self.serde.loads(data)
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(obj)
+        if data is not None and len(data) >= self.min_bytes:
+            return f"{self.PREFIX}{type_}", zlib.compress(data, self.level)
+        return type_, data
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, payload = data
+        # Blobs written before compression was enabled have no prefix
+        if type_.startswith(self.PREFIX):
+            return self.serde.loads_typed((type_[len(self.PREFIX):], zlib.decompress(payload)))
+        return self.serde.loads_typed((type_, payload))
+
+
+def run_status(channel_values: Dict[str, Any], writes: Optional[Dict[str, Any]]) -> str:
+    """Derive the index status of a run from its latest checkpoint"""
+    if writes and FINAL_NODE in writes:
+        return RUN_COMPLETED
+    if channel_values.get("awaiting_human_input"):
+        return RUN_AWAITING_HUMAN_INPUT
+    return RUN_RUNNING
+
+
+class RunIndex:
+    """
+    `workflow_runs` table with one row per run, indexed by status and last update.
+
+    `connection` is a context manager factory yielding a DB-API connection, so the
+    same code serves a shared sqlite3 connection and a psycopg connection pool.
+    """
+
+    def __init__(self, connection, placeholder: str = "?"):
+        self._connection = connection
+        self._p = placeholder
+
+    def setup(self) -> None:
+        with self._connection() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS workflow_runs (
+                    run_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    workflow_status TEXT,
+                    created_at DOUBLE PRECISION NOT NULL,
+                    updated_at DOUBLE PRECISION NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_workflow_runs_status ON workflow_runs (status, updated_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_workflow_runs_updated_at ON workflow_runs (updated_at)")
+
+    def record(self, run_id: str, status: str, workflow_status: Optional[str]) -> None:
+        p = self._p
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                f"""
+                INSERT INTO workflow_runs (run_id, status, workflow_status, created_at, updated_at)
+                VALUES ({p}, {p}, {p}, {p}, {p})
+                ON CONFLICT (run_id) DO UPDATE SET
+                    status = excluded.status,
+                    workflow_status = excluded.workflow_status,
+                    updated_at = excluded.updated_at
+                """,
+                (run_id, status, workflow_status, now, now),
+            )
+
+    def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._query(f"SELECT * FROM workflow_runs WHERE run_id = {self._p}", (run_id,))
+        return rows[0] if rows else None
+
+    def list(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        p = self._p
+        if status:
+            return self._query(
+                f"SELECT * FROM workflow_runs WHERE status = {p} ORDER BY updated_at DESC LIMIT {p}",
+                (status, limit),
+            )
+        return self._query(f"SELECT * FROM workflow_runs ORDER BY updated_at DESC LIMIT {p}", (limit,))
+
+    def expired(self, before: float) -> List[str]:
+        rows = self._query(f"SELECT run_id FROM workflow_runs WHERE updated_at < {self._p}", (before,))
+        return [row["run_id"] for row in rows]
+
+    def delete(self, run_id: str) -> None:
+        with self._connection() as conn:
+            conn.execute(f"DELETE FROM workflow_runs WHERE run_id = {self._p}", (run_id,))
+
+    def _query(self, sql: str, params: tuple) -> List[Dict[str, Any]]:
+        with self._connection() as conn:
+            cur = conn.execute(sql, params)
+            rows = cur.fetchall()
+            if rows and not isinstance(rows[0], dict):
+                columns = [column[0] for column in cur.description]
+                rows = [dict(zip(columns, row)) for row in rows]
+            return rows
+
+
+class RunIndexedSaverMixin:
+    """Keeps the run index current on every top-level checkpoint and sweeps expired runs"""
+
+    run_index: RunIndex
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        saved = super().put(config, checkpoint, metadata, new_versions)
+        # Subgraph checkpoints share the thread id; only the root graph sets the status
+        if not config["configurable"].get("checkpoint_ns"):
+            channel_values = checkpoint.get("channel_values", {})
+            try:
+                self.run_index.record(
+                    str(config["configurable"]["thread_id"]),
+                    run_status(channel_values, metadata.get("writes")),
+                    channel_values.get("workflow_status"),
+                )
+            except Exception as e:
+                print(f"⚠️ Failed to update workflow run index: {e}")
+        return saved
+
+    def delete_run(self, run_id: str) -> None:
+        self.delete_thread(run_id)
+        self.run_index.delete(run_id)
+
+    def sweep(self, retention_seconds: float) -> int:
+        """Delete every run not updated within `retention_seconds`; returns the number removed"""
+        removed = 0
+        for run_id in self.run_index.expired(time.time() - retention_seconds):
+            try:
+                self.delete_run(run_id)
+                removed += 1
+            except Exception as e:
+                print(f"⚠️ Failed to delete expired run {run_id}: {e}")
+        return removed
+
+
+class IndexedMemorySaver(RunIndexedSaverMixin, InMemorySaver):
+    """In-process saver, indexed by an in-memory SQLite table"""
+
+    def __init__(self, *, serde=None):
+        super().__init__(serde=serde)
+        self._index_conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._index_lock = threading.Lock()
+        self.run_index = RunIndex(self._index_connection)
+        self.run_index.setup()
+
+    @contextmanager
+    def _index_connection(self):
+        with self._index_lock:
+            yield self._index_conn
+            self._index_conn.commit()
+
+
+def create_sqlite_checkpointer(path: str, serde):
+    from langgraph.checkpoint.sqlite import SqliteSaver
+
+    class IndexedSqliteSaver(RunIndexedSaverMixin, SqliteSaver):
+        """SQLite saver with the run index stored in the same database file"""
+
+        def __init__(self, conn: sqlite3.Connection, *, serde=None):
+            super().__init__(conn, serde=serde)
+            self.run_index = RunIndex(self._index_connection)
+            self.run_index.setup()
+
+        @contextmanager
+        def _index_connection(self):
+            with self.lock:
+                yield self.conn
+                self.conn.commit()
+
+        def delete_thread(self, thread_id: str) -> None:
+            with self.cursor() as cur:
+                cur.execute("DELETE FROM checkpoints WHERE thread_id = ?", (str(thread_id),))
+                cur.execute("DELETE FROM writes WHERE thread_id = ?", (str(thread_id),))
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    saver = IndexedSqliteSaver(conn, serde=serde)
+    saver.setup()
+    return saver
+
+
+def postgres_conn_string() -> str:
+    """Connection string for the checkpoint database, built from the Aurora DB_* variables if not given"""
+    if settings.CHECKPOINTER_POSTGRES_URL:
+        return settings.CHECKPOINTER_POSTGRES_URL
+    if not settings.DB_HOST:
+        raise ValueError("CHECKPOINTER_BACKEND=postgres needs CHECKPOINTER_POSTGRES_URL or DB_HOST")
+    return settings.db_conn_string()
+
+
+def create_postgres_checkpointer(conn_string: str, serde):
+    from langgraph.checkpoint.postgres import PostgresSaver
+    from psycopg.rows import dict_row
+    from psycopg_pool import ConnectionPool
+
+    class IndexedPostgresSaver(RunIndexedSaverMixin, PostgresSaver):
+        """Postgres saver with the run index in the same database"""
+
+        def __init__(self, pool: ConnectionPool, *, serde=None):
+            super().__init__(pool, serde=serde)
+            self.run_index = RunIndex(pool.connection, placeholder="%s")
+
+        def setup(self) -> None:
+            super().setup()
+            self.run_index.setup()
+
+        def delete_thread(self, thread_id: str) -> None:
+            with self._cursor() as cur:
+                cur.execute("DELETE FROM checkpoints WHERE thread_id = %s", (str(thread_id),))
+                cur.execute("DELETE FROM checkpoint_blobs WHERE thread_id = %s", (str(thread_id),))
+                cur.execute("DELETE FROM checkpoint_writes WHERE thread_id = %s", (str(thread_id),))
+
+    pool = ConnectionPool(
+        conn_string,
+        min_size=1,
+        max_size=settings.CHECKPOINTER_POSTGRES_POOL_SIZE,
+        kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+        open=True,
+    )
+    saver = IndexedPostgresSaver(pool, serde=serde)
+    saver.setup()
+    return saver
+
+
+class CheckpointSweeper:
+    """Background thread deleting runs older than the retention window"""
+
+    def __init__(self, saver: RunIndexedSaverMixin, retention_seconds: float, interval_seconds: float):
+        self.saver = saver
+        self.retention_seconds = retention_seconds
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="checkpoint-sweeper", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                removed = self.saver.sweep(self.retention_seconds)
+                if removed:
+                    print(f"🧹 Removed {removed} workflow runs older than {self.retention_seconds / 3600:g}h")
+            except Exception as e:
+                print(f"⚠️ Checkpoint sweep failed: {e}")
+
+
+def create_checkpointer():
+    """Create the saver selected by CHECKPOINTER_BACKEND and start its retention sweeper"""
+    backend = settings.CHECKPOINTER_BACKEND.lower()
+    serde = CompressedSerializer(min_bytes=settings.CHECKPOINT_COMPRESSION_MIN_BYTES)
+
+    if backend == "sqlite":
+        saver = create_sqlite_checkpointer(settings.CHECKPOINTER_SQLITE_PATH, serde)
+        print(f"💾 Using SQLite checkpointer at {settings.CHECKPOINTER_SQLITE_PATH}")
+    elif backend == "postgres":
+        saver = create_postgres_checkpointer(postgres_conn_string(), serde)
+        print("💾 Using Postgres checkpointer")
+    elif backend == "memory":
+        saver = IndexedMemorySaver(serde=serde)
+        print("💾 Using in-memory checkpointer (runs are lost on restart)")
+    else:
+        raise ValueError(f"Unknown CHECKPOINTER_BACKEND '{settings.CHECKPOINTER_BACKEND}', expected memory, sqlite or postgres")
+
+    if settings.CHECKPOINT_RETENTION_HOURS > 0:
+        CheckpointSweeper(
+            saver,
+            retention_seconds=settings.CHECKPOINT_RETENTION_HOURS * 3600,
+            interval_seconds=settings.CHECKPOINT_SWEEP_INTERVAL_SECONDS,
+        ).start()
+    return saver
@@ -0,0 +1,212 @@
+"""
+Background job queue for workflow runs
+"""
+
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from config.settings import settings
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_AWAITING_HUMAN_INPUT = "awaiting_human_input"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+ACTIVE_JOB_STATUSES = (JOB_QUEUED, JOB_RUNNING)
+
+
+class JobQueueFull(Exception):
+    """Raised when the queue already holds the maximum number of pending jobs"""
+
+
+class RunAlreadyActive(Exception):
+    """Raised when a job for the same run is already queued or running"""
+
+
+class WorkflowJob:
+    """
+    Status, progress and result of one workflow invocation.
+
+    `progress(event, data)`, when given, is called with every progress event of the
+    run, e.g. to stream it to a client.
+    """
+
+    def __init__(self, run_id: str, progress: Optional[Callable[[str, Dict[str, Any]], None]] = None):
+        self.job_id = uuid.uuid4().hex
+        self.run_id = run_id
+        self.progress = progress
+        self.status = JOB_QUEUED
+        self.current_node: Optional[str] = None
+        self.completed_nodes: List[str] = []
+        self.workflow_status: Optional[str] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.future: Optional[Future] = None
+        self._lock = threading.Lock()
+
+    def record_node_start(self, node: str) -> None:
+        with self._lock:
+            self.current_node = node
+
+    def record_node_end(self, node: str, update: Optional[Dict[str, Any]]) -> None:
+        with self._lock:
+            self.completed_nodes.append(node)
+            if self.current_node == node:
+                self.current_node = None
+            if update and update.get("workflow_status"):
+                self.workflow_status = update["workflow_status"]
+
+    def emit(self, event: str, data: Dict[str, Any]) -> None:
+        if self.progress is not None:
+            self.progress(event, data)
+
+    @property
+    def finished(self) -> bool:
+        return self.status not in ACTIVE_JOB_STATUSES
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Status and progress, without the result payload"""
+        with self._lock:
+            completed_nodes = list(self.completed_nodes)
+        return {
+            "job_id": self.job_id,
+            "run_id": self.run_id,
+            "status": self.status,
+            "workflow_status": self.workflow_status,
+            "progress": {
+                "current_node": self.current_node,
+                "completed_nodes": completed_nodes,
+            },
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class WorkflowJobManager:
+    """
+    Runs workflow invocations on a bounded thread pool.
+
+    `runner(run_input, config, job)` executes the graph, reports progress through
+    `job.record_node_start/end` and returns the final graph state. `formatter(state, run_id)`
+    turns that state into the API response stored as the job result.
+    """
+
+    def __init__(self, runner: Callable, formatter: Callable, max_workers: int, max_queued: int, retention: int):
+        self.runner = runner
+        self.formatter = formatter
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="workflow-job")
+        self._jobs: "OrderedDict[str, WorkflowJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        run_id: str,
+        run_input: Dict[str, Any],
+        progress: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ) -> WorkflowJob:
+        """Queue a workflow run and return its job immediately"""
+        with self._lock:
+            active = [job for job in self._jobs.values() if not job.finished]
+            if any(job.run_id == run_id for job in active):
+                raise RunAlreadyActive(f"Run {run_id} already has a queued or running job")
+            queued = sum(1 for job in active if job.status == JOB_QUEUED)
+            if self.max_queued and queued >= self.max_queued:
+                raise JobQueueFull(f"Workflow queue is full ({queued} jobs waiting)")
+
+            job = WorkflowJob(run_id, progress)
+            self._jobs[job.job_id] = job
+            self._prune()
+            job.future = self._executor.submit(self._run, job, run_input)
+        job.future.add_done_callback(lambda future: self._on_done(job, future))
+
+        print(f"📥 Queued workflow job {job.job_id} for run {run_id}")
+        return job
+
+    def get(self, job_id: str) -> Optional[WorkflowJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[WorkflowJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return {"max_workers": self.max_workers, "max_queued": self.max_queued, "jobs": counts}
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job: WorkflowJob, run_input: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job.status = JOB_RUNNING
+            job.started_at = datetime.now()
+        print(f"🔄 Running workflow job {job.job_id} for run {job.run_id}")
+
+        config = {"configurable": {"thread_id": job.run_id}}
+        try:
+            state = self.runner(run_input, config, job)
+            result = self.formatter(state, job.run_id)
+        except Exception as e:
+            print(f"❌ Workflow job {job.job_id} failed: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            with self._lock:
+                job.status = JOB_FAILED
+                job.error = str(e)
+                job.current_node = None
+                job.finished_at = datetime.now()
+            raise
+
+        with self._lock:
+            job.result = result
+            job.workflow_status = state.get("workflow_status", job.workflow_status)
+            job.status = JOB_AWAITING_HUMAN_INPUT if state.get("awaiting_human_input", False) else JOB_COMPLETED
+            job.current_node = None
+            job.finished_at = datetime.now()
+        print(f"✅ Workflow job {job.job_id} finished with status {job.status}")
+        return result
+
+    def _on_done(self, job: WorkflowJob, future: Future) -> None:
+        """A job cancelled before it started (e.g. on shutdown) would otherwise stay queued forever"""
+        if not future.cancelled():
+            return
+        with self._lock:
+            job.status = JOB_FAILED
+            job.error = "Job was cancelled before it started"
+            job.current_node = None
+            job.finished_at = datetime.now()
+        print(f"⚠️ Workflow job {job.job_id} was cancelled before it started")
+
+    def _prune(self) -> None:
+        """Drop the oldest finished jobs beyond the retention limit"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[: max(0, len(finished) - self.retention)]:
+            del self._jobs[job_id]
+
+
+def create_job_manager(runner: Callable, formatter: Callable) -> WorkflowJobManager:
+    """Build the job manager from settings"""
+    return WorkflowJobManager(
+        runner,
+        formatter,
+        max_workers=settings.WORKFLOW_MAX_CONCURRENT_JOBS,
+        max_queued=settings.WORKFLOW_MAX_QUEUED_JOBS,
+        retention=settings.WORKFLOW_JOB_RETENTION,
+    )
@@ -534,6 +534,30 @@ resource "aws_ecs_task_definition" "agent" {
         {
           name  = "ORACLE_DB_SERVICE_NAME"
           value = var.agent_oracle_db_service_name
+        },
+        {
+          name  = "CHECKPOINTER_BACKEND"
+          value = var.agent_checkpointer_backend
+        },
+        {
+          name  = "SOP_RETRIEVER_BACKEND"
+          value = var.agent_sop_retriever_backend
+        },
+        {
+          name  = "DB_HOST"
+          value = aws_rds_cluster.aurora.endpoint
+        },
+        {
+          name  = "DB_PORT"
+          value = "5432"
+        },
+        {
+          name  = "DB_DATABASE"
+          value = aws_rds_cluster.aurora.database_name
+        },
+        {
+          name  = "DB_USERNAME"
+          value = var.aurora_master_username
         }
       ]
 
@@ -553,6 +577,10 @@ resource "aws_ecs_task_definition" "agent" {
         {
           name      = "ORACLE_DB_PASSWORD"
           valueFrom = aws_secretsmanager_secret.agent_oracle_db_password.arn
+        },
+        {
+          name      = "DB_PASSWORD"
+          valueFrom = aws_secretsmanager_secret.aurora_master_password.arn
         }
       ]
     }
@@ -688,6 +716,14 @@ resource "aws_ecs_task_definition" "test_executor" {
           name  = "LAN_ID"
           value = var.agent_lan_id
         },
+        {
+          name  = "AGENT_URL"
+          value = "https://${aws_route53_record.service_internal["agent"].fqdn}"
+        },
+        {
+          name  = "MAX_CONCURRENT_RUNS"
+          value = tostring(var.test_executor_max_concurrent_runs)
+        },
         {
           name  = "DB_ENDPOINT"
           value = aws_rds_cluster.aurora.endpoint
@@ -70,6 +70,12 @@ variable "test_executor_memory" {
     default     = 512
 }
 
+variable "test_executor_max_concurrent_runs" {
+    description = "Test scripts the test executor runs at once, each with its own browser"
+    type        = number
+    default     = 2
+}
+
 variable "ecs_desired_count" {
     description = "Desired number of ECS tasks"
     type        = number
@@ -204,6 +210,18 @@ variable "agent_oracle_db_service_name" {
   default     = "QAPHRXP88"
 }
 
+variable "agent_checkpointer_backend" {
+  description = "LangGraph checkpointer backend for agent service (memory, sqlite or postgres)"
+  type        = string
+  default     = "postgres"
+}
+
+variable "agent_sop_retriever_backend" {
+  description = "SOP retriever backend for agent service (opensearch, local or pgvector)"
+  type        = string
+  default     = "opensearch"
+}
+
 variable "create_acm_cert" {
   description = "Whether to create ACM certificate for ALB"
   type        = bool
@@ -3,7 +3,9 @@ from pydantic import BaseModel
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import StreamingResponse
 import asyncio
-from utils import zip_screenshots_and_videos, upload_to_s3, download_script, run_tests_in_background, save_test_results, delete_screenshots_and_videos
+from utils import zip_screenshots_and_videos, upload_to_s3, download_script, run_tests_in_background, save_test_results, settle_patient_lease, delete_screenshots_and_videos
+from sandbox import RunSandbox, wait_for_run_slot, release_run_slot, run_status
+from browser_pool import start_browser_pool, stop_browser_pool
 import requests
 import os
 import base64
@@ -16,6 +18,7 @@ from const import sampleTestFile
 import psycopg2
 import asyncpg
 import time
+import threading
 
 class TestScript(BaseModel):
     content: str
@@ -372,8 +375,30 @@ async def merge_async_iterators(*iterators):
                 # Schedule the next item from this iterator
                 pending[asyncio.create_task(get_next(iterator))] = iterator
 
+async def stream_in_sandbox(sandbox, generate, end="\n"):
+    """Queue for a run slot, stream the run, then settle its patient lease, free the slot and remove the run's sandbox."""
+    async for status in wait_for_run_slot(sandbox):
+        yield f"data: {json.dumps(status)}{end}"
+    try:
+        async for chunk in generate():
+            yield chunk
+    finally:
+        # A client that disconnects mid-run leaves sandbox.results unset, so the patient goes to review
+        settle_patient_lease(sandbox.results, sandbox.script_path)
+        release_run_slot(sandbox)
+        sandbox.cleanup()
+
 app = FastAPI()
 
+@app.on_event("startup")
+def start_shared_browsers():
+    # Started off the startup path: runs launch their own browser until the pool is up
+    threading.Thread(target=start_browser_pool, name="browser-pool-start", daemon=True).start()
+
+@app.on_event("shutdown")
+def stop_shared_browsers():
+    stop_browser_pool()
+
 def log_request_source(request: Request, endpoint_name: str = "unknown"):
     """Log request source information for debugging/monitoring"""
     client_ip = request.client.host if request.client else "unknown"
@@ -422,6 +447,11 @@ async def root(request: Request):
 def health():
     return {"status": "ok"}
 
+@app.get("/runs")
+def runs():
+    """Test runs executing and waiting for a run slot"""
+    return run_status()
+
 @app.get("/test-postgres")
 async def test_postgres_connection():
     """Test PostgreSQL connection with both sync and async clients"""
@@ -628,8 +658,11 @@ def test_playwright_connectivity():
 async def run_tests(chat_id: str):
     """Run pytest and return stdout/stderr and exit code as JSON."""
 
+    sandbox = RunSandbox(chat_id)
+    slot_taken = False
     try:
         # Download script from DB
+        content = None
         if os.environ['ENV'] != "local":
             print(f"Downloading test script for chat_id: {chat_id}")
             content = download_script(chat_id)
@@ -637,18 +670,24 @@ async def run_tests(chat_id: str):
             if content is None:
                 raise HTTPException(status_code=404, detail=f"No test script found for chat_id: {chat_id}")
 
-            # save file to tests/test_script.py
-            try:
-                with open("tests/test_script.py", "w") as f:
-                    f.write(content)
-                print("Test script saved")
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=f"Failed to save test script: {str(e)}")
+        # save the script to the run's sandbox
+        try:
+            sandbox.prepare(content)
+            print("Test script saved")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to save test script: {str(e)}")
 
-        # run the tests
+        # wait for a run slot, then run the tests off the event loop
+        async for _ in wait_for_run_slot(sandbox):
+            pass
+        slot_taken = True
         print("Starting pytest execution")
+        sandbox.results = None
         try:
-            result = subprocess.run(["pytest", "-s","-x"], capture_output=True, text=True)
+            result = await asyncio.to_thread(
+                subprocess.run, sandbox.pytest_command("-s", "-x"), cwd=sandbox.root, env=sandbox.env(), capture_output=True, text=True
+            )
+            sandbox.results = {"returncode": result.returncode, "stdout": result.stdout}
             print("Tests done")
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to execute pytest: {str(e)}")
@@ -656,7 +695,7 @@ async def run_tests(chat_id: str):
         # zip screenshots and videos, run after the tests are done
         print("Zipping screenshots and videos")
         try:
-            zip_screenshots_and_videos()
+            zip_screenshots_and_videos(sandbox.root)
             print("Zipping screenshots and videos done")
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to zip screenshots and videos: {str(e)}")
@@ -665,7 +704,7 @@ async def run_tests(chat_id: str):
         if os.environ['ENV'] != "local":
             print("Uploading screenshots and videos to S3")
             try:
-                signed_url = upload_to_s3()
+                signed_url = upload_to_s3(sandbox.root)
                 print("Uploading screenshots and videos to S3 done")
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Failed to upload to S3: {str(e)}")
@@ -687,6 +726,11 @@ async def run_tests(chat_id: str):
     except Exception as e:
         # Catch any other unexpected errors
         raise HTTPException(status_code=500, detail=f"Unexpected error occurred: {str(e)}")
+    finally:
+        settle_patient_lease(sandbox.results, sandbox.script_path)
+        if slot_taken:
+            release_run_slot(sandbox)
+        sandbox.cleanup()
 
 @app.get("/run-tests-background/{chat_id}")
 async def run_tests_background(chat_id: str):
@@ -717,11 +761,13 @@ async def run_tests_background(chat_id: str):
 async def run_tests_stream(chat_id: str):
     """Run pytest and stream stdout/stderr in real-time."""
     
+    sandbox = RunSandbox(chat_id)
+
     async def generate():
-        # Download script from DB
-        if os.environ['ENV'] != "local":
-            # save file to tests/test_script.py
-            try:
+        # Download script from DB and save it to the run's sandbox
+        try:
+            content = None
+            if os.environ['ENV'] != "local":
                 print(f"Downloading test script for chat_id: {chat_id}")
                 
                 content = download_script(chat_id)
@@ -729,25 +775,22 @@ async def run_tests_stream(chat_id: str):
                 if content is None:
                     print(f"No test script found for chat_id: {chat_id}")
                     raise HTTPException(status_code=404, detail=f"No test script found for chat_id: {chat_id}")
-                
-                with open("tests/test_script.py", "w") as f:
-                    print(f"Writing test script to tests/test_script.py")
-                    f.write(content)
 
-                print("Test script saved")
+            sandbox.prepare(content)
+            print("Test script saved")
 
-            except Exception as e:
-                print(f"Failed to save test script: {str(e)}")
-                raise HTTPException(status_code=500, detail=f"Failed to save test script: {str(e)}")
+        except Exception as e:
+            print(f"Failed to save test script: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Failed to save test script: {str(e)}")
 
         # Start the pytest process with unbuffered output
-        env = os.environ.copy()
-        env['PYTHONUNBUFFERED'] = '1'
+        sandbox.results = None
         process = await asyncio.create_subprocess_exec(
-            "xvfb-run", "pytest", "-s", "-v", "-x","--tb=short",
+            *sandbox.pytest_command("-s", "-v", "-x", "--tb=short", xvfb=True),
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
-            env=env
+            cwd=sandbox.root,
+            env=sandbox.env()
         )
 
         # Stream stdout and stderr concurrently
@@ -844,13 +887,14 @@ async def run_tests_stream(chat_id: str):
 
         # Wait for process to complete
         await process.wait()
+        sandbox.results = {"returncode": process.returncode, "stdout": ''.join(stdout_output)}
         
         # Send final status
         yield f"data: {json.dumps({'type': 'exit', 'returncode': process.returncode})}\n"
         
         # Zip and upload after completion
-        zip_screenshots_and_videos()
-        signed_url, key = upload_to_s3()
+        zip_screenshots_and_videos(sandbox.root)
+        signed_url, key = upload_to_s3(sandbox.root)
 
         # Save test results to database
         test_results = {
@@ -868,19 +912,22 @@ async def run_tests_stream(chat_id: str):
             
         yield f"data: {json.dumps({'type': 'complete', 'signed_url': signed_url, 'key': key, 'returncode': process.returncode, 'status': 'completed'})}\n"
 
-    return StreamingResponse(generate(), media_type="text/event-stream")
+    return StreamingResponse(stream_in_sandbox(sandbox, generate), media_type="text/event-stream")
 
 
 @app.get("/run-tests-stream-base/{chat_id}")
 async def run_tests_stream_base(chat_id: str):
     """Run pytest and return stdout/stderr and exit code as JSON."""
 
+    sandbox = RunSandbox(chat_id)
+
     async def generate():
         import json
         import asyncio
         
         try:
             # Download script from DB - http://localhost:3000/api/test-script/{chat_id}
+            content = None
             if os.environ['ENV'] != "local":
                 print(f"Downloading test script for chat_id: {chat_id}")
                 content = download_script(chat_id)
@@ -888,13 +935,12 @@ async def run_tests_stream_base(chat_id: str):
                 if content is None:
                     raise HTTPException(status_code=404, detail=f"No test script found for chat_id: {chat_id}")
 
-                # save file to tests/test_script.py
-                try:
-                    with open("tests/test_script.py", "w") as f:
-                        f.write(content)
-                    print("Test script saved")
-                except Exception as e:
-                    raise HTTPException(status_code=500, detail=f"Failed to save test script: {str(e)}")
+            # save the script to the run's sandbox
+            try:
+                sandbox.prepare(content)
+                print("Test script saved")
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Failed to save test script: {str(e)}")
 
             # run the tests
             print("Starting pytest execution")
@@ -904,10 +950,11 @@ async def run_tests_stream_base(chat_id: str):
             import threading
             
             def run_pytest_sync():
-                result = subprocess.run(["pytest", "-s","-x"], capture_output=True, text=True)
+                result = subprocess.run(sandbox.pytest_command("-s", "-x"), cwd=sandbox.root, env=sandbox.env(), capture_output=True, text=True)
                 return result.returncode, result.stdout, result.stderr
             
             # Start pytest in a thread
+            sandbox.results = None
             with concurrent.futures.ThreadPoolExecutor() as executor:
                 future = executor.submit(run_pytest_sync)
                 
@@ -927,12 +974,13 @@ async def run_tests_stream_base(chat_id: str):
                         self.stderr = stderr
                 
                 result = Result(returncode, stdout, stderr)
+                sandbox.results = {"returncode": returncode, "stdout": stdout}
                 print("Tests done")
 
             # zip screenshots and videos, run after the tests are done
             print("Zipping screenshots and videos")
             try:
-                zip_screenshots_and_videos()
+                zip_screenshots_and_videos(sandbox.root)
                 print("Zipping screenshots and videos done")
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Failed to zip screenshots and videos: {str(e)}")
@@ -941,7 +989,7 @@ async def run_tests_stream_base(chat_id: str):
             if os.environ['ENV'] != "local":
                 print("Uploading screenshots and videos to S3")
                 try:
-                    signed_url = upload_to_s3()
+                    signed_url = upload_to_s3(sandbox.root)
                     print("Uploading screenshots and videos to S3 done")
                 except Exception as e:
                     raise HTTPException(status_code=500, detail=f"Failed to upload to S3: {str(e)}")
@@ -973,7 +1021,7 @@ async def run_tests_stream_base(chat_id: str):
             yield f"data: {json.dumps(error_result)}\n\n"
 
     return StreamingResponse(
-        generate(), 
+        stream_in_sandbox(sandbox, generate, end="\n\n"), 
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -991,6 +1039,7 @@ async def run_tests_sample():
     """Run pytest and stream stdout/stderr in real-time."""
     
     chat_id = str(uuid.uuid4())
+    sandbox = RunSandbox(chat_id)
 
     async def generate():
         try:
@@ -1002,25 +1051,22 @@ async def run_tests_sample():
                 print(f"No test script found for chat_id: {chat_id}")
                 raise HTTPException(status_code=404, detail=f"No test script found for chat_id: {chat_id}")
             
-            with open("tests/test_script.py", "w") as f:
-                print(f"Writing test script to tests/test_script.py")
-                f.write(content)
-
+            sandbox.prepare(content)
             print("Test script saved")
 
         except Exception as e:
             print(f"Failed to save test script: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Failed to save test script: {str(e)}")
         
-        os.environ["EDBUG"] = "pw:api"
-
         # Start the pytest process with unbuffered output
-        env = os.environ.copy()
-        env['PYTHONUNBUFFERED'] = '1'
+        sandbox.results = None
+        env = sandbox.env()
+        env["EDBUG"] = "pw:api"
         process = await asyncio.create_subprocess_exec(
-            "xvfb-run", "pytest", "-s", "-v", "-x","--tb=short",
+            *sandbox.pytest_command("-s", "-v", "-x", "--tb=short", xvfb=True),
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
+            cwd=sandbox.root,
             env=env
         )
 
@@ -1118,13 +1164,14 @@ async def run_tests_sample():
 
         # Wait for process to complete
         await process.wait()
+        sandbox.results = {"returncode": process.returncode, "stdout": ''.join(stdout_output)}
         
         # Send final status
         yield f"data: {json.dumps({'type': 'exit', 'returncode': process.returncode})}\n"
 
-        zip_screenshots_and_videos()
+        zip_screenshots_and_videos(sandbox.root)
 
-        signed_url, key = upload_to_s3()
+        signed_url, key = upload_to_s3(sandbox.root)
 
         # Save test results to database
         test_results = {
@@ -1140,7 +1187,7 @@ async def run_tests_sample():
             
         yield f"data: {json.dumps({'type': 'complete', 'signed_url': signed_url, 'key': key, 'stdout': ''.join(stdout_output), 'stderr': ''.join(stderr_output), 'returncode': process.returncode, 'status': 'completed'})}\n"
 
-    return StreamingResponse(generate(), media_type="text/event-stream")
+    return StreamingResponse(stream_in_sandbox(sandbox, generate), media_type="text/event-stream")
 
 if __name__ == "__main__":
     import uvicorn
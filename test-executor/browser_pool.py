@@ -0,0 +1,243 @@
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.request
+
+BROWSER_POOL_ENABLED = os.environ.get("BROWSER_POOL_ENABLED", "true").lower() == "true"
+BROWSER_POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE") or os.environ.get("MAX_CONCURRENT_RUNS", "2"))
+# Browsers are replaced after this many runs, which keeps their memory use flat
+BROWSER_POOL_MAX_USES = int(os.environ.get("BROWSER_POOL_MAX_USES", "20"))
+BROWSER_POOL_HEADLESS = os.environ.get("BROWSER_POOL_HEADLESS", "false").lower() == "true"
+BROWSER_POOL_EXECUTABLE = os.environ.get("BROWSER_POOL_EXECUTABLE")
+BROWSER_START_TIMEOUT = 30
+
+
+def chromium_executable():
+    """The Chromium installed by `playwright install chromium`"""
+    if BROWSER_POOL_EXECUTABLE:
+        return BROWSER_POOL_EXECUTABLE
+    from playwright.sync_api import sync_playwright
+
+    with sync_playwright() as p:
+        return p.chromium.executable_path
+
+
+def start_xvfb():
+    """Start one Xvfb server for every pooled browser; returns (process, DISPLAY)"""
+    read_fd, write_fd = os.pipe()
+    process = subprocess.Popen(
+        ["Xvfb", "-displayfd", str(write_fd), "-screen", "0", "1920x1080x24", "-nolisten", "tcp"],
+        pass_fds=(write_fd,),
+    )
+    os.close(write_fd)
+    # Xvfb picks a free display number and writes it to the fd once it accepts connections
+    with os.fdopen(read_fd) as f:
+        display = f.readline().strip()
+    if not display:
+        process.kill()
+        raise RuntimeError("Xvfb exited before reporting its display")
+    return process, f":{display}"
+
+
+class PooledBrowser:
+    """A Chromium process that test runs attach to over CDP, one isolated context per test"""
+
+    def __init__(self, executable, env, headless):
+        self.user_data_dir = tempfile.mkdtemp(prefix="pooled-chromium-")
+        args = [
+            executable,
+            "--remote-debugging-port=0",
+            f"--user-data-dir={self.user_data_dir}",
+            "--no-first-run",
+            "--no-default-browser-check",
+            "--no-sandbox",
+            "--disable-dev-shm-usage",
+            # Runs share the browser, so a tab in the background must not be throttled
+            "--disable-background-timer-throttling",
+            "--disable-backgrounding-occluded-windows",
+            "--disable-renderer-backgrounding",
+            "about:blank",
+        ]
+        if headless:
+            args.insert(1, "--headless=new")
+        self.process = subprocess.Popen(args, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.uses = 0
+        self.started_at = time.time()
+        self.endpoint = self._wait_for_endpoint()
+
+    def _wait_for_endpoint(self):
+        # With port 0 Chromium picks a free port and writes it to DevToolsActivePort
+        port_file = os.path.join(self.user_data_dir, "DevToolsActivePort")
+        deadline = time.time() + BROWSER_START_TIMEOUT
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                break
+            if os.path.exists(port_file):
+                with open(port_file) as f:
+                    port = f.readline().strip()
+                if port:
+                    return f"http://127.0.0.1:{port}"
+            time.sleep(0.1)
+        self.close()
+        raise RuntimeError("Pooled browser did not start")
+
+    def healthy(self):
+        if self.process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(f"{self.endpoint}/json/version", timeout=2) as response:
+                return response.status == 200
+        except Exception:
+            return False
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        shutil.rmtree(self.user_data_dir, ignore_errors=True)
+
+
+class BrowserPool:
+    """
+    Long-lived Chromium processes on a shared Xvfb display.
+
+    A run leases a browser, its tests connect with `connect_over_cdp` and create
+    their own contexts, and the browser goes back to the pool afterwards. Browsers
+    that crashed or reached BROWSER_POOL_MAX_USES are replaced on release.
+    """
+
+    def __init__(self, size=BROWSER_POOL_SIZE, max_uses=BROWSER_POOL_MAX_USES, headless=BROWSER_POOL_HEADLESS):
+        self.size = size
+        self.max_uses = max_uses
+        self.headless = headless
+        self.display = None
+        self._xvfb = None
+        self._executable = None
+        self._idle = queue.Queue()
+        self._browsers = set()
+        self._lock = threading.Lock()
+        self._started_at = None
+        self._busy_since = {}
+        self._stats = {"launches": 0, "recycled": 0, "crashed": 0, "leases": 0, "busy_seconds": 0.0}
+
+    def start(self):
+        self._executable = chromium_executable()
+        env = os.environ.copy()
+        if not self.headless:
+            self._xvfb, self.display = start_xvfb()
+            env["DISPLAY"] = self.display
+        self._env = env
+        for _ in range(self.size):
+            self._idle.put(self._launch())
+        self._started_at = time.time()
+        print(f"[BROWSER_POOL] Started {self.size} browsers" + (f" on display {self.display}" if self.display else " (headless)"))
+
+    def _launch(self):
+        browser = PooledBrowser(self._executable, self._env, self.headless)
+        with self._lock:
+            self._browsers.add(browser)
+            self._stats["launches"] += 1
+        return browser
+
+    def lease(self, timeout=None):
+        browser = self._idle.get(timeout=timeout)
+        if not browser.healthy():
+            print("[BROWSER_POOL] Idle browser is not responding, replacing it")
+            browser = self._replace(browser, "crashed")
+        browser.uses += 1
+        with self._lock:
+            self._stats["leases"] += 1
+            self._busy_since[id(browser)] = time.time()
+        return browser
+
+    def release(self, browser):
+        """Return a leased browser; replacements launch on a separate thread so the caller never waits"""
+        with self._lock:
+            self._stats["busy_seconds"] += time.time() - self._busy_since.pop(id(browser), time.time())
+        if browser.process.poll() is not None:
+            print("[BROWSER_POOL] Browser crashed during the run, replacing it")
+            self._replace_in_background(browser, "crashed")
+        elif browser.uses >= self.max_uses:
+            self._replace_in_background(browser, "recycled")
+        else:
+            self._idle.put(browser)
+
+    def _replace(self, browser, reason):
+        browser.close()
+        with self._lock:
+            self._browsers.discard(browser)
+            self._stats[reason] += 1
+        return self._launch()
+
+    def _replace_in_background(self, browser, reason):
+        def replace():
+            try:
+                self._idle.put(self._replace(browser, reason))
+            except Exception as e:
+                print(f"[BROWSER_POOL] Failed to replace browser, pool shrinks by one: {e}")
+
+        threading.Thread(target=replace, name="browser-pool-replace", daemon=True).start()
+
+    def stats(self):
+        with self._lock:
+            now = time.time()
+            in_use = len(self._busy_since)
+            busy_seconds = self._stats["busy_seconds"] + sum(now - since for since in self._busy_since.values())
+            uptime = now - self._started_at if self._started_at else 0
+            return {
+                "size": self.size,
+                "in_use": in_use,
+                "idle": self._idle.qsize(),
+                "display": self.display,
+                "max_uses": self.max_uses,
+                "utilization": round(busy_seconds / (uptime * self.size), 3) if uptime and self.size else 0.0,
+                **self._stats,
+                "busy_seconds": round(busy_seconds, 1),
+            }
+
+    def close(self):
+        with self._lock:
+            browsers, self._browsers = list(self._browsers), set()
+        for browser in browsers:
+            browser.close()
+        if self._xvfb is not None:
+            self._xvfb.terminate()
+
+
+_pool = None
+
+
+def get_browser_pool():
+    """The shared pool, or None while it is starting, disabled or failed to start"""
+    return _pool
+
+
+def start_browser_pool():
+    """Start the shared pool; runs fall back to launching their own browser if it cannot start"""
+    global _pool
+    if not BROWSER_POOL_ENABLED or BROWSER_POOL_SIZE <= 0:
+        print("[BROWSER_POOL] Disabled, each run launches its own browser")
+        return None
+    pool = BrowserPool()
+    try:
+        pool.start()
+    except Exception as e:
+        print(f"[BROWSER_POOL] Failed to start, each run launches its own browser: {e}")
+        pool.close()
+        return None
+    _pool = pool
+    return pool
+
+
+def stop_browser_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
@@ -1,56 +1,7 @@
 from playwright.sync_api import Page, Locator, Frame
 from time import sleep
 from typing import Callable
-
-def find_element_across_frames(page: Page, selector: str) -> Locator | None:
-    """
-    Recursively search for an element matching 'selector' starting from the main page
-    and traversing all iframes.
-
-    If a locator matches multiple elements, this function ensures it only returns
-    a locator pointing to the *very first* matching element found.
-
-    Args:
-        page: The Playwright Page object to search within.
-        selector: The CSS or XPath selector for the element.
-
-    Returns:
-        A Playwright Locator object for the first matching element, or None if no
-        element is found anywhere on the page or in its frames.
-    """
-    # Try finding the locator on the main page first.
-    try:
-        main_frame_locator = page.locator(selector)
-        if main_frame_locator.count() > 0:
-            print(main_frame_locator.first)
-            # MODIFICATION: Use .first to guarantee the locator targets only one element.
-            return main_frame_locator.first
-    except Exception:
-        # Silently ignore errors (e.g., page closed during search) and proceed to frames.
-        pass
-
-    # If not found on the main page, define a recursive function to search child frames.
-    def search_in_frames(frames: list) -> Locator | None:
-        for frame in frames:
-            try:
-                frame_locator = frame.locator(selector)
-                if frame_locator.count() > 0:
-                    # MODIFICATION: Use .first here as well.
-                    return frame_locator.first
-
-                # If not in this frame, go deeper into its children.
-                nested_result = search_in_frames(frame.child_frames)
-                if nested_result:
-                    # The result from the deeper call is already the .first locator.
-                    return nested_result
-            except Exception:
-                # A frame might detach or other errors could occur; just continue to the next one.
-                continue
-        # If the loop completes without finding the element in any frame.
-        return None
-
-    # Start the recursive search from the page's top-level frames.
-    return search_in_frames(page.frames)
+from nodes.frame_search import find_element_across_frames
 
 def robust_fill(page: Page, selector: str, value: str, select_suggestion: bool = False):
     """
@@ -0,0 +1,211 @@
+"""
+Element lookup across a page and all of its iframes.
+
+Pega renders each harness in its own iframe, so the old lookup (one
+`locator.count()` per frame per selector) cost dozens of round trips. Here a
+single script evaluated in the main frame tests every selector against the main
+document and every same-origin iframe document it can reach, and reports the
+first match together with the path to its frame. Like Playwright's own CSS
+engine, CSS selectors also match inside open shadow roots. Cross-origin frames are
+searched with one evaluation each, and selectors the browser cannot evaluate
+natively (`text=`, `:has-text()`, `>>` chains) fall back to Playwright locators.
+
+The frame the first selector was last found in is remembered per page URL, so a
+repeated lookup costs one round trip while the element stays where it was.
+"""
+
+import re
+import weakref
+from typing import List, Optional, Tuple, Union
+
+from playwright.sync_api import Frame, Locator, Page
+
+# Playwright treats these as XPath, see its selector parser
+_XPATH = re.compile(r"^\(*//|^\.\.")
+
+SEARCH_SCRIPT = """([selectors, remaining]) => {
+    // Playwright names a frame by its name attribute, or its id when it has none
+    const frameSteps = (frames) => {
+        const seen = {};
+        return frames.map(el => {
+            const name = el.getAttribute('name') || el.getAttribute('id') || '';
+            let url = '';
+            try { url = el.contentWindow.location.href; } catch (e) {}
+            const key = JSON.stringify([name, url]);
+            seen[key] = (seen[key] || 0) + 1;
+            return {name, url, nth: seen[key] - 1};
+        });
+    };
+    // Open shadow roots below `root`, nested ones included; Playwright's CSS engine pierces them
+    const shadowRoots = (root, found = []) => {
+        root.querySelectorAll('*').forEach(el => {
+            if (el.shadowRoot) {
+                found.push(el.shadowRoot);
+                shadowRoots(el.shadowRoot, found);
+            }
+        });
+        return found;
+    };
+    const matches = (doc, selector, roots) => {
+        if (selector.xpath) {
+            return doc.evaluate(selector.value, doc, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue !== null;
+        }
+        return doc.querySelector(selector.value) !== null || roots().some(root => root.querySelector(selector.value) !== null);
+    };
+    const hits = selectors.map(() => null);
+    const unsupported = selectors.map(() => false);
+    const blocked = [];
+    const search = (doc, path) => {
+        // Only walked once a CSS selector misses the document itself
+        let docRoots = null;
+        const roots = () => docRoots || (docRoots = shadowRoots(doc));
+        selectors.forEach((selector, i) => {
+            if (!remaining[i] || hits[i] || unsupported[i]) return;
+            try {
+                if (matches(doc, selector, roots)) hits[i] = path;
+            } catch (e) {
+                unsupported[i] = true;
+            }
+        });
+        const frames = Array.from(doc.querySelectorAll('iframe, frame'));
+        const steps = frameSteps(frames);
+        frames.forEach((el, n) => {
+            const step = steps[n];
+            let child = null;
+            try { child = el.contentDocument; } catch (e) {}
+            if (child) search(child, path.concat([step]));
+            else if (el.contentWindow) blocked.push(path.concat([step]));
+        });
+    };
+    search(document, []);
+    return {hits, unsupported, blocked};
+}"""
+
+# page -> {(page url, selectors): frame the first selector was found in}
+_frame_cache = weakref.WeakKeyDictionary()
+
+
+def _native(selector: str) -> dict:
+    if selector.startswith("xpath="):
+        return {"xpath": True, "value": selector[len("xpath="):]}
+    if selector.startswith("css="):
+        return {"xpath": False, "value": selector[len("css="):]}
+    return {"xpath": bool(_XPATH.match(selector)), "value": selector}
+
+
+def _resolve_frame(frame: Frame, path: List[dict]) -> Optional[Frame]:
+    """Follow the script's (name, url, nth) steps down Playwright's frame tree"""
+    for step in path:
+        candidates = [
+            child for child in frame.child_frames
+            if child.name == step["name"] and (not step["url"] or child.url == step["url"])
+        ]
+        if not candidates:
+            return None
+        frame = candidates[min(step["nth"], len(candidates) - 1)]
+    return frame
+
+
+def _locator_search(page: Page, selector: str) -> Optional[Tuple[Locator, Frame]]:
+    """Probe the main frame, then every other frame, with a Playwright locator"""
+    for frame in page.frames:
+        try:
+            locator = frame.locator(selector)
+            if locator.count() > 0:
+                return locator.first, frame
+        except Exception:
+            # A frame might detach while it is searched; continue with the next one
+            continue
+    return None
+
+
+def _batched_search(page: Page, selectors: List[str]) -> Optional[Tuple[int, Frame]]:
+    """Index of the first selector found and its frame, in selector order"""
+    native = [_native(selector) for selector in selectors]
+    hits: List[Optional[Frame]] = [None] * len(selectors)
+    unsupported = [False] * len(selectors)
+    pending = [page.main_frame]
+    while pending:
+        frame = pending.pop(0)
+        remaining = [hit is None and not skip for hit, skip in zip(hits, unsupported)]
+        if not any(remaining):
+            break
+        try:
+            result = frame.evaluate(SEARCH_SCRIPT, [native, remaining])
+        except Exception:
+            # Frames detach while Pega re-renders; a frame that is gone holds nothing
+            continue
+        for i, path in enumerate(result["hits"]):
+            if path is not None and hits[i] is None:
+                hits[i] = _resolve_frame(frame, path)
+                # A frame the script saw but Playwright does not know yet: let the locator probe it
+                unsupported[i] = hits[i] is None
+            unsupported[i] = unsupported[i] or result["unsupported"][i]
+        for path in result["blocked"]:
+            # Cross-origin documents are out of the script's reach and get an evaluation of their own
+            child = _resolve_frame(frame, path)
+            if child is not None:
+                pending.append(child)
+
+    for i, selector in enumerate(selectors):
+        if hits[i] is not None:
+            return i, hits[i]
+        if unsupported[i]:
+            found = _locator_search(page, selector)
+            if found:
+                return i, found[1]
+    return None
+
+
+def locate_across_frames(page: Page, selectors: Union[str, List[str]]) -> Optional[Tuple[Locator, Frame]]:
+    """
+    Find the first of `selectors` (tried in order) in the page or any of its iframes.
+
+    Returns a locator for the first matching element and the frame it lives in,
+    or None when no selector matches anywhere.
+    """
+    selectors = [selectors] if isinstance(selectors, str) else list(selectors)
+    cache = _frame_cache.setdefault(page, {})
+    key = (page.url, tuple(selectors))
+
+    frame = cache.get(key)
+    if frame is not None:
+        try:
+            if not frame.is_detached():
+                locator = frame.locator(selectors[0])
+                if locator.count() > 0:
+                    return locator.first, frame
+        except Exception:
+            pass
+        del cache[key]
+
+    try:
+        found = _batched_search(page, selectors)
+    except Exception:
+        # The page closed or navigated mid-search
+        return None
+    if found is None:
+        return None
+    index, frame = found
+    # Only a hit of the first selector is cached: Pega rarely changes the URL, so a cached
+    # fallback hit would keep winning after a higher-priority selector starts to match
+    if index == 0:
+        cache[key] = frame
+    return frame.locator(selectors[index]).first, frame
+
+
+def find_element_across_frames(page: Page, selector: Union[str, List[str]]) -> Locator | None:
+    """
+    Search for an element matching 'selector' (or the first matching one of a list
+    of fallback selectors) in the main page and all of its iframes.
+
+    Args:
+        page: The Playwright Page object to search within.
+        selector: The CSS or XPath selector for the element, or a list of them in priority order.
+
+    Returns:
+        A Playwright Locator object for the first matching element, or None if no
+        element is found anywhere on the page or in its frames.
+    """
+    found = locate_across_frames(page, selector)
+    return found[0] if found else None
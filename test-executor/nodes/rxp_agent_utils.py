@@ -3,55 +3,9 @@ from time import sleep
 from typing import Callable
 import oracledb
 
+from nodes.waits import settle, wait_for_element
+from nodes.frame_search import find_element_across_frames
 
-def find_element_across_frames(page: Page, selector: str) -> Locator | None:
-    """
-    Recursively search for an element matching 'selector' starting from the main page
-    and traversing all iframes.
-
-    If a locator matches multiple elements, this function ensures it only returns
-    a locator pointing to the *very first* matching element found.
-
-    Args:
-        page: The Playwright Page object to search within.
-        selector: The CSS or XPath selector for the element.
-
-    Returns:
-        A Playwright Locator object for the first matching element, or None if no
-        element is found anywhere on the page or in its frames.
-    """
-    # Try finding the locator on the main page first.
-    try:
-        main_frame_locator = page.locator(selector)
-        if main_frame_locator.count() > 0:
-            # MODIFICATION: Use .first to guarantee the locator targets only one element.
-            return main_frame_locator.first
-    except Exception:
-        # Silently ignore errors (e.g., page closed during search) and proceed to frames.
-        pass
-
-    # If not found on the main page, define a recursive function to search child frames.
-    def search_in_frames(frames: list) -> Locator | None:
-        for frame in frames:
-            try:
-                frame_locator = frame.locator(selector)
-                if frame_locator.count() > 0:
-                    # MODIFICATION: Use .first here as well.
-                    return frame_locator.first
-
-                # If not in this frame, go deeper into its children.
-                nested_result = search_in_frames(frame.child_frames)
-                if nested_result:
-                    # The result from the deeper call is already the .first locator.
-                    return nested_result
-            except Exception:
-                # A frame might detach or other errors could occur; just continue to the next one.
-                continue
-        # If the loop completes without finding the element in any frame.
-        return None
-
-    # Start the recursive search from the page's top-level frames.
-    return search_in_frames(page.frames)
 def robust_fill(page: Page, element_locator: Locator, value: str, select_suggestion: bool = False):
     """
     Fills a given element locator with a value.
@@ -288,8 +242,19 @@ def rxp_connection(PATIENT_ID,test_status):
     return status
 
 
-def advanced_search(page,element_name,status_name,db_status_name,PATIENT_ID):
-    adv_search_link = find_element_across_frames(page, "[name='AccredoPortalHeader_pyDisplayHarness_15']")
+# Longest the search results may take to list a case before the search is run again
+OPEN_CASE_WAIT_SECONDS = 30
+SEARCH_ATTEMPTS = 10
+
+
+def _open_case_from_advanced_search(page, adv_search_link_selector, element_name, PATIENT_ID, status_name=None):
+    """
+    Search a patient's case in the Advanced Search window and open it.
+
+    Each step waits for its element or for Pega to go idle instead of sleeping a fixed
+    time; the search is repeated while the case is not listed yet, as before.
+    """
+    adv_search_link = find_element_across_frames(page, adv_search_link_selector)
     if not adv_search_link:
         raise Exception("Element 'Advanced Search' link not found with selector: '//*[text()=\"Advanced Search\"]'")
     
@@ -301,65 +266,54 @@ def advanced_search(page,element_name,status_name,db_status_name,PATIENT_ID):
     try:
         adv_search_page = wait_for_new_window(page, click_advanced_search, timeout=15000)
         print(f"[LOG] Advanced Search window opened with URL: {adv_search_page.url}")
-        sleep(15)
     except Exception as e:
         print(f"[ERROR] Failed to open Advanced Search window: {e}")
         raise Exception("Advanced Search window did not open properly")
-    sleep(10)
 
-
-    rxhome_id_field = find_element_across_frames(adv_search_page, '[data-test-id="20180715225236062436158"]')
+    rxhome_id_field = wait_for_element(adv_search_page, '[data-test-id="20180715225236062436158"]', timeout=25, name="RxHome ID field")
     if not rxhome_id_field:
         raise Exception("Element 'RxHome ID' field not found with selector: '[data-test-id=\"20180715225236062436158\"]'")
     robust_fill(adv_search_page, rxhome_id_field, PATIENT_ID)
     print(f"[LOG] Entered Patient ID: {PATIENT_ID}")
     print(f"[LOG] Current Advanced Search page URL: {adv_search_page.url}")
-    sleep(10)
-    
-    # status_drop_down = find_element_across_frames(adv_search_page, '[data-test-id="20190404113611006767641"]')
-    # status_drop_down.select_option(status_name)
+    settle(adv_search_page, 10)
     
-    sleep(5)
-
+    if status_name:
+        status_drop_down = wait_for_element(adv_search_page, '[data-test-id="20190404113611006767641"]', timeout=10, name="Status dropdown")
+        status_drop_down.select_option(status_name)
+        settle(adv_search_page, 5)
 
     open_case_btn = None
     
-    for attempt in range(10):
+    for attempt in range(SEARCH_ATTEMPTS):
 
         try:
-            search_btn = find_element_across_frames(
-            adv_search_page, "//*[@node_name='DisplayAdvanceSearchParameters']//following::*[@name='DisplaySearchWrapper_D_AdvanceSearch_15']")
+            search_btn = wait_for_element(
+            adv_search_page, "//*[@node_name='DisplayAdvanceSearchParameters']//following::*[@name='DisplaySearchWrapper_D_AdvanceSearch_15']", timeout=10, name="Search button")
             if not search_btn:
                 raise Exception("Element 'Search Button' not found with selector: '//*[@node_name='DisplayAdvanceSearchParameters']//following::*[@name='DisplaySearchWrapper_D_AdvanceSearch_15']'")
             robust_click(adv_search_page, search_btn)
             print("[LOG] Clicked Search button in Advanced Search window")
-            adv_search_page.wait_for_load_state("networkidle")
+            settle(adv_search_page, 10)
             print(f"[LOG] After search, Advanced Search page URL: {adv_search_page.url}")
-            sleep(2)
             refresh_btn_xpath = "[data-test-id='2020041411472901915319']"
             refresh_btn= find_element_across_frames(adv_search_page, refresh_btn_xpath)
             if refresh_btn:
                 robust_click(adv_search_page, refresh_btn)
-            sleep(2)
+                settle(adv_search_page, 5)
 
-            open_case_xpath = element_name
-            open_case_btn = find_element_across_frames(adv_search_page, open_case_xpath)
-            print("*******",open_case_btn)
+            # Returns as soon as the case is listed; waits at most as long as the old retry delay
+            open_case_btn = wait_for_element(adv_search_page, element_name, timeout=OPEN_CASE_WAIT_SECONDS, name="Open Case button")
             if open_case_btn:
                 robust_click(adv_search_page, open_case_btn)
                 print("[LOG] Clicked Open Case button")
                 print(f"[LOG] After clicking open case, Advanced Search page URL: {adv_search_page.url}")
-                sleep(13)
+                settle(adv_search_page, 13)
                 break
-            else:
-                print(f"[LOG] Open Case button not found. Retrying after 30 seconds... attempt {attempt+1}")
-                check = attempt+1
-                if check == 10:
-                    break
-                sleep(30)
+            print(f"[LOG] Open Case button not found, searching again... attempt {attempt+1}")
         except Exception as e:
             print(f"[LOG] Error on attempt {attempt+1}: {e}")
-            sleep(30)
+            settle(adv_search_page, OPEN_CASE_WAIT_SECONDS)
         
     if not open_case_btn:
         print("[ERROR] Open Case button not found after maximum attempts")
@@ -367,118 +321,29 @@ def advanced_search(page,element_name,status_name,db_status_name,PATIENT_ID):
 
     adv_search_page.close()
     print("[LOG] Closed Advanced Search window. Switching back to main window")
-    switch_to_window_by_index(page, 0)
-    sleep(20)    
-
-def post_order_entry_advanced_search(page,element_name,status_name,db_status_name,PATIENT_ID):
-    adv_search_link = find_element_across_frames(page, "a[data-test-id='201807151828330613289695']")
-    if not adv_search_link:
-        raise Exception("Element 'Advanced Search' link not found with selector: '//*[text()=\"Advanced Search\"]'")
-    
-    # Use wait_for_new_window to properly handle the new window opening
-    def click_advanced_search():
-        robust_click(page, adv_search_link)
-        print("[LOG] Clicked Advanced Search")
-    
-    try:
-        adv_search_page = wait_for_new_window(page, click_advanced_search, timeout=15000)
-        print(f"[LOG] Advanced Search window opened with URL: {adv_search_page.url}")
-        sleep(15)
-    except Exception as e:
-        print(f"[ERROR] Failed to open Advanced Search window: {e}")
-        raise Exception("Advanced Search window did not open properly")
-    sleep(10)
+    main_page = switch_to_window_by_index(page, 0)
+    settle(main_page, 20)
 
 
-    rxhome_id_field = find_element_across_frames(adv_search_page, '[data-test-id="20180715225236062436158"]')
-    if not rxhome_id_field:
-        raise Exception("Element 'RxHome ID' field not found with selector: '[data-test-id=\"20180715225236062436158\"]'")
-    robust_fill(adv_search_page, rxhome_id_field, PATIENT_ID)
-    print(f"[LOG] Entered Patient ID: {PATIENT_ID}")
-    print(f"[LOG] Current Advanced Search page URL: {adv_search_page.url}")
-    sleep(10)
-    
-    status_drop_down = find_element_across_frames(adv_search_page, '[data-test-id="20190404113611006767641"]')
-    status_drop_down.select_option(status_name)
-    
-    sleep(5)
-
-
-    open_case_btn = None
-    
-    for attempt in range(10):
-
-        try:
-
-            search_btn = find_element_across_frames(
-            adv_search_page, "//*[@node_name='DisplayAdvanceSearchParameters']//following::*[@name='DisplaySearchWrapper_D_AdvanceSearch_15']")
-            if not search_btn:
-                raise Exception("Element 'Search Button' not found with selector: '//*[@node_name='DisplayAdvanceSearchParameters']//following::*[@name='DisplaySearchWrapper_D_AdvanceSearch_15']'")
-            robust_click(adv_search_page, search_btn)
-            print("[LOG] Clicked Search button in Advanced Search window")
-            adv_search_page.wait_for_load_state("networkidle")
-            print(f"[LOG] After search, Advanced Search page URL: {adv_search_page.url}")
-            sleep(2)
-            refresh_btn_xpath = "[data-test-id='2020041411472901915319']"
-            refresh_btn= find_element_across_frames(adv_search_page, refresh_btn_xpath)
-            if refresh_btn:
-                robust_click(adv_search_page, refresh_btn)
-            sleep(2)
-            
-            open_case_xpath = element_name
-            open_case_btn = find_element_across_frames(adv_search_page, open_case_xpath)
-            print("*******",open_case_btn)
-            if open_case_btn:
-                robust_click(adv_search_page, open_case_btn)
-                print("[LOG] Clicked Open Case button row")
-                print(f"[LOG] After clicking open case, Advanced Search page URL: {adv_search_page.url}")
-                sleep(13)
-                break
-            else:
-                print(f"[LOG] Open Case button not found. Retrying after 30 seconds... attempt {attempt+1}")
-                sleep(30)
-        except Exception as e:
-            print(f"[LOG] Error on attempt {attempt+1}: {e}")
-            sleep(30)
-        
-    if not open_case_btn:
-        print("[ERROR] Open Case button not found after maximum attempts")
-        raise Exception("Open Case button not found after maximum attempts")
-
+def advanced_search(page,element_name,status_name,db_status_name,PATIENT_ID):
+    _open_case_from_advanced_search(page, "[name='AccredoPortalHeader_pyDisplayHarness_15']", element_name, PATIENT_ID)
 
-    adv_search_page.close()
-    print("[LOG] Closed Advanced Search window. Switching back to main window")
-    switch_to_window_by_index(page, 0)
-    sleep(20)    
+def post_order_entry_advanced_search(page,element_name,status_name,db_status_name,PATIENT_ID):
+    _open_case_from_advanced_search(page, "a[data-test-id='201807151828330613289695']", element_name, PATIENT_ID, status_name)
     
     
     
 def find_and_click_begin_button_with_retry(page, button_description="Begin"):
-    max_attempts = 10
     timeout_seconds = 30
-    begin_button = None
-    print(f"[LOG] Looking for '{button_description}' button with max {max_attempts} attempts and {timeout_seconds} second timeout...")
-    for attempt in range(1, max_attempts + 1):
-        print(f"[LOG] Attempt {attempt}/{max_attempts} - Searching for '{button_description}' button...")
-        selectors = [
-            "(//*[@class='header-title' and normalize-space(text())='Referral Contents']/ancestor::*[@role='heading']/following-sibling::*//button[normalize-space(.)='Begin' and not(ancestor::*[contains(@style,'none')])])[1]",
-            "[data-test-id='201609091025020567152987']",
-            "//button[normalize-space()='Begin']"
-        ]
-        for selector in selectors:
-            begin_button = find_element_across_frames(page, selector)
-            if begin_button:
-                is_disabled = begin_button.get_attribute("disabled")
-                if is_disabled:
-                    begin_button = None
-                    continue
-                break
-        if begin_button:
-            break
-        print(f"[LOG] ⏳ '{button_description}' button not found or disabled on attempt {attempt}, waiting 3 seconds...")
-        sleep(3)
+    print(f"[LOG] Looking for an enabled '{button_description}' button for up to {timeout_seconds} seconds...")
+    selectors = [
+        "(//*[@class='header-title' and normalize-space(text())='Referral Contents']/ancestor::*[@role='heading']/following-sibling::*//button[normalize-space(.)='Begin' and not(ancestor::*[contains(@style,'none')])])[1]",
+        "[data-test-id='201609091025020567152987']",
+        "//button[normalize-space()='Begin']"
+    ]
+    begin_button = wait_for_element(page, selectors, timeout=timeout_seconds, visible=False, enabled=True, name=button_description)
     if not begin_button:
-        raise Exception(f"Element '{button_description}' button for Referral Contents not found or enabled after {max_attempts} attempts.")
+        raise Exception(f"Element '{button_description}' button for Referral Contents not found or enabled after {timeout_seconds} seconds.")
     try:
         begin_button.click(force=True)
         print(f"[LOG] Clicked '{button_description}' button using force click")
@@ -491,7 +356,7 @@ def find_and_click_begin_button_with_retry(page, button_description="Begin"):
             print(f"[LOG] Clicked '{button_description}' button using robust_click")
     print(f"[LOG] Clicked '{button_description}' in Referral Contents")
     #screenshot(page, f"step_11_{button_description.lower()}_referral_contents.png")
-    sleep(10)
+    settle(page, 10)
 
 def validate_section_and_check(page, fields_to_check, checkbox_selector, optional_fields=None):
     if optional_fields is None:
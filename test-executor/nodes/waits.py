@@ -0,0 +1,260 @@
+"""
+Event-driven waits for generated Playwright scripts.
+
+Every wait returns as soon as its condition holds and gives up after its own
+timeout, so a timeout is the same upper bound a fixed sleep() used to be:
+
+    settle(page, 5)                       # instead of sleep(5) after an action
+    wait_for_element(page, selector, 30)  # instead of find + sleep + retry
+    click_when_ready(page, selector)      # instead of sleep(60) + click
+
+Each wait is logged with the time it actually took, and a summary (plus a JSON
+file when WAIT_TELEMETRY_FILE is set) is written when the test process exits.
+"""
+
+import atexit
+import json
+import os
+import time
+import weakref
+from typing import Callable, List, Optional, Union
+
+from playwright.sync_api import Locator, Page
+
+from nodes.frame_search import find_element_across_frames
+
+# Pega shows one of these while it processes a request; the state tracker is Pega's own busy flag
+PEGA_BUSY_SELECTORS = [
+    ".document-statetracker[data-state-busy-status='busy']",
+    "#pega_ui_mask",
+    ".pega_ui_mask",
+    ".pega_ui_busyIndicator",
+    ".loadmask",
+]
+
+PEGA_IDLE_SCRIPT = """(selectors) => {
+    if (document.readyState !== 'complete') return false;
+    for (const selector of selectors) {
+        for (const el of document.querySelectorAll(selector)) {
+            const style = window.getComputedStyle(el);
+            if (style.display !== 'none' && style.visibility !== 'hidden' && el.getClientRects().length) return false;
+        }
+    }
+    return true;
+}"""
+
+# Long-lived connections never finish and must not hold a page busy
+_IGNORED_RESOURCE_TYPES = {"websocket", "eventsource", "media"}
+POLL_MS = 250
+QUIET_MS = 500
+CLICK_ATTEMPT_SECONDS = 10
+
+wait_log: List[dict] = []
+
+
+def _record(name: str, started: float, timeout: float, ok: bool) -> float:
+    seconds = time.monotonic() - started
+    timeout = round(timeout, 1)
+    wait_log.append({"name": name, "seconds": round(seconds, 3), "timeout": timeout, "ok": ok})
+    print(f"[WAIT] {name}: {seconds:.1f}s of {timeout}s{'' if ok else ' (timed out)'}")
+    return seconds
+
+
+class _NetworkTracker:
+    """Requests in flight on a page, counted from the first wait that touches it"""
+
+    def __init__(self, page: Page):
+        self.in_flight = set()
+        self.last_activity = time.monotonic()
+        page.on("request", self._started)
+        page.on("requestfinished", self._finished)
+        page.on("requestfailed", self._finished)
+
+    def _started(self, request):
+        if request.resource_type not in _IGNORED_RESOURCE_TYPES:
+            self.in_flight.add(request)
+            self.last_activity = time.monotonic()
+
+    def _finished(self, request):
+        self.in_flight.discard(request)
+        self.last_activity = time.monotonic()
+
+    def quiet_for(self) -> float:
+        return 0.0 if self.in_flight else time.monotonic() - self.last_activity
+
+
+_trackers = weakref.WeakKeyDictionary()
+
+
+def track_network(page: Page) -> _NetworkTracker:
+    """Start counting the page's requests; call it early so settle() also sees the first action's requests"""
+    tracker = _trackers.get(page)
+    if tracker is None:
+        tracker = _trackers[page] = _NetworkTracker(page)
+    return tracker
+
+
+def is_pega_idle(page: Page) -> bool:
+    """True when no frame of the page shows a Pega busy indicator or is still loading"""
+    for frame in page.frames:
+        try:
+            if not frame.evaluate(PEGA_IDLE_SCRIPT, PEGA_BUSY_SELECTORS):
+                return False
+        except Exception:
+            # Frames detach while Pega re-renders; a frame that is gone is not busy
+            continue
+    return True
+
+
+def settle(page: Page, timeout: float = 10, quiet_ms: int = QUIET_MS, name: str = "settle") -> bool:
+    """
+    Wait until the page has had no requests in flight for `quiet_ms` and Pega is idle.
+
+    Drop-in for a fixed sleep(timeout) after an action: it never waits longer.
+    """
+    tracker = track_network(page)
+    started = time.monotonic()
+    deadline = started + timeout
+    while True:
+        if tracker.quiet_for() * 1000 >= quiet_ms and is_pega_idle(page):
+            _record(name, started, timeout, True)
+            return True
+        if time.monotonic() >= deadline:
+            _record(name, started, timeout, False)
+            return False
+        # Waiting through Playwright (not time.sleep) lets it deliver the request events
+        page.wait_for_timeout(POLL_MS)
+
+
+def wait_for_pega_idle(page: Page, timeout: float = 30, name: str = "pega idle") -> bool:
+    started = time.monotonic()
+    deadline = started + timeout
+    while not is_pega_idle(page):
+        if time.monotonic() >= deadline:
+            _record(name, started, timeout, False)
+            return False
+        page.wait_for_timeout(POLL_MS)
+    _record(name, started, timeout, True)
+    return True
+
+
+def wait_for_element(page: Page, selectors: Union[str, List[str]], timeout: float = 30,
+                     visible: bool = True, enabled: bool = False, name: Optional[str] = None) -> Optional[Locator]:
+    """
+    Wait for the first of `selectors` to appear in any frame; returns its locator, or None on timeout.
+
+    With `visible` the element must be visible, with `enabled` it must not be disabled.
+    """
+    selectors = [selectors] if isinstance(selectors, str) else list(selectors)
+    name = name or selectors[0]
+    track_network(page)
+    started = time.monotonic()
+    deadline = started + timeout
+
+    def ready(element):
+        return (not visible or element.is_visible()) and (not enabled or element.is_enabled())
+
+    while True:
+        try:
+            # One lookup for every selector; the later ones are only tried one by one
+            # when the first match is not ready yet (e.g. a disabled button)
+            element = find_element_across_frames(page, selectors)
+            if element and not ready(element):
+                for selector in selectors[1:]:
+                    element = find_element_across_frames(page, selector)
+                    if element and ready(element):
+                        break
+                else:
+                    element = None
+            if element:
+                _record(f"element {name}", started, timeout, True)
+                return element
+        except Exception:
+            # The element's frame can detach between the lookup and the check
+            pass
+        if time.monotonic() >= deadline:
+            _record(f"element {name}", started, timeout, False)
+            return None
+        page.wait_for_timeout(POLL_MS)
+
+
+def click_when_ready(page: Page, selectors: Union[str, List[str]], element_name: Optional[str] = None,
+                     timeout: float = 60) -> bool:
+    """
+    Wait until the element is visible, enabled and not covered by a Pega mask, then click it.
+
+    A click that fails (the element re-rendered, detached or stayed covered) is retried
+    with a fresh lookup until `timeout`; returns False if no click went through by then.
+    """
+    name = element_name or selectors
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        element = wait_for_element(page, selectors, max(remaining, 0), enabled=True, name=element_name)
+        if element is None:
+            print(f"[WAIT] {name} not found after {timeout}s")
+            return False
+        remaining = max(1.0, deadline - time.monotonic())
+        wait_for_pega_idle(page, remaining, name=f"pega idle before clicking {element_name or 'element'}")
+        try:
+            # click() itself waits for the element to be stable and to receive events; a short
+            # attempt leaves time to look the element up again if it was replaced meanwhile
+            element.click(timeout=min(remaining, CLICK_ATTEMPT_SECONDS) * 1000)
+            print(f"[WAIT] Clicked {name}")
+            return True
+        except Exception as e:
+            if time.monotonic() >= deadline:
+                print(f"[WAIT] Could not click {name} within {timeout}s: {e}")
+                return False
+            print(f"[WAIT] Click on {name} failed, retrying: {e}")
+            page.wait_for_timeout(POLL_MS)
+
+
+def wait_until(condition: Callable[[], object], timeout: float = 30, interval: float = 1.0,
+               name: str = "condition", page: Optional[Page] = None):
+    """Poll `condition` until it returns something truthy (returned) or `timeout` passes (None)"""
+    started = time.monotonic()
+    deadline = started + timeout
+    while True:
+        try:
+            result = condition()
+        except Exception as e:
+            print(f"[WAIT] {name} raised {e}, retrying")
+            result = None
+        if result:
+            _record(name, started, timeout, True)
+            return result
+        if time.monotonic() >= deadline:
+            _record(name, started, timeout, False)
+            return None
+        if page is not None:
+            page.wait_for_timeout(interval * 1000)
+        else:
+            time.sleep(interval)
+
+
+def wait_summary() -> dict:
+    waited = sum(entry["seconds"] for entry in wait_log)
+    budget = sum(entry["timeout"] for entry in wait_log)
+    return {
+        "waits": len(wait_log),
+        "timed_out": sum(1 for entry in wait_log if not entry["ok"]),
+        "waited_seconds": round(waited, 1),
+        "budget_seconds": round(budget, 1),
+        "slowest": sorted(wait_log, key=lambda entry: entry["seconds"], reverse=True)[:5],
+    }
+
+
+@atexit.register
+def _report_waits():
+    if not wait_log:
+        return
+    summary = wait_summary()
+    print(
+        f"[WAIT] {summary['waits']} waits took {summary['waited_seconds']}s of a {summary['budget_seconds']}s budget, "
+        f"{summary['timed_out']} timed out"
+    )
+    telemetry_file = os.environ.get("WAIT_TELEMETRY_FILE")
+    if telemetry_file:
+        with open(telemetry_file, "w") as f:
+            json.dump({**summary, "waits_detail": wait_log}, f, indent=2)
@@ -0,0 +1,14 @@
+# Copied into every run sandbox as its root conftest.py (see sandbox.RunSandbox.prepare)
+import os
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def browser(playwright, launch_browser):
+    """Attach to the executor's pooled browser when BROWSER_CDP_ENDPOINT is set, else launch one as usual"""
+    endpoint = os.environ.get("BROWSER_CDP_ENDPOINT")
+    browser = playwright.chromium.connect_over_cdp(endpoint) if endpoint else launch_browser()
+    yield browser
+    # On a CDP connection this closes the contexts the run created and disconnects; the browser keeps running
+    browser.close()
@@ -0,0 +1,163 @@
+import asyncio
+import os
+import re
+import shutil
+import threading
+import uuid
+
+from browser_pool import get_browser_pool
+
+EXECUTOR_DIR = os.path.dirname(os.path.abspath(__file__))
+RUNS_DIR = os.environ.get("RUNS_DIR") or os.path.join(EXECUTOR_DIR, "runs")
+MAX_CONCURRENT_RUNS = int(os.environ.get("MAX_CONCURRENT_RUNS", "2"))
+BROWSER_LEASE_TIMEOUT = 30
+# Outcome of a run whose tests never started; its patient can go back to the pool
+NOT_STARTED = {"status": "not_started"}
+
+# Shared by every endpoint, so at most MAX_CONCURRENT_RUNS browsers run at once
+run_slots = threading.BoundedSemaphore(MAX_CONCURRENT_RUNS)
+run_counts = {"running": 0, "queued": 0}
+_counts_lock = threading.Lock()
+
+
+def _count(key, delta):
+    with _counts_lock:
+        run_counts[key] += delta
+
+
+class RunSandbox:
+    """
+    Working directory of a single test run.
+
+    Generated scripts save screenshots and videos next to their own folder
+    (`os.path.dirname(__file__)/..`), so running `tests/test_script.py` from inside
+    the sandbox keeps every run's script, screenshots, videos, network logs and
+    zip apart from the runs executing next to it.
+    """
+
+    def __init__(self, chat_id):
+        safe_chat_id = re.sub(r"[^A-Za-z0-9_-]+", "_", chat_id)[:64]
+        self.run_id = f"{safe_chat_id}-{uuid.uuid4().hex[:8]}"
+        self.root = os.path.join(RUNS_DIR, self.run_id)
+        self.tests_dir = os.path.join(self.root, "tests")
+        self.script_path = os.path.join(self.tests_dir, "test_script.py")
+        # Leased from the browser pool while the run holds a run slot
+        self.browser = None
+        # What the run's patient lease is settled with: NOT_STARTED, None once pytest
+        # starts (the outcome is unknown until it finishes), then the test results
+        self.results = NOT_STARTED
+
+    def prepare(self, content=None):
+        """Write the script (or, for local runs, copy tests/test_script.py) and the shared conftest"""
+        os.makedirs(self.tests_dir, exist_ok=True)
+        for name in ("screenshots", "videos", "network_logs"):
+            os.makedirs(os.path.join(self.root, name), exist_ok=True)
+
+        # The root conftest points the `browser` fixture at the pooled browser
+        shutil.copy(os.path.join(EXECUTOR_DIR, "pooled_browser_conftest.py"), os.path.join(self.root, "conftest.py"))
+        conftest = os.path.join(EXECUTOR_DIR, "tests", "conftest.py")
+        if os.path.exists(conftest):
+            shutil.copy(conftest, self.tests_dir)
+        if content is None:
+            shutil.copy(os.path.join(EXECUTOR_DIR, "tests", "test_script.py"), self.script_path)
+        else:
+            with open(self.script_path, "w") as f:
+                f.write(content)
+        print(f"[SANDBOX] Test script saved to {self.script_path}")
+        return self
+
+    def pytest_command(self, *args, xvfb=False):
+        # pytest settings come from the executor's pyproject.toml; relative paths in them
+        # (allure-results, test-results) resolve inside the sandbox
+        command = ["pytest", "-c", os.path.join(EXECUTOR_DIR, "pyproject.toml"), "--rootdir", self.root, *args, "tests"]
+        # A pooled browser already runs on the pool's display. Otherwise -a picks a free
+        # display number; the default :99 is shared by every concurrent run
+        return ["xvfb-run", "-a", *command] if xvfb and self.browser is None else command
+
+    def env(self):
+        env = os.environ.copy()
+        env["PYTHONUNBUFFERED"] = "1"
+        # The sandbox for `tests.conftest`, the executor directory for `nodes.agent_utils`
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [self.root, EXECUTOR_DIR, env.get("PYTHONPATH")]))
+        if self.browser is not None:
+            env["BROWSER_CDP_ENDPOINT"] = self.browser.endpoint
+        # nodes.waits writes how long each wait took; it ships in the run's zip with the network logs
+        env["WAIT_TELEMETRY_FILE"] = os.path.join(self.root, "network_logs", "wait_telemetry.json")
+        return env
+
+    def lease_browser(self):
+        """Take a warm browser for this run; without one the run launches its own"""
+        pool = get_browser_pool()
+        if pool is None:
+            return
+        try:
+            self.browser = pool.lease(timeout=BROWSER_LEASE_TIMEOUT)
+            print(f"[SANDBOX] Run {self.run_id} uses pooled browser {self.browser.endpoint}")
+        except Exception as e:
+            print(f"[SANDBOX] No pooled browser for run {self.run_id}, it launches its own: {e}")
+
+    def release_browser(self):
+        pool = get_browser_pool()
+        if self.browser is not None and pool is not None:
+            pool.release(self.browser)
+        self.browser = None
+
+    def cleanup(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        print(f"[SANDBOX] Removed {self.root}")
+
+
+def queue_run():
+    """Count a background run as queued from the moment it is submitted"""
+    _count("queued", 1)
+
+
+def acquire_run_slot(sandbox):
+    """Block until a run slot is free for a run counted by queue_run(), then lease its browser"""
+    try:
+        run_slots.acquire()
+    finally:
+        _count("queued", -1)
+    _count("running", 1)
+    sandbox.lease_browser()
+
+
+async def wait_for_run_slot(sandbox, poll_seconds=1.0):
+    """
+    Take a run slot for a streaming run, yielding queue status events while waiting.
+
+    Polling instead of blocking in a thread means a client that disconnects while
+    queued never ends up holding a slot.
+    """
+    _count("queued", 1)
+    try:
+        while not run_slots.acquire(blocking=False):
+            yield {"type": "queued", **run_status()}
+            await asyncio.sleep(poll_seconds)
+    finally:
+        _count("queued", -1)
+    _count("running", 1)
+    lease = asyncio.ensure_future(asyncio.to_thread(sandbox.lease_browser))
+    try:
+        await asyncio.shield(lease)
+    except BaseException:
+        # The caller's cleanup only starts once the slot is taken, so a client that
+        # disconnects during the lease would otherwise keep the slot for good. The
+        # lease thread cannot be interrupted; free the slot and browser when it ends
+        lease.add_done_callback(lambda _: release_run_slot(sandbox))
+        raise
+
+
+def release_run_slot(sandbox):
+    sandbox.release_browser()
+    _count("running", -1)
+    run_slots.release()
+
+
+def run_status():
+    pool = get_browser_pool()
+    return {
+        "max_concurrent_runs": MAX_CONCURRENT_RUNS,
+        **run_counts,
+        "browser_pool": pool.stats() if pool is not None else None,
+    }
@@ -4,7 +4,9 @@ import boto3
 import uuid
 import shutil
 import base64
+from concurrent.futures import ThreadPoolExecutor
 from boto3.dynamodb.conditions import Attr, Key
+from sandbox import MAX_CONCURRENT_RUNS, RunSandbox, acquire_run_slot, queue_run, release_run_slot
 
 def screenshot(page, name):
     screenshot_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'screenshots'))
@@ -33,17 +35,18 @@ def highlight(page, selector):
         selector,
     )
 
-def zip_screenshots_and_videos():
-    """Zips the screenshots and videos into a single zip file"""
+def zip_screenshots_and_videos(base_dir=None):
+    """Zips the screenshots and videos of a run directory (default: the executor directory) into a single zip file"""
+    base_dir = os.path.abspath(base_dir or os.path.dirname(__file__))
     try:
         # Use same paths as screenshot() and page_with_video() functions
-        screenshots_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "screenshots"))
+        screenshots_dir = os.path.join(base_dir, "screenshots")
         os.makedirs(screenshots_dir, exist_ok=True)
         
-        videos_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "videos"))
+        videos_dir = os.path.join(base_dir, "videos")
         os.makedirs(videos_dir, exist_ok=True)
 
-        network_logs_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "network_logs"))
+        network_logs_dir = os.path.join(base_dir, "network_logs")
         os.makedirs(network_logs_dir, exist_ok=True)
         
         screenshots = os.listdir(screenshots_dir) if os.path.exists(screenshots_dir) else []
@@ -61,7 +64,7 @@ def zip_screenshots_and_videos():
                     network_log_files.append(file_path)
         print(f"[ZIP] Found network_logs: {[os.path.basename(f) for f in network_log_files]}")
         
-        zip_path = os.path.join(os.path.dirname(__file__), "screenshots.zip")
+        zip_path = os.path.join(base_dir, "screenshots.zip")
         print(f"[ZIP] Creating zip file: {zip_path}")
         
         with zipfile.ZipFile(zip_path, "w") as zipf:
@@ -69,19 +72,19 @@ def zip_screenshots_and_videos():
             for screenshot in screenshots:
                 screenshot_path = os.path.join(screenshots_dir, screenshot)
                 if os.path.isfile(screenshot_path):
-                    zipf.write(screenshot_path, os.path.relpath(screenshot_path, os.path.dirname(__file__)))
+                    zipf.write(screenshot_path, os.path.relpath(screenshot_path, base_dir))
                     files_added += 1
                     print(f"[ZIP] Added screenshot: {screenshot}")
             for video in videos:
                 video_path = os.path.join(videos_dir, video)
                 if os.path.isfile(video_path):
-                    zipf.write(video_path, os.path.relpath(video_path, os.path.dirname(__file__)))
+                    zipf.write(video_path, os.path.relpath(video_path, base_dir))
                     files_added += 1
                     print(f"[ZIP] Added video: {video}")
 
             for network_log_path in network_log_files:
                 if os.path.isfile(network_log_path):
-                    zipf.write(network_log_path, os.path.relpath(network_log_path, os.path.dirname(__file__)))
+                    zipf.write(network_log_path, os.path.relpath(network_log_path, base_dir))
                     files_added += 1
                     print(f"[ZIP] Added network_log: {os.path.basename(network_log_path)}")
             
@@ -107,12 +110,13 @@ def create_screenshots_and_videos():
     os.makedirs(videos_dir, exist_ok=True)
     os.makedirs(network_logs_dir, exist_ok=True)
 
-def delete_screenshots_and_videos():
+def delete_screenshots_and_videos(base_dir=None):
     """Deletes the screenshots and videos"""
     print("[DELETE] Starting cleanup of screenshots and videos")
-    screenshots_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "screenshots"))
-    videos_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "videos"))
-    network_logs_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "network_logs"))
+    base_dir = os.path.abspath(base_dir or os.path.dirname(__file__))
+    screenshots_dir = os.path.join(base_dir, "screenshots")
+    videos_dir = os.path.join(base_dir, "videos")
+    network_logs_dir = os.path.join(base_dir, "network_logs")
     print(f"[DELETE] Removing screenshots directory: {screenshots_dir}")
     shutil.rmtree(screenshots_dir)
 
@@ -122,13 +126,13 @@ def delete_screenshots_and_videos():
     print(f"[DELETE] Removing network_logs directory: {network_logs_dir}")
     shutil.rmtree(network_logs_dir)
     
-    zip_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "screenshots.zip"))
+    zip_path = os.path.join(base_dir, "screenshots.zip")
     print(f"[DELETE] Removing zip file: {zip_path}")
     os.remove(zip_path)
     
     print("[DELETE] Cleanup completed successfully")
 
-def upload_to_s3():
+def upload_to_s3(base_dir=None):
     """Uploads the screenshots and videos to S3 and returns the signed url to the zip file"""
     try:
         print("[UPLOAD] Starting S3 upload process")
@@ -141,7 +145,7 @@ def upload_to_s3():
         print(f"[UPLOAD] Using S3 bucket: {s3_bucket}, region: {s3_region}")
         s3 = boto3.client("s3", region_name=s3_region)
         
-        zip_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "screenshots.zip"))
+        zip_path = os.path.join(os.path.abspath(base_dir or os.path.dirname(__file__)), "screenshots.zip")
         
         if not os.path.exists(zip_path):
             raise Exception(f"Zip file does not exist: {zip_path}")
@@ -159,7 +163,7 @@ def upload_to_s3():
         )
 
         # delete screenshots and videos folders after upload
-        delete_screenshots_and_videos()
+        delete_screenshots_and_videos(base_dir)
         
         print(f"[UPLOAD] Upload completed successfully. Signed URL generated (expires in 1 hour)")
         return signed_url, key
@@ -225,6 +229,50 @@ def download_script(chat_id):
         print(f"[DOWNLOAD_SCRIPT] Error downloading script: {e}")
         raise Exception(f"Failed to download script for chat_id {chat_id}: {str(e)}")
 
+# Written as the first line of generated scripts by the agent's generate_playwright_code node
+PATIENT_LEASE_HEADER = "# patient-lease: "
+# Logged by the intake test once the intake task is submitted; from then on the patient is consumed
+INTAKE_COMPLETED_MARKER = "Clicked Submit to complete Intake T-Task id"
+
+def read_patient_lease(script_path="tests/test_script.py"):
+    """Return the patient lease id stamped on the test script, if any"""
+    try:
+        with open(script_path) as f:
+            for _ in range(5):
+                line = f.readline().strip()
+                if line.startswith(PATIENT_LEASE_HEADER.strip()):
+                    return line[len(PATIENT_LEASE_HEADER.strip()):].strip() or None
+    except OSError:
+        pass
+    return None
+
+def settle_patient_lease(test_results, script_path="tests/test_script.py"):
+    """
+    Tell the agent whether the run consumed its test patient.
+
+    A run that passed or got past intake confirms the patient as used; any other
+    run returns it to the pool. Without results (`None`) the run's outcome is
+    unknown, so the patient is flagged for review rather than handed out again.
+    Scripts without a lease (older scripts, local runs) are left alone.
+    """
+    lease_id = read_patient_lease(script_path)
+    agent_url = os.environ.get("AGENT_URL")
+    if not lease_id or not agent_url:
+        return
+
+    if test_results is None:
+        action = "review"
+    else:
+        consumed = test_results.get("returncode") == 0 or INTAKE_COMPLETED_MARKER in (test_results.get("stdout") or "")
+        action = "confirm" if consumed else "release"
+    try:
+        import requests
+
+        response = requests.post(f"{agent_url.rstrip('/')}/patient-pool/leases/{lease_id}/{action}", timeout=10)
+        print(f"[PATIENT_LEASE] {action} {lease_id}: HTTP {response.status_code}")
+    except Exception as e:
+        print(f"[PATIENT_LEASE] Failed to {action} patient lease {lease_id}: {e}")
+
 def save_test_results(chat_id, test_results, artifacts):
     """Save the test results to the database"""
 
@@ -274,16 +322,21 @@ def save_test_results(chat_id, test_results, artifacts):
         print(f"[SAVE_TEST_RESULTS] Error saving test results: {e}")
         raise Exception(f"Failed to save test results for chat_id {chat_id}: {str(e)}")
 
+# Background runs queue here; each worker still takes a run slot, shared with the streaming endpoints
+background_runs = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_RUNS, thread_name_prefix="test-run")
+
 def run_tests_in_background(chat_id):
-    """Run the complete test execution workflow in the background"""
+    """Queue the complete test execution workflow on the background worker pool"""
     import subprocess
-    import threading
     
     def execute_tests():
+        sandbox = RunSandbox(chat_id)
+        acquire_run_slot(sandbox)
         try:
-            print(f"[BACKGROUND] Starting background test execution for chat_id: {chat_id}")
+            print(f"[BACKGROUND] Starting background test execution for chat_id: {chat_id} in {sandbox.root}")
             
             # Download script from DB
+            content = None
             if os.environ.get('ENV') != "local":
                 print(f"[BACKGROUND] Downloading test script for chat_id: {chat_id}")
                 content = download_script(chat_id)
@@ -292,19 +345,20 @@ def run_tests_in_background(chat_id):
                     print(f"[BACKGROUND] No test script found for chat_id: {chat_id}")
                     return
 
-                # save file to tests/test_script.py
-                try:
-                    with open("tests/test_script.py", "w") as f:
-                        f.write(content)
-                    print("[BACKGROUND] Test script saved")
-                except Exception as e:
-                    print(f"[BACKGROUND] Failed to save test script: {str(e)}")
-                    return
+            # save the script to the run's sandbox
+            try:
+                sandbox.prepare(content)
+                print("[BACKGROUND] Test script saved")
+            except Exception as e:
+                print(f"[BACKGROUND] Failed to save test script: {str(e)}")
+                return
 
             # run the tests
             print("[BACKGROUND] Starting pytest execution")
+            sandbox.results = None
             try:
-                result = subprocess.run(["pytest", "-s","-x"], capture_output=True, text=True)
+                result = subprocess.run(sandbox.pytest_command("-s", "-x"), cwd=sandbox.root, env=sandbox.env(), capture_output=True, text=True)
+                sandbox.results = {"returncode": result.returncode, "stdout": result.stdout}
                 print("[BACKGROUND] Tests completed")
             except Exception as e:
                 print(f"[BACKGROUND] Failed to execute pytest: {str(e)}")
@@ -313,7 +367,7 @@ def run_tests_in_background(chat_id):
             # zip screenshots and videos
             print("[BACKGROUND] Zipping screenshots and videos")
             try:
-                zip_screenshots_and_videos()
+                zip_screenshots_and_videos(sandbox.root)
                 print("[BACKGROUND] Zipping completed")
             except Exception as e:
                 print(f"[BACKGROUND] Failed to zip screenshots and videos: {str(e)}")
@@ -325,7 +379,7 @@ def run_tests_in_background(chat_id):
 
             print("[BACKGROUND] Uploading screenshots and videos to S3")
             try:
-                signed_url, key = upload_to_s3()
+                signed_url, key = upload_to_s3(sandbox.root)
                 print("[BACKGROUND] S3 upload completed", signed_url, key)
             except Exception as e:
                 print(f"[BACKGROUND] Failed to upload to S3: {str(e)}")
@@ -363,10 +417,13 @@ def run_tests_in_background(chat_id):
                 save_test_results(chat_id, error_results, None)
             except Exception as save_error:
                 print(f"[BACKGROUND] Failed to save error results: {str(save_error)}")
+        finally:
+            settle_patient_lease(sandbox.results, sandbox.script_path)
+            release_run_slot(sandbox)
+            sandbox.cleanup()
     
-    # Start the background thread
-    thread = threading.Thread(target=execute_tests, daemon=True)
-    thread.start()
-    print(f"[BACKGROUND] Started background thread for chat_id: {chat_id}")
+    # Queue the run; it starts as soon as a worker and a run slot are free
+    queue_run()
+    background_runs.submit(execute_tests)
+    print(f"[BACKGROUND] Queued background run for chat_id: {chat_id}")
     return True
-